@@ -2,4 +2,5 @@
 
 from . import models
 from . import controllers
-from . import wizards
\ No newline at end of file
+from . import wizards
+from . import cli
\ No newline at end of file
@@ -26,11 +26,16 @@
     'application': True,
     'data': [
         'data/module_category.xml',
+        'data/edge_data.xml',
+        'data/idempotency_data.xml',
 
         'security/security.xml',
         'security/ir.model.access.csv',
         
+        'views/tag_import_views.xml',
         'views/tag_views.xml',
+        'views/lot_views.xml',
+        'views/reader_metric_views.xml',
         'views/reader_views.xml',
         'views/role_views.xml',
         'views/group_views.xml',
@@ -41,6 +46,10 @@
         'views/user_personal_views.xml',
         'views/vehicle_views.xml',
         'views/vehicle_logs_views.xml',
+        'views/vehicle_logs_archive_views.xml',
+        'views/gate_event_views.xml',
+        'views/photo_views.xml',
+        'views/rate_limit_views.xml',
         'views/vehicle_price_views.xml',
         'views/payment_provider_views.xml',
         'views/payment_methods_views.xml',
@@ -0,0 +1,2 @@
+from . import export_logs
+from . import bench_checkin
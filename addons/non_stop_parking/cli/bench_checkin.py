@@ -0,0 +1,99 @@
+# cli/bench_checkin.py
+
+import argparse
+import logging
+import statistics
+import time
+import uuid
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.cli import Command
+
+_logger = logging.getLogger(__name__)
+
+class NspBenchCheckin(Command):
+    """So sánh thời gian check in/out giữa chế độ log 'full' và 'lean', dữ liệu thử được rollback"""
+    name = 'nsp_bench_checkin'
+
+    def run(self, args):
+        parser = argparse.ArgumentParser(
+            prog=f'odoo-bin {self.name}',
+            description=self.__doc__,
+        )
+        parser.add_argument('-c', '--config', help="File cấu hình Odoo")
+        parser.add_argument('-d', '--database', help="Tên database")
+        parser.add_argument('-n', '--count', type=int, default=200, help="Số xe mỗi chế độ")
+        parser.add_argument('--modes', nargs='+', choices=['full', 'lean'], default=['full', 'lean'])
+        opts = parser.parse_args(args)
+
+        config_args = []
+        if opts.config:
+            config_args += ['-c', opts.config]
+        if opts.database:
+            config_args += ['-d', opts.database]
+        odoo.tools.config.parse_config(config_args)
+
+        dbname = odoo.tools.config['db_name']
+        if not dbname:
+            parser.error("Cần chỉ định database bằng -d hoặc file cấu hình")
+
+        registry = odoo.modules.registry.Registry(dbname)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            try:
+                for mode in opts.modes:
+                    self._report(mode, self._bench(env, mode, opts.count))
+            finally:
+                # Không giữ lại xe, thẻ và log thử
+                cr.rollback()
+
+    def _prepare_vehicles(self, env, count):
+        """Tạo xe, chủ xe và thẻ phương tiện dùng cho một lượt đo"""
+        prefix = uuid.uuid4().hex[:8].upper()
+        partner = env['res.partner'].create({'name': f"NSP bench {prefix}"})
+        vehicles = env['nsp.vehicle'].create([{
+            'name': f"Bench {prefix} {i}",
+            'plate_number': f"B{prefix}{i:05d}",
+            'owner_partner_id': partner.id,
+        } for i in range(count)])
+        tags = env['nsp.tag'].create([{
+            'tag_id': f"BENCH-{prefix}-{i:05d}",
+            'status': 'active',
+            'vehicle_id': vehicle.id,
+        } for i, vehicle in enumerate(vehicles)])
+        env.flush_all()
+        return tags.mapped('tag_id')
+
+    def _bench(self, env, mode, count):
+        """
+        Đo create_log_entry cho mỗi thẻ một lần vào và một lần ra
+        Returns:
+            dict: {direction: [(thời gian ms, số truy vấn), ...]}
+        """
+        env['ir.config_parameter'].set_param('nsp.log_mode', mode)
+        tag_ids = self._prepare_vehicles(env, count)
+        Logs = env['nsp.vehicle.logs']
+        cr = env.cr
+        samples = {'in': [], 'out': []}
+        for direction in ('in', 'out'):
+            for tag_id in tag_ids:
+                queries = cr.sql_log_count
+                started = time.perf_counter()
+                result = Logs.create_log_entry(direction=direction, tag_id=tag_id)
+                env.flush_all()
+                elapsed = (time.perf_counter() - started) * 1000
+                if not result['success']:
+                    _logger.warning(f"Bench check {direction} failed for {tag_id}: {result.get('error_code')}")
+                samples[direction].append((elapsed, cr.sql_log_count - queries))
+        return samples
+
+    @staticmethod
+    def _report(mode, samples):
+        for direction, rows in samples.items():
+            times = sorted(row[0] for row in rows)
+            if not times:
+                continue
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            print(f"{mode:<5} check {direction:<3} n={len(times)} "
+                  f"mean={statistics.mean(times):.2f}ms p50={statistics.median(times):.2f}ms p95={p95:.2f}ms "
+                  f"queries={statistics.mean(row[1] for row in rows):.1f}")
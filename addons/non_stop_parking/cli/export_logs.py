@@ -0,0 +1,54 @@
+# cli/export_logs.py
+
+import argparse
+import logging
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.cli import Command
+
+_logger = logging.getLogger(__name__)
+
+class NspExportLogs(Command):
+    """Export lịch sử ra vào ra file CSV/Parquet theo dạng stream"""
+    name = 'nsp_export_logs'
+
+    def run(self, args):
+        parser = argparse.ArgumentParser(
+            prog=f'odoo-bin {self.name}',
+            description=self.__doc__,
+        )
+        parser.add_argument('-c', '--config', help="File cấu hình Odoo")
+        parser.add_argument('-d', '--database', help="Tên database")
+        parser.add_argument('-o', '--output', required=True, help="Đường dẫn file đích")
+        parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+        parser.add_argument('--date-from', help="Từ ngày (YYYY-MM-DD)")
+        parser.add_argument('--date-to', help="Đến ngày (YYYY-MM-DD)")
+        parser.add_argument('--gate', help="Tên cổng")
+        parser.add_argument('--vehicle-id', type=int, help="ID của xe")
+        parser.add_argument('--plate', help="Biển số xe")
+        opts = parser.parse_args(args)
+
+        config_args = []
+        if opts.config:
+            config_args += ['-c', opts.config]
+        if opts.database:
+            config_args += ['-d', opts.database]
+        odoo.tools.config.parse_config(config_args)
+
+        dbname = odoo.tools.config['db_name']
+        if not dbname:
+            parser.error("Cần chỉ định database bằng -d hoặc file cấu hình")
+
+        registry = odoo.modules.registry.Registry(dbname)
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            written = env['nsp.vehicle.logs'].export_logs_to_file(
+                opts.output,
+                file_format=opts.format,
+                date_from=opts.date_from,
+                date_to=opts.date_to,
+                gate_name=opts.gate,
+                vehicle_id=opts.vehicle_id,
+                plate_number=opts.plate,
+            )
+        print(f"Đã export {written} bytes vào {opts.output}")
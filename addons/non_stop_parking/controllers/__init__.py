@@ -4,4 +4,9 @@ from . import api_hello
 from . import api_tags
 from . import api_users
 from . import api_vehicles
-from . import api_parking_logs
\ No newline at end of file
+from . import api_parking_logs
+from . import api_export
+from . import api_photos
+from . import api_lots
+from . import api_ingest
+from . import api_readers
\ No newline at end of file
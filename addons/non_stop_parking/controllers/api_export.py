@@ -0,0 +1,60 @@
+# controllers/api_export.py
+
+from odoo import http, api, SUPERUSER_ID, fields
+from odoo.http import request
+from odoo.exceptions import UserError
+from .base import BaseAPI
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+class exportAPIController(http.Controller):
+
+    # ============ EXPORT APIs ============
+
+    @http.route('/api/v1/logs/export', type='http', auth='user', methods=['GET'], readonly=True, csrf=False)
+    def export_logs(self, format='csv', date_from=None, date_to=None, gate_name=None, vehicle_id=None, plate_number=None):
+        """
+        Export lịch sử ra vào dạng stream, bộ nhớ không phụ thuộc số dòng
+        Gồm log đầy đủ, sự kiện ở chế độ lean và log đã lưu trữ; cột source cho biết bảng nguồn (log, event, archive)
+        GET /api/v1/logs/export?format=csv&date_from=2025-01-01&date_to=2025-01-31&gate_name=A1
+        """
+        user = request.env.user
+        if not (user.has_group('non_stop_parking.group_nsp_admin') or user.has_group('non_stop_parking.group_nsp_manager')):
+            return BaseAPI._make_json_response(
+                BaseAPI._get_response(False, message="Không có quyền truy cập", error_code="ACCESS_ERROR"), status=403)
+
+        try:
+            request.env['nsp.vehicle.logs']._check_export_format(format)
+        except UserError as e:
+            return BaseAPI._make_json_response(
+                BaseAPI._get_response(False, message=str(e), error_code="INVALID_PARAMS"), status=400)
+
+        try:
+            filters = {
+                'date_from': date_from and fields.Date.to_date(date_from),
+                'date_to': date_to and fields.Date.to_date(date_to),
+                'gate_name': gate_name,
+                'vehicle_id': vehicle_id and int(vehicle_id),
+                'plate_number': plate_number,
+            }
+        except ValueError:
+            return BaseAPI._make_json_response(
+                BaseAPI._get_response(False, message="Tham số lọc không hợp lệ", error_code="INVALID_PARAMS"), status=400)
+
+        registry = request.env.registry
+
+        def generate():
+            # Cursor của request đã đóng khi response được stream, mở cursor riêng
+            # Cursor chỉ đọc dùng replica (db_replica_host) nếu có cấu hình
+            with registry.cursor(readonly=True) as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                yield from env['nsp.vehicle.logs']._export_stream(cr, format, **filters)
+
+        filename = f"vehicle_logs_{fields.Date.today()}.{format}"
+        return request.make_response(generate(), headers=[
+            ('Content-Type', EXPORT_FORMATS[format]),
+            ('Content-Disposition', f'attachment; filename="{filename}"'),
+        ])
@@ -1,8 +1,6 @@
 # controllers/hello_api.py
 
-import json
 from odoo import http, fields
-from odoo.http import Response
 from .base import BaseAPI
 import logging
 
@@ -10,15 +8,14 @@ _logger = logging.getLogger(__name__)
 
 class helloAPIController(http.Controller):
     # API Hello world for testing
-    @http.route('/api/v1/hello', type='http', auth='public', methods=['GET'], csrf=False, cors='*')
+    @http.route('/api/v1/hello', type='http', auth='public', methods=['GET'], readonly=True, csrf=False, cors='*')
     def hello_plain(self):
-        return Response(json.dumps({'message': 'Hello, world!'}),
-                        content_type='application/json')
+        return BaseAPI._make_json_response({'message': 'Hello, world!'})
         
     # API for testing one tag_id
     @http.route('/api/v1/test/1tag_id', type='json', auth='public', methods=['POST'], csrf=False, cors='*')
-    def hello_tag_id(self):
-        data = json.loads(http.request.httprequest.data)
+    def hello_tag_id(self, **kwargs):
+        data = BaseAPI._get_payload()
         tag_id = data.get('tag_id')
         if not tag_id:
             return {"success": False, "message": "Thiếu trường 'tag_id'"}
@@ -27,17 +24,17 @@ class helloAPIController(http.Controller):
 
     # API for testing many tag_id
     @http.route('/api/v1/test/ntag_id', type='json', auth='public', methods=['POST'], csrf=False, cors='*')
-    def hello_tag_ids(self):
-        data = json.loads(http.request.httprequest.data)
+    def hello_tag_ids(self, **kwargs):
+        data = BaseAPI._get_payload()
         tag_ids = data.get('tag_ids', [])
-        _logger.info(f"tag_ids: {tag_ids}")
+        _logger.debug("tag_ids: %s", tag_ids)
         if not isinstance(tag_ids, list) or not tag_ids:
             return {"success": False, 'message': "Trường 'tag_ids' không hợp lệ."}
         messages = [f"Hello, {tag_id}" for tag_id in tag_ids]
         return {"success": True, "messages": messages}
 
-    @http.route('/api/v1/health', type='json', auth='public', methods=['POST'], csrf=False, cors="*")
-    def health_check(self):
+    @http.route('/api/v1/health', type='json', auth='public', methods=['POST'], readonly=True, csrf=False, cors="*")
+    def health_check(self, **kwargs):
         """Health check API"""
         return BaseAPI._get_response(True, {
             'status': 'healthy',
@@ -0,0 +1,174 @@
+# controllers/api_ingest.py
+
+import json
+import math
+import struct
+from odoo import http, SUPERUSER_ID
+from odoo.http import request
+from .base import BaseAPI
+from .api_parking_logs import ParkingLogsAPIController, CHECK_SCHEMA
+
+# Số sự kiện tối đa trong một request
+MAX_INGEST_EVENTS = 500
+# Kích thước body tối đa (bytes)
+MAX_INGEST_SIZE = 256 * 1024
+# Frame nhị phân: hướng (1 byte, 0 = vào, 1 = ra), seq (uint32 big-endian), số thẻ (1 byte),
+# sau đó mỗi thẻ gồm độ dài (1 byte) và mã thẻ ASCII
+FRAME_HEADER = struct.Struct('>BIB')
+FRAME_DIRECTIONS = {0: 'in', 1: 'out'}
+NDJSON_DIRECTIONS = {'in': 'in', 'out': 'out', 'i': 'in', 'o': 'out'}
+# Sự kiện trả về các lỗi này bị hoàn tác toàn bộ (chỗ đã giữ, idempotency key...) để thiết bị gửi lại
+ROLLBACK_ERRORS = {'SYSTEM_ERROR', 'CREATE_LOG_FAILED'}
+
+class EventRollback(Exception):
+    """Hoàn tác một sự kiện lỗi mà không ảnh hưởng các sự kiện khác trong batch"""
+
+class ingestAPIController(http.Controller):
+
+    @staticmethod
+    def _parse_ndjson(body):
+        """
+        Mỗi dòng là một sự kiện:
+        {"d": "in", "t": ["TID1", "TID2"], "s": 42, "e": "<event_id>", "p": "<photo_token>"}
+        """
+        events = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict) or row.get('d') not in NDJSON_DIRECTIONS:
+                raise ValueError("Sự kiện không hợp lệ")
+            events.append({
+                'direction': NDJSON_DIRECTIONS[row['d']],
+                'tag_ids': row.get('t'),
+                'seq': row.get('s'),
+                'event_id': row.get('e'),
+                'photo_token': row.get('p'),
+            })
+        return events
+
+    @staticmethod
+    def _parse_frames(body):
+        """Đọc các frame nhị phân liên tiếp, xem FRAME_HEADER"""
+        events = []
+        offset = 0
+        try:
+            while offset < len(body):
+                direction, seq, count = FRAME_HEADER.unpack_from(body, offset)
+                offset += FRAME_HEADER.size
+                tag_ids = []
+                for _i in range(count):
+                    length = body[offset]
+                    tag_ids.append(body[offset + 1:offset + 1 + length].decode('ascii'))
+                    offset += 1 + length
+                if offset > len(body) or direction not in FRAME_DIRECTIONS:
+                    raise ValueError("Frame không hợp lệ")
+                events.append({
+                    'direction': FRAME_DIRECTIONS[direction],
+                    'tag_ids': tag_ids,
+                    'seq': seq,
+                    'event_id': None,
+                    'photo_token': None,
+                })
+        except (struct.error, IndexError):
+            raise ValueError("Frame không hợp lệ")
+        return events
+
+    @staticmethod
+    def _error(status, message, error_code):
+        return BaseAPI._make_json_response(
+            BaseAPI._get_response(False, message=message, error_code=error_code), status=status)
+
+    def _process_event(self, gate_api, reader, event):
+        """Xử lý một sự kiện bằng đúng logic của /api/v1/check/in và /api/v1/check/out"""
+        direction = event['direction']
+        data = {
+            'tag_ids': event['tag_ids'],
+            'reader_id': reader.reader_id,
+            'seq': event['seq'],
+            'event_id': event['event_id'],
+            'photo_token': event['photo_token'],
+            'notes': f"Check {direction} từ thiết bị {reader.name}",
+        }
+        error = BaseAPI._validate(data, CHECK_SCHEMA)
+        if error:
+            return error
+
+        handler = gate_api._check_in if direction == 'in' else gate_api._check_out
+        try:
+            with request.env.cr.savepoint():
+                response = gate_api._idempotent(f'/api/v1/check/{direction}', data, handler)
+                if self._must_rollback(response):
+                    raise EventRollback(response)
+        except EventRollback as e:
+            response = e.args[0]
+        except Exception as e:
+            # Lỗi database của một sự kiện không được làm hỏng cả batch
+            response = BaseAPI._handle_exception(e)
+            # _idempotent chưa kịp cộng số liệu đọc của sự kiện lỗi
+            request.env['nsp.reader']._record_read(reader.reader_id, False)
+        return response
+
+    @staticmethod
+    def _must_rollback(response):
+        """Sự kiện lỗi hệ thống hoặc lỗi tạo log của một trong các thẻ"""
+        if response.get('success'):
+            return False
+        if response.get('error_code') in ROLLBACK_ERRORS:
+            return True
+        results = response.get('data')
+        return isinstance(results, list) and any(
+            result.get('error_code') in ROLLBACK_ERRORS for result in results if isinstance(result, dict))
+
+    # ============ INGEST APIs ============
+
+    @http.route('/api/v1/gate/ingest', type='http', auth='none', methods=['POST'], csrf=False, save_session=False)
+    def ingest(self):
+        """
+        Endpoint gọn cho firmware thiết bị đọc, không cần JSON-RPC hay session
+        Header: Authorization: Bearer <token của thiết bị>
+        Body:
+            application/x-ndjson: mỗi dòng một sự kiện, xem _parse_ndjson
+            application/octet-stream: các frame nhị phân, xem FRAME_HEADER
+        Response (application/x-ndjson), mỗi dòng một sự kiện theo thứ tự gửi lên:
+            {"s": 42, "ok": true, "c": "SUCCESS"}
+        """
+        httprequest = request.httprequest
+        reader = request.env['nsp.reader'].sudo()._get_by_token(BaseAPI._get_reader_token())
+        if not reader:
+            return self._error(401, "Token thiết bị không hợp lệ", "UNAUTHORIZED")
+
+        if (httprequest.content_length or 0) > MAX_INGEST_SIZE:
+            return self._error(413, f"Body tối đa {MAX_INGEST_SIZE} bytes", "PAYLOAD_TOO_LARGE")
+        body = httprequest.get_data()
+        if len(body) > MAX_INGEST_SIZE:
+            return self._error(413, f"Body tối đa {MAX_INGEST_SIZE} bytes", "PAYLOAD_TOO_LARGE")
+
+        try:
+            if httprequest.mimetype == 'application/octet-stream':
+                events = self._parse_frames(body)
+            else:
+                events = self._parse_ndjson(body)
+        except ValueError as e:
+            return self._error(400, str(e), "INVALID_PARAMS")
+        if len(events) > MAX_INGEST_EVENTS:
+            return self._error(413, f"Tối đa {MAX_INGEST_EVENTS} sự kiện mỗi request", "TOO_MANY_EVENTS")
+
+        retry_after = BaseAPI._check_rate_limit(reader.reader_id, cost=max(1, len(events)))
+        if retry_after:
+            return BaseAPI._make_json_response(BaseAPI._rate_limited_response(retry_after), status=429,
+                                               headers=[('Retry-After', str(math.ceil(retry_after)))])
+
+        request.update_env(user=SUPERUSER_ID)
+        gate_api = ParkingLogsAPIController()
+        lines = []
+        for event in events:
+            response = self._process_event(gate_api, reader, event)
+            lines.append(BaseAPI._json_dumps({
+                's': event['seq'],
+                'ok': response['success'],
+                'c': response.get('error_code'),
+            }))
+        return request.make_response(b'\n'.join(lines) + b'\n', headers=[
+            ('Content-Type', 'application/x-ndjson'),
+        ])
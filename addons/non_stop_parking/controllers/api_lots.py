@@ -0,0 +1,25 @@
+# controllers/api_lots.py
+
+from odoo import http
+from odoo.http import request
+from .base import BaseAPI
+
+class lotAPIController(http.Controller):
+
+    # ============ LOT APIs ============
+    @http.route('/api/v1/lot/availability', type='json', auth='public', methods=['POST'], readonly=True, csrf=False, cors='*')
+    def lot_availability(self, **kwargs):
+        """
+        Số chỗ trống của các bãi (cho bảng điện tử), đọc từ bộ đếm không đếm log
+        {
+            "lot_code": "HCM01"  (optional)
+        }
+        """
+        try:
+            data = BaseAPI._get_payload()
+            lots = request.env['nsp.lot'].sudo().get_availability(data.get('lot_code'))
+            if data.get('lot_code') and not lots:
+                return BaseAPI._get_response(False, message="Không tìm thấy bãi đỗ xe", error_code="LOT_NOT_FOUND")
+            return BaseAPI._get_response(True, lots, "Lấy số chỗ trống thành công")
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
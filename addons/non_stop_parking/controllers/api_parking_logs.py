@@ -1,42 +1,126 @@
-import json
 from odoo import http
 from odoo.http import request
 from .base import BaseAPI
 
+# Schema payload của check in/out
+CHECK_SCHEMA = {
+    'tag_ids': {'type': list, 'required': True},
+    'photo_url': {'type': str},
+    'photo_token': {'type': str},
+    'notes': {'type': str},
+    'gate_code': {'type': str},
+    'reader_id': {'type': str},
+    'event_id': {'type': (str, int)},
+    'seq': {'type': (int, str)},
+}
+
 class ParkingLogsAPIController(http.Controller):
     
+    def _edge_check(self, direction, tag_ids, data, gate):
+        """Xử lý check in/out ở chế độ edge, cùng định dạng response với chế độ thường"""
+        if gate and not data.get('gate_code'):
+            # Giữ cổng gốc khi gửi lại: cloud gán reader_id theo token của node edge
+            data = dict(data, gate_code=gate.code)
+        decision = request.env['nsp.edge'].sudo().check(direction, tag_ids, data, gate.lot_id.id)
+        if not decision['allowed']:
+            return BaseAPI._get_response(False, data={'reasons': decision['reasons']},
+                                         message=decision['message'], error_code=decision['error_code'])
+        results = [{
+            'tag_id': vehicle['tag_id'],
+            'vehicle_plate_number': vehicle['plate_number'],
+            'vehicle_owner': vehicle['owner_name'],
+            'success': True,
+            'message': f"Ghi nhận offline: {vehicle['plate_number']} - {direction}",
+            'data': {'event_id': decision['event_id'], 'offline': True},
+            'error_code': 'SUCCESS',
+        } for vehicle in decision['vehicles']]
+        return BaseAPI._get_response(True, data=results, message="Successful processing", error_code='SUCCESS')
+
+    def _idempotent(self, endpoint, data, handler):
+        """
+        Xử lý request theo idempotency key (event_id hoặc reader_id + seq)
+        Request gửi lại trả về đúng kết quả của lần xử lý đầu tiên
+        """
+        Idempotency = request.env['nsp.idempotency.key'].sudo()
+        key = Idempotency._get_key(data)
+        if not key:
+            return self._record_read(data, handler(data))
+
+        claimed, response = Idempotency._claim(key, endpoint)
+        if not claimed:
+            if response is None:
+                return BaseAPI._get_response(False, message=f"Sự kiện {key} đã được ghi nhận", error_code="DUPLICATE_EVENT")
+            return response
+
+        response = handler(data)
+        if response.get('error_code') == 'SYSTEM_ERROR':
+            # Không lưu lỗi hệ thống để thiết bị có thể gửi lại
+            Idempotency._release(key)
+        else:
+            Idempotency._store_response(key, response)
+        return self._record_read(data, response)
+
+    def _record_read(self, data, response):
+        """Cộng số liệu đọc thẻ của thiết bị gửi sự kiện, request gửi lại không được tính"""
+        request.env['nsp.reader'].sudo()._record_read(data.get('reader_id'), response.get('success'))
+        return response
+
     # ============ CHECK IN/OUT APIs ============
        
     @http.route('/api/v1/check/in', type='json', auth='public', methods=['POST'], csrf=False, cors='*')
-    def check_in(self):
+    def check_in(self, **kwargs):
         """
         API để ghi nhận xe vào bãi
         {
             "tag_ids": ["TAG001", "TAG002", "TAG003"],
             "photo_url": "https://example.com/photo.jpg",
-            "notes": "Batch check in from API"
+            "photo_token": "<photo_token từ /api/v1/photo/upload>",
+            "notes": "Batch check in from API",
+            "gate_code": "A1-IN"  (hoặc "reader_id": "<mã thiết bị đọc>"),
+            "event_id": "<idempotency key>"  (hoặc "reader_id" + "seq")
         }
         """
         try:
-            data = json.loads(http.request.httprequest.data)
+            data = BaseAPI._get_payload()
+            error = BaseAPI._validate(data, CHECK_SCHEMA)
+            if error:
+                return error
+            reader, error = BaseAPI._authenticate_reader(data.get('reader_id'))
+            if error:
+                return error
+            if reader:
+                # Thiết bị đã xác thực, không dùng reader_id do client tự khai báo
+                data['reader_id'] = reader.reader_id
+            # Chỉ tính bucket thiết bị khi thiết bị đã xác thực, reader_id tự khai báo chỉ tính theo IP
+            retry_after = BaseAPI._check_rate_limit(reader.reader_id if reader else None)
+            if retry_after:
+                return BaseAPI._rate_limited_response(retry_after)
+            return self._idempotent('/api/v1/check/in', data, self._check_in)
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
+
+    def _check_in(self, data):
+        try:
             tag_ids = data.get('tag_ids')
             photo_url = data.get('photo_url')
+            photo_token = data.get('photo_token')
             notes = data.get('notes', 'Check in tự động từ API')
 
-            if not tag_ids:
-                return BaseAPI._get_response(False, message="tag_ids is required", error_code="MISSING_PARAMS")
-
-            if not isinstance(tag_ids, list):
-                return BaseAPI._get_response(False, message="tag_ids must be a list", error_code="INVALID_PARAMS")
-            
-            if notes and not isinstance(notes, str):
-                return BaseAPI._get_response(False, message="Notes phải là string", error_code="INVALID_PARAMS")
-
             # Lọc các tag_id rỗng
             tag_ids = [tag_id for tag_id in tag_ids if tag_id]
 
-            # Tìm tất cả tag_id trong hệ thống
-            system_tags = request.env['nsp.tag'].sudo().search([('tag_id', 'in', tag_ids)])
+            # Xác định cổng và bãi
+            gate = request.env['nsp.gate'].sudo()._resolve_gate(data.get('gate_code'), data.get('reader_id'))
+            if data.get('gate_code') and not gate:
+                return BaseAPI._get_response(False, message=f"Không tìm thấy cổng {data.get('gate_code')}", error_code="GATE_NOT_FOUND")
+
+            # Chế độ edge: quyết định từ snapshot cục bộ, sự kiện được gửi lên cloud sau
+            if request.env['nsp.edge'].sudo()._is_enabled():
+                return self._edge_check('in', tag_ids, data, gate)
+
+            # Tìm tất cả thẻ trong hệ thống theo TID hoặc EPC
+            resolved_tags = request.env['nsp.tag'].sudo()._resolve_tags(tag_ids)
+            system_tags = request.env['nsp.tag'].sudo().union(*resolved_tags.values())
 
             # Lấy vehicle_tags
             vehicle_tags = system_tags.filtered(lambda t: t.vehicle_id)
@@ -50,7 +134,9 @@ class ParkingLogsAPIController(http.Controller):
                     tag_id=vehicle_tag.tag_id,
                     direction='in',
                     photo_url=photo_url,
-                    notes=notes
+                    notes=notes,
+                    photo_token=photo_token,
+                    gate=gate,
                 )
 
                 results.append({
@@ -75,115 +161,82 @@ class ParkingLogsAPIController(http.Controller):
             return BaseAPI._handle_exception(e)
 
     @http.route('/api/v1/check/out', type='json', auth='public', methods=['POST'], csrf=False, cors='*')
-    def check_out(self):
+    def check_out(self, **kwargs):
         """
         API để ghi nhận xe ra khỏi bãi với logic kiểm tra nghiêm ngặt
         {
             "tag_ids": ["TAG001", "TAG002", "TAG003"],
             "photo_url": "https://example.com/photo.jpg",
-            "notes": "Batch check out from API"
+            "photo_token": "<photo_token từ /api/v1/photo/upload>",
+            "notes": "Batch check out from API",
+            "gate_code": "A1-OUT"  (hoặc "reader_id": "<mã thiết bị đọc>"),
+            "event_id": "<idempotency key>"  (hoặc "reader_id" + "seq")
         }
         """
         try:
-            data = json.loads(http.request.httprequest.data)
+            data = BaseAPI._get_payload()
+            error = BaseAPI._validate(data, CHECK_SCHEMA)
+            if error:
+                return error
+            reader, error = BaseAPI._authenticate_reader(data.get('reader_id'))
+            if error:
+                return error
+            if reader:
+                # Thiết bị đã xác thực, không dùng reader_id do client tự khai báo
+                data['reader_id'] = reader.reader_id
+            # Chỉ tính bucket thiết bị khi thiết bị đã xác thực, reader_id tự khai báo chỉ tính theo IP
+            retry_after = BaseAPI._check_rate_limit(reader.reader_id if reader else None)
+            if retry_after:
+                return BaseAPI._rate_limited_response(retry_after)
+            return self._idempotent('/api/v1/check/out', data, self._check_out)
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
+
+    def _check_out(self, data):
+        try:
             tag_ids = data.get('tag_ids', [])
             photo_url = data.get('photo_url')
+            photo_token = data.get('photo_token')
             notes = data.get('notes', 'Check out từ API')
 
-            if not tag_ids:
-                return BaseAPI._get_response(False, message='tag_ids is required', error_code="MISSING_PARAMS")
-
-            if not isinstance(tag_ids, list):
-                return BaseAPI._get_response(False, message='tag_ids phải là danh sách', error_code="INVALID_PARAMS")
-            
             if len(tag_ids) < 2:
                 return BaseAPI._get_response(False, message="Phải có ít nhất 2 thẻ để check out", error_code="INSUFFICIENT_TAGS")
 
-            if notes and not isinstance(notes, str):
-                return BaseAPI._get_response(False, message="Notes phải là string", error_code="INVALID_PARAMS")
-
             # Lọc các tag_id rỗng
             tag_ids = [tag_id for tag_id in tag_ids if tag_id]
 
-            # Tìm tất cả tag_id trong hệ thống
-            system_tags = request.env['nsp.tag'].sudo().search([('tag_id', 'in', tag_ids)])
-
-            # 1. Kiểm tra thẻ có tồn tại trong hệ thống không
-            found_tags = system_tags.mapped('tag_id')
-            missing_tags = set(tag_ids) - set(found_tags)
-            if missing_tags:
-                return BaseAPI._get_response(False, message=f"Các thẻ {", ".join(missing_tags)} không tồn tại trong hệ thống", error_code="TAGS_NOT_FOUND")
-
-            # Kiểm tra tất cả thẻ phải active
-            inactive_tags = system_tags.filtered(lambda x: x.status != 'active')
-            if inactive_tags:
-                return BaseAPI._get_response(False, message=f"Các thẻ {", ".join(inactive_tags.mapped('tag_id'))} không hoạt động", error_code="TAGS_NOT_ACTIVE")
-
-            # 2. Phân loại thẻ
-            person_tags = system_tags.filtered(lambda t: t.partner_id and not t.vehicle_id)
-            vehicle_tags = system_tags.filtered(lambda t: t.vehicle_id and not t.partner_id)
-            unassigned_tags = system_tags.filtered(lambda t: not t.partner_id and not t.vehicle_id)
-            mixed_tags = system_tags.filtered(lambda t: t.partner_id and t.vehicle_id)
-            
-            # Validate các loại thẻ
-            if unassigned_tags:
-                return BaseAPI._get_response(False, message=f"Các thẻ {", ".join(unassigned_tags.mapped("tag_id"))} không được gắn với phương tiện hoặc người dùng", error_code="TAGS_NOT_ASSIGNED")
-            
-            if mixed_tags:
-                return BaseAPI._get_response(False, message=f"Các thẻ {", ".join(mixed_tags.mapped("tag_id"))} đã được gắn với cả phương tiện và người dùng", error_code="TAGS_MIXED_ASSIGNED")
+            # Xác định cổng và bãi
+            gate = request.env['nsp.gate'].sudo()._resolve_gate(data.get('gate_code'), data.get('reader_id'))
+            if data.get('gate_code') and not gate:
+                return BaseAPI._get_response(False, message=f"Không tìm thấy cổng {data.get('gate_code')}", error_code="GATE_NOT_FOUND")
 
-            # 3. Kiểm tra có đủ thẻ người và thẻ xe chưa
-            if not person_tags:
-                return BaseAPI._get_response(False, message="Phải có ít nhất 1 thẻ người dùng", error_code="NO_PERSON_TAG")
-            
-            if not vehicle_tags:
-                return BaseAPI._get_response(False, message="Phải có ít nhất 1 thẻ phương tiện", error_code="NO_VEHICLE_TAG")
-
-            # Lấy danh sách người và xe
-            persons = person_tags.mapped("partner_id")
-            vehicles = vehicle_tags.mapped("vehicle_id")
-
-            # 4. Kiểm tra quyền sở hữu - Mỗi xe phải thuộc về ít nhât 1 người trong danh sách
-            ownership_errors = []
-            for vehicle in vehicles:
-                if not vehicle.owner_partner_id:
-                    ownership_errors.append(f"Xe {vehicle.name} không có người sở hữu")
-                    continue
-
-                if vehicle.owner_partner_id not in persons:
-                    ownership_errors.append(f"Xe {vehicle.name} không thuộc về người dùng {vehicle.owner_partner_id.name}")
-                    continue
-
-            if ownership_errors:
-                return BaseAPI._get_response(False, message=";\n".join(ownership_errors), error_code="INVALID_OWNERSHIP")
-
-            # 5. Kiểm tra trạng thái xe - Xe phải đang ở trong bãi
-            status_errors = []
-            for vehicle in vehicles:
-                if vehicle.current_status != 'inside':
-                    status_errors.append(f"Xe {vehicle.name} - {vehicle.plate_number} không đang ở trong bãi")
-            
-            if status_errors:
-                return BaseAPI._get_response(False, message=";\n".join(status_errors), error_code="INVALID_STATUS")
+            # Chế độ edge: quyết định từ snapshot cục bộ, sự kiện được gửi lên cloud sau
+            if request.env['nsp.edge'].sudo()._is_enabled():
+                return self._edge_check('out', tag_ids, data, gate)
+
+            # Đánh giá toàn bộ luật ra cổng trên dữ liệu đọc một lần
+            decision = request.env['nsp.gate.engine'].sudo().evaluate(tag_ids, 'out', gate.lot_id.id)
+            if not decision['allowed']:
+                return BaseAPI._get_response(False, data={'reasons': decision['reasons']},
+                                             message=decision['message'], error_code=decision['error_code'])
 
             # Gọi method tạo log nếu tất cả thẻ để pass
             results = []
-            for vehicle_tag in vehicle_tags:
-                vehicle = vehicle_tag.vehicle_id
-                person = vehicle_tag.partner_id
-                
+            for vehicle in decision['vehicles']:
                 # Gọi method tạo log
                 result = request.env['nsp.vehicle.logs'].sudo().create_log_entry(
-                    tag_id=vehicle_tag.tag_id,
+                    tag_id=vehicle['tag_id'],
                     direction='out',
                     photo_url=photo_url,
                     notes=notes,
+                    photo_token=photo_token,
+                    gate=gate,
                 )
 
                 results.append({
-                    'tag_id': vehicle_tag.tag_id,
-                    'vehicle_plate_number': vehicle.plate_number if vehicle else None,
-                    'vehicle_owner': person.name if person else None,
+                    'tag_id': vehicle['tag_id'],
+                    'vehicle_plate_number': vehicle['plate_number'],
+                    'vehicle_owner': vehicle['owner_name'],
                     'success': result['success'],
                     'message': result['message'],
                     'data': result.get('data', {}),
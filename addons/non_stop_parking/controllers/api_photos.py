@@ -0,0 +1,47 @@
+# controllers/api_photos.py
+
+import math
+from odoo import http
+from odoo.http import request
+from .base import BaseAPI
+
+class photoAPIController(http.Controller):
+
+    # ============ PHOTO APIs ============
+
+    @http.route('/api/v1/photo/upload', type='http', auth='public', methods=['POST'], csrf=False, cors='*')
+    def upload_photo(self):
+        """
+        Camera làn upload ảnh JPEG dạng raw body (Content-Type: image/jpeg)
+        Header: Authorization: Bearer <token của thiết bị>, không cần nếu đã đăng nhập
+        Trả về photo_token để gửi kèm /api/v1/check/in và /api/v1/check/out
+        """
+        try:
+            httprequest = request.httprequest
+            reader = request.env['nsp.reader'].sudo()._get_by_token(BaseAPI._get_reader_token())
+            if not reader and request.env.user._is_public():
+                return BaseAPI._make_json_response(
+                    BaseAPI._get_response(False, message="Token thiết bị không hợp lệ", error_code="UNAUTHORIZED"), status=401)
+
+            retry_after = BaseAPI._check_rate_limit(reader.reader_id if reader else None)
+            if retry_after:
+                return BaseAPI._make_json_response(BaseAPI._rate_limited_response(retry_after), status=429,
+                                                   headers=[('Retry-After', str(math.ceil(retry_after)))])
+
+            mimetype = httprequest.mimetype or 'image/jpeg'
+            if not mimetype.startswith('image/'):
+                return BaseAPI._make_json_response(
+                    BaseAPI._get_response(False, message="Content-Type phải là ảnh", error_code="INVALID_PARAMS"), status=415)
+
+            photo, created = request.env['nsp.photo'].sudo().store_stream(
+                httprequest.stream,
+                content_length=httprequest.content_length,
+                mimetype=mimetype,
+            )
+            return BaseAPI._make_json_response(BaseAPI._get_response(True, {
+                'photo_token': photo.checksum,
+                'duplicate': not created,
+            }, "Upload ảnh thành công"))
+
+        except Exception as e:
+            return BaseAPI._make_json_response(BaseAPI._handle_exception(e))
@@ -0,0 +1,68 @@
+# controllers/api_readers.py
+
+from odoo import http, fields
+from odoo.http import request
+from .base import BaseAPI
+
+# Số bucket tối đa của mỗi thiết bị trong một request
+MAX_METRIC_POINTS = 5000
+
+# Schema payload của API số liệu thiết bị
+METRICS_SCHEMA = {
+    'reader_ids': {'type': list},
+    'resolution': {'type': str},
+    'date_from': {'type': str},
+    'date_to': {'type': str},
+    'limit': {'type': int},
+}
+
+class readerAPIController(http.Controller):
+
+    # ============ READER APIs ============
+    @http.route('/api/v1/reader/metrics', type='json', auth='user', methods=['POST'], readonly=True, csrf=False, cors='*')
+    def reader_metrics(self, **kwargs):
+        """
+        Chuỗi thời gian RTT, uptime và tốc độ đọc của thiết bị đọc
+        {
+            "reader_ids": ["READER01", "READER02"]  (optional, mặc định tất cả),
+            "resolution": "minute" | "hour" | "day"  (mặc định "hour"),
+            "date_from": "2025-01-01 00:00:00"  (optional, UTC),
+            "date_to": "2025-01-02 00:00:00"  (optional, UTC),
+            "limit": 1000  (số bucket mới nhất tối đa của mỗi thiết bị)
+        }
+        """
+        try:
+            data = BaseAPI._get_payload()
+            error = BaseAPI._validate(data, METRICS_SCHEMA)
+            if error:
+                return error
+            user = request.env.user
+            if not (user.has_group('non_stop_parking.group_nsp_admin') or user.has_group('non_stop_parking.group_nsp_manager')):
+                return BaseAPI._get_response(False, message="Không có quyền truy cập", error_code="ACCESS_ERROR")
+
+            resolution = data.get('resolution', 'hour')
+            if resolution not in ('minute', 'hour', 'day'):
+                return BaseAPI._get_response(False, message="resolution phải là minute, hour hoặc day", error_code="INVALID_PARAMS")
+            limit = data.get('limit', 1000)
+            if not 0 < limit <= MAX_METRIC_POINTS:
+                return BaseAPI._get_response(False, message=f"limit tối đa {MAX_METRIC_POINTS}", error_code="INVALID_PARAMS")
+            try:
+                date_from = fields.Datetime.to_datetime(data.get('date_from'))
+                date_to = fields.Datetime.to_datetime(data.get('date_to'))
+            except ValueError:
+                return BaseAPI._get_response(False, message="date_from/date_to phải có dạng YYYY-MM-DD HH:MM:SS", error_code="INVALID_PARAMS")
+
+            domain = [('reader_id', 'in', data['reader_ids'])] if data.get('reader_ids') else []
+            readers = request.env['nsp.reader'].sudo().search(domain)
+            series = request.env['nsp.reader.metric'].sudo().get_series(
+                readers.ids, resolution, date_from, date_to, limit)
+            return BaseAPI._get_response(True, {
+                'resolution': resolution,
+                'readers': [{
+                    'reader_id': reader.reader_id,
+                    'name': reader.name,
+                    'points': series[reader.id],
+                } for reader in readers],
+            }, "Lấy số liệu thiết bị thành công")
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
@@ -1,25 +1,34 @@
 # controllers/api_tags.py
 
-import json
 from odoo import http
 from odoo.http import request
 from .base import BaseAPI
 
+# Số thẻ tối đa trong một request tạo hàng loạt
+MAX_BULK_TAGS = 10000
+
+# Schema payload của các API một thẻ
+TAG_SCHEMA = {
+    'tag_id': {'type': str, 'required': True},
+    'epc': {'type': str},
+    'status': {'type': str},
+}
+
 class tagAPIController(http.Controller):
-    def _check_param_tag_id(tag_id):
-        if not tag_id:
-            return BaseAPI._get_response(False, message="Tag ID không được để trống", error_code="MISSING_PARAM")
-    
+
     # ============ TAG APIs ============
-    @http.route('/api/v1/tag/check', type='json', auth='public', methods=['POST'], csrf=False, cors='*')
-    def check_tag_exists(self, **data):
+    @http.route('/api/v1/tag/check', type='json', auth='public', methods=['POST'], readonly=True, csrf=False, cors='*')
+    def check_tag_exists(self, **kwargs):
         """Kiểm tra tag có tồn tại trong database không"""
         try:
+            data = BaseAPI._get_payload()
             # Lấy dữ liệu từ request body
+            error = BaseAPI._validate(data, TAG_SCHEMA)
+            if error:
+                return error
             tag_id = data.get('tag_id')
-            self._check_param_tag_id(tag_id)
             
-            tag = request.env['nsp.tag'].sudo().search([('tag_id', '=', tag_id)], limit=1)
+            tag = request.env['nsp.tag'].sudo()._resolve_tag(tag_id)
 
             if tag:
                 tag_data = {
@@ -41,19 +50,23 @@ class tagAPIController(http.Controller):
             return BaseAPI._handle_exception(e)
     
     @http.route('/api/v1/tag/create', type='json', auth='public', methods=['POST'], csrf=False, cors='*')
-    def create_tag(self, **data):
+    def create_tag(self, **kwargs):
         """Tạo bảng mới"""
-        try: 
+        try:
+            data = BaseAPI._get_payload()
+            error = BaseAPI._validate(data, TAG_SCHEMA)
+            if error:
+                return error
             tag_id = data.get('tag_id')
             epc = data.get('epc')
             status = data.get('status', 'pending')
             
-            self._check_param_tag_id(tag_id)
-            
-            # Kiểm tra tag đã tồn tại 
-            existing_tag = request.env['nsp.tag'].sudo().search([('tag_id', '=', tag_id)], limit=1)
-            if existing_tag:
+            # Kiểm tra tag đã tồn tại (TID hoặc EPC đã được dùng)
+            existing_tags = request.env['nsp.tag'].sudo()._resolve_tags([tag_id, epc])
+            if tag_id in existing_tags:
                 return BaseAPI._get_response(False, message='Tag ID đã tồn tại', error_code="TAG_EXISTS")
+            if epc and existing_tags.get(epc, request.env['nsp.tag']).epc == epc:
+                return BaseAPI._get_response(False, message='EPC đã tồn tại', error_code="EPC_EXISTS")
             
             # Tạo tag mới
             tag = request.env['nsp.tag'].sudo().create({
@@ -73,3 +86,152 @@ class tagAPIController(http.Controller):
             
         except Exception as e:
             return BaseAPI._handle_exception(e)
+
+    @http.route('/api/v1/tag/resolve', type='json', auth='public', methods=['POST'], readonly=True, csrf=False, cors='*')
+    def resolve_tags(self, **kwargs):
+        """
+        Tra cứu nhiều thẻ theo TID hoặc EPC trong một truy vấn
+        {
+            "keys": ["E280...", "3000...", ...]
+        }
+        """
+        try:
+            data = BaseAPI._get_payload()
+            keys = data.get('keys')
+
+            if not keys:
+                return BaseAPI._get_response(False, message="keys is required", error_code="MISSING_PARAMS")
+
+            if not isinstance(keys, list):
+                return BaseAPI._get_response(False, message="keys phải là danh sách", error_code="INVALID_PARAMS")
+
+            if len(keys) > MAX_BULK_TAGS:
+                return BaseAPI._get_response(False, message=f"Tối đa {MAX_BULK_TAGS} thẻ mỗi request", error_code="TOO_MANY_TAGS")
+
+            resolved = request.env['nsp.tag'].sudo()._resolve_tags(keys)
+            tags_data = {}
+            for key in keys:
+                tag = resolved.get(key)
+                tags_data[key] = {
+                    'id': tag.id,
+                    'tag_id': tag.tag_id,
+                    'epc': tag.epc,
+                    'status': tag.status,
+                    'partner_id': tag.partner_id.id or None,
+                    'vehicle_id': tag.vehicle_id.id or None,
+                } if tag else None
+
+            return BaseAPI._get_response(True, tags_data, f"Tìm thấy {len(resolved)}/{len(keys)} thẻ")
+
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
+
+    @http.route('/api/v1/tag/bulk_create', type='json', auth='user', methods=['POST'], csrf=False, cors='*')
+    def bulk_create_tags(self, **kwargs):
+        """
+        Tạo thẻ hàng loạt
+        {
+            "tags": [{"tag_id": "E280...", "epc": "3000..."}, ...],
+            "status": "pending"
+        }
+        """
+        try:
+            data = BaseAPI._get_payload()
+            user = request.env.user
+            if not (user.has_group('non_stop_parking.group_nsp_admin') or user.has_group('non_stop_parking.group_nsp_manager')):
+                return BaseAPI._get_response(False, message="Không có quyền truy cập", error_code="ACCESS_ERROR")
+
+            tags = data.get('tags')
+            status = data.get('status', 'pending')
+
+            if not tags:
+                return BaseAPI._get_response(False, message="tags is required", error_code="MISSING_PARAMS")
+
+            if not isinstance(tags, list) or not all(isinstance(tag, dict) for tag in tags):
+                return BaseAPI._get_response(False, message="tags phải là danh sách object", error_code="INVALID_PARAMS")
+
+            if len(tags) > MAX_BULK_TAGS:
+                return BaseAPI._get_response(False, message=f"Tối đa {MAX_BULK_TAGS} thẻ mỗi request", error_code="TOO_MANY_TAGS")
+
+            result = request.env['nsp.tag'].sudo().bulk_provision(tags, status=status)
+            return BaseAPI._get_response(True, {
+                'created': result['created'],
+                'conflict_count': len(result['conflicts']),
+                'conflicts': result['conflicts'],
+            }, f"Đã tạo {result['created']}/{len(tags)} thẻ")
+
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
+
+    # ============ BULK ASSIGNMENT APIs ============
+    @http.route('/api/v1/assign-tag/bulk', type='json', auth='user', methods=['POST'], csrf=False, cors='*')
+    def bulk_assign_tags(self, **kwargs):
+        """
+        Gán thẻ hàng loạt cho phương tiện hoặc người dùng
+        {
+            "assignments": [{"vehicle_id": 1, "tag_id": "E280..."}, {"partner_id": 7, "tag_id": "E281..."}, ...]
+        }
+        """
+        try:
+            data = BaseAPI._get_payload()
+            user = request.env.user
+            if not (user.has_group('non_stop_parking.group_nsp_admin') or user.has_group('non_stop_parking.group_nsp_manager')):
+                return BaseAPI._get_response(False, message="Không có quyền truy cập", error_code="ACCESS_ERROR")
+
+            assignments = data.get('assignments')
+
+            if not assignments:
+                return BaseAPI._get_response(False, message="assignments is required", error_code="MISSING_PARAMS")
+
+            if not isinstance(assignments, list) or not all(isinstance(row, dict) for row in assignments):
+                return BaseAPI._get_response(False, message="assignments phải là danh sách object", error_code="INVALID_PARAMS")
+
+            if len(assignments) > MAX_BULK_TAGS:
+                return BaseAPI._get_response(False, message=f"Tối đa {MAX_BULK_TAGS} thẻ mỗi request", error_code="TOO_MANY_TAGS")
+
+            result = request.env['nsp.tag'].sudo().bulk_assign(assignments)
+            return BaseAPI._get_response(True, {
+                'assigned': result['assigned'],
+                'created': result['created'],
+                'replaced': result['replaced'],
+                'conflict_count': len(result['conflicts']),
+                'conflicts': result['conflicts'],
+            }, f"Đã gán {result['assigned']}/{len(assignments)} thẻ")
+
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
+
+    @http.route('/api/v1/revoke-tag/bulk', type='json', auth='user', methods=['POST'], csrf=False, cors='*')
+    def bulk_revoke_tags(self, **kwargs):
+        """
+        Thu hồi thẻ hàng loạt theo TID hoặc EPC
+        {
+            "tag_ids": ["E280...", "3000..."]
+        }
+        """
+        try:
+            data = BaseAPI._get_payload()
+            user = request.env.user
+            if not (user.has_group('non_stop_parking.group_nsp_admin') or user.has_group('non_stop_parking.group_nsp_manager')):
+                return BaseAPI._get_response(False, message="Không có quyền truy cập", error_code="ACCESS_ERROR")
+
+            tag_ids = data.get('tag_ids')
+
+            if not tag_ids:
+                return BaseAPI._get_response(False, message="tag_ids is required", error_code="MISSING_PARAMS")
+
+            if not isinstance(tag_ids, list) or not all(isinstance(tag_id, str) for tag_id in tag_ids):
+                return BaseAPI._get_response(False, message="tag_ids phải là danh sách chuỗi", error_code="INVALID_PARAMS")
+
+            if len(tag_ids) > MAX_BULK_TAGS:
+                return BaseAPI._get_response(False, message=f"Tối đa {MAX_BULK_TAGS} thẻ mỗi request", error_code="TOO_MANY_TAGS")
+
+            result = request.env['nsp.tag'].sudo().bulk_revoke(tag_ids)
+            return BaseAPI._get_response(True, {
+                'revoked': result['revoked'],
+                'conflict_count': len(result['conflicts']),
+                'conflicts': result['conflicts'],
+            }, f"Đã thu hồi {result['revoked']}/{len(tag_ids)} thẻ")
+
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
@@ -1,40 +1,63 @@
 # controllers/api_users.py
 
-import json
 from odoo import http
 from odoo.http import request
 from .base import BaseAPI
 
+# Số khách hàng tối đa trong một request nhập hàng loạt
+MAX_BULK_CUSTOMERS = 10000
+# Các trường được phép truyền khi nhập khách hàng
+ONBOARD_FIELDS = ('name', 'email', 'phone', 'citizen_id')
+
+# Schema payload gán thẻ cho người dùng
+ASSIGN_TAG_SCHEMA = {
+    'user_id': {'type': int, 'required': True},
+    'tag_id': {'type': str, 'required': True},
+}
+
 class userAPIController(http.Controller):
     
     # ============ USER APIs ============
 
-    @http.route('/api/v1/user/list', type='json', auth='public', methods=['POST'], csrf=False, cors="*")
-    def list_users(self):
-        """Lấy danh sách người dùng"""
+    @http.route('/api/v1/user/list', type='json', auth='public', methods=['POST'], readonly=True, csrf=False, cors="*")
+    def list_users(self, **kwargs):
+        """
+        Lấy danh sách người dùng theo keyset pagination, sắp xếp theo login giảm dần
+        {
+            "limit": 50,
+            "cursor": "<next_cursor của trang trước>"
+        }
+        """
         try:
-            data = json.loads(http.request.httprequest.data)
-            limit = data.get('limit', 50)
-            offset = data.get('offset', 0)
-            
-            users = request.env['res.users'].sudo().search([], limit=limit, offset=offset, order='name desc')
-            
+            data = BaseAPI._get_payload()
+            limit = BaseAPI._page_size(data.get('limit'))
+            offset = data.get('offset') or 0
+            cursor = data.get('cursor')
+
+            Users = request.env['res.users'].sudo()
+            # name nằm trên res.partner nên phân trang theo login (cột của res_users, có index unique)
+            users, next_cursor = BaseAPI._keyset_page(
+                Users, [], ['name', 'email', 'phone', 'login', 'create_date'], limit, cursor,
+                field='login', offset=offset)
+
             users_data = []
             for user in users:
                 users_data.append({
-                    'id': user.id,
-                    'name': user.display_name,
-                    'email': user.email or '',
-                    'phone': user.phone or '',
-                    'login': user.login,
-                    'create_date': user.create_date.isoformat(),
+                    'id': user['id'],
+                    'name': user['name'],
+                    'email': user['email'] or '',
+                    'phone': user['phone'] or '',
+                    'login': user['login'],
+                    'create_date': user['create_date'].isoformat(),
                 })
-            
+
             return BaseAPI._get_response(True, {
                     'users': users_data,
-                    'total': len(users),
+                    # Chỉ đếm tổng ở trang đầu, các trang sau không phải quét lại
+                    'total': Users.search_count([]) if not cursor else None,
                     'limit': limit,
                     'offset': offset,
+                    'next_cursor': next_cursor,
                 }, 'Lấy danh sách người dùng thành công')
         except Exception as e:
             return BaseAPI._handle_exception(e)
@@ -42,16 +65,16 @@ class userAPIController(http.Controller):
     # ============ TAG ASSIGNMENT APIs ============
     
     @http.route('/api/v1/assign-tag/user', type='json', auth='public', methods=['POST'], csrf=False, cors="*")
-    def assign_tag_to_user(self):
+    def assign_tag_to_user(self, **kwargs):
         """Gán tag cho user"""
         try:
-            data = json.loads(http.request.httprequest.data)
+            data = BaseAPI._get_payload()
+            error = BaseAPI._validate(data, ASSIGN_TAG_SCHEMA)
+            if error:
+                return error
             user_id = data.get('user_id')
             tag_id = data.get('tag_id')
             
-            if not user_id or not tag_id:
-                return BaseAPI._get_response(False, message='user_id and tag_id are required', error_code="MISSING_PARAMS")
-            
             # Kiểm tra user_id có tồn tại không
             user_id = request.env['res.users'].sudo().browse(user_id)
             if not user_id.exists():
@@ -63,4 +86,39 @@ class userAPIController(http.Controller):
         
         except Exception as e:
             return BaseAPI._handle_exception(e)
-            
\ No newline at end of file
+
+    @http.route('/api/v1/user/bulk_onboard', type='json', auth='user', methods=['POST'], csrf=False, cors="*")
+    def bulk_onboard_customers(self, **kwargs):
+        """
+        Nhập khách hàng hàng loạt, mặc định chưa tạo tài khoản đăng nhập
+        {
+            "customers": [{"name": "Nguyễn Văn A", "email": "a@example.com", "phone": "...", "citizen_id": "..."}, ...],
+            "create_login": false
+        }
+        """
+        try:
+            data = BaseAPI._get_payload()
+            user = request.env.user
+            if not (user.has_group('non_stop_parking.group_nsp_admin') or user.has_group('non_stop_parking.group_nsp_manager')):
+                return BaseAPI._get_response(False, message="Không có quyền truy cập", error_code="ACCESS_ERROR")
+
+            customers = data.get('customers')
+            if not customers:
+                return BaseAPI._get_response(False, message="customers is required", error_code="MISSING_PARAMS")
+
+            if not isinstance(customers, list) or not all(isinstance(row, dict) and row.get('name') for row in customers):
+                return BaseAPI._get_response(False, message="customers phải là danh sách object có name", error_code="INVALID_PARAMS")
+
+            if len(customers) > MAX_BULK_CUSTOMERS:
+                return BaseAPI._get_response(False, message=f"Tối đa {MAX_BULK_CUSTOMERS} khách hàng mỗi request", error_code="TOO_MANY_CUSTOMERS")
+
+            vals_list = [{field: row[field] for field in ONBOARD_FIELDS if row.get(field)} for row in customers]
+            partner_ids = request.env['res.partner'].sudo().bulk_onboard_customers(
+                vals_list, create_login=bool(data.get('create_login')))
+            return BaseAPI._get_response(True, {
+                'created': len(partner_ids),
+                'partner_ids': partner_ids,
+            }, f"Đã tạo {len(partner_ids)} khách hàng")
+
+        except Exception as e:
+            return BaseAPI._handle_exception(e)
@@ -1,66 +1,150 @@
-import json
-from odoo import http
+from werkzeug.http import http_date
+from odoo import http, fields
 from odoo.http import request
-from .base import BaseAPI
+from .base import BaseAPI, MAX_PAGE_SIZE
+
+# Schema payload của các API phương tiện
+LIST_SCHEMA = {
+    'owner_partner_id': {'type': int, 'required': True},
+    'limit': {'type': int},
+    'offset': {'type': int},
+    'cursor': {'type': str},
+}
+ASSIGN_TAG_SCHEMA = {
+    'vehicle_id': {'type': int, 'required': True},
+    'tag_id': {'type': str, 'required': True},
+}
 
 class vehicleAPIController(http.Controller):
     
     # ============ VEHICLE APIs ============
     
-    @http.route('/api/v1/vehicle/list', type='json', auth='public', methods=['POST'], csrf=False, cors='*')
-    def list_vehicles(self):
+    @http.route('/api/v1/vehicle/list', type='json', auth='public', methods=['POST'], readonly=True, csrf=False, cors='*')
+    def list_vehicles(self, **kwargs):
+        """
+        Lấy danh sách phương tiện của một người dùng theo keyset pagination
+        {
+            "owner_partner_id": 1,
+            "limit": 50,
+            "cursor": "<next_cursor của trang trước>"
+        }
+        """
         try:
-            data = json.loads(http.request.httprequest.data)
-            limit = data.get('limit', 50)
-            offset = data.get('offset', 0)
+            data = BaseAPI._get_payload()
+            error = BaseAPI._validate(data, LIST_SCHEMA)
+            if error:
+                return error
+            limit = BaseAPI._page_size(data.get('limit'))
+            offset = data.get('offset') or 0
+            cursor = data.get('cursor')
             owner_partner_id = data.get('owner_partner_id')
-            if not limit:
-                limit = 50
-            if not offset:
-                offset = 0
-            if not owner_partner_id:
-                return BaseAPI._get_response(False, message='owner_partner_id is required', error_code="MISSING_PARAMS")
-                
-            
+
             domain = [('owner_partner_id', '=', owner_partner_id)]
-            
-            vehicles = request.env['nsp.vehicle'].sudo().search(domain, limit=limit, offset=offset, order='name desc')
+
+            Vehicles = request.env['nsp.vehicle'].sudo()
+            vehicles, next_cursor = BaseAPI._keyset_page(
+                Vehicles, domain,
+                ['name', 'plate_number', 'color', 'vehicle_type', 'vehicle_tag_id', 'create_date'],
+                limit, cursor, offset=offset)
+
+            # Mọi xe trong trang đều cùng chủ sở hữu
+            owner_name = request.env['res.partner'].sudo().browse(owner_partner_id).name if vehicles else None
 
             vehicles_data = []
             for vehicle in vehicles:
                 vehicles_data.append({
-                    'id': vehicle.id,
-                    'name': vehicle.name,
-                    'plate_number': vehicle.plate_number,
-                    'color': vehicle.color,
-                    'vehicle_type': vehicle.vehicle_type,
-                    'owner_partner_id': vehicle.owner_partner_id.id,
-                    'owner_name': vehicle.owner_partner_id.name,
-                    'vehicle_tag_id': vehicle.vehicle_tag_id.id if vehicle.vehicle_tag_id else None,
-                    'create_date': vehicle.create_date.isoformat(),
+                    'id': vehicle['id'],
+                    'name': vehicle['name'],
+                    'plate_number': vehicle['plate_number'],
+                    'color': vehicle['color'],
+                    'vehicle_type': vehicle['vehicle_type'],
+                    'owner_partner_id': owner_partner_id,
+                    'owner_name': owner_name,
+                    'vehicle_tag_id': vehicle['vehicle_tag_id'] or None,
+                    'create_date': vehicle['create_date'].isoformat(),
                 })
-            
+
             return BaseAPI._get_response(True, {
                     'vehicles': vehicles_data,
-                    'total': len(vehicles),
+                    # Chỉ đếm tổng ở trang đầu, các trang sau không phải quét lại
+                    'total': Vehicles.search_count(domain) if not cursor else None,
                     'limit': limit,
                     'offset': offset,
+                    'next_cursor': next_cursor,
                 }, 'Lấy danh sách phương tiện thành công')
         except Exception as e:
             return BaseAPI._handle_exception(e)
     
+    @http.route('/api/v1/vehicle/status', type='http', auth='user', methods=['GET'], readonly=True, csrf=False, cors='*')
+    def vehicle_status(self, ids=None, plates=None, **kwargs):
+        """
+        Trạng thái nhiều xe trong một request, hỗ trợ ETag / If-Modified-Since
+        GET /api/v1/vehicle/status?ids=1,2,3&plates=51A-12345,59B-67890
+        Thời gian đỗ và phí tạm tính được tính tại thời điểm 'as_of'; khi nhận 304 client tự tính tiếp từ entry_time.
+        """
+        try:
+            vehicle_ids = [int(vehicle_id) for vehicle_id in (ids or '').split(',') if vehicle_id.strip()]
+        except ValueError:
+            return BaseAPI._make_json_response(
+                BaseAPI._get_response(False, message="ids phải là danh sách số", error_code="INVALID_PARAMS"), status=400)
+        plate_numbers = [plate.strip() for plate in (plates or '').split(',') if plate.strip()]
+        if not vehicle_ids and not plate_numbers:
+            return BaseAPI._make_json_response(
+                BaseAPI._get_response(False, message="ids hoặc plates is required", error_code="MISSING_PARAMS"), status=400)
+        if len(vehicle_ids) + len(plate_numbers) > MAX_PAGE_SIZE:
+            return BaseAPI._make_json_response(
+                BaseAPI._get_response(False, message=f"Tối đa {MAX_PAGE_SIZE} xe mỗi request", error_code="INVALID_PARAMS"), status=400)
+
+        try:
+            domain = ['|', ('id', 'in', vehicle_ids), ('plate_number', 'in', plate_numbers)]
+            user = request.env.user
+            if not (user.has_group('non_stop_parking.group_nsp_admin') or user.has_group('non_stop_parking.group_nsp_manager')):
+                # Người dùng thường chỉ xem được xe của mình
+                domain = [('owner_partner_id', '=', user.partner_id.id)] + domain
+
+            now = fields.Datetime.now()
+            status = request.env['nsp.vehicle'].sudo().get_status(domain, now)
+            last_modified = status['last_modified']
+            headers = [('ETag', f'"{status["etag"]}"'), ('Cache-Control', 'private, no-cache')]
+            if last_modified:
+                headers.append(('Last-Modified', http_date(last_modified)))
+
+            # If-None-Match được ưu tiên hơn If-Modified-Since (RFC 9110)
+            httprequest = request.httprequest
+            if httprequest.if_none_match:
+                not_modified = httprequest.if_none_match.contains(status['etag'])
+            else:
+                since = httprequest.if_modified_since
+                not_modified = bool(last_modified and since
+                                    and last_modified.replace(microsecond=0) <= since.replace(tzinfo=None))
+            if not_modified:
+                return request.make_response(b'', status=304, headers=headers)
+
+            found_ids = {vehicle['vehicle_id'] for vehicle in status['vehicles']}
+            found_plates = {vehicle['plate_number'] for vehicle in status['vehicles']}
+            return BaseAPI._make_json_response(BaseAPI._get_response(True, {
+                'vehicles': status['vehicles'],
+                'not_found': {
+                    'ids': [vehicle_id for vehicle_id in vehicle_ids if vehicle_id not in found_ids],
+                    'plates': [plate for plate in plate_numbers if plate not in found_plates],
+                },
+                'as_of': now.isoformat(),
+            }, f"Tìm thấy {len(status['vehicles'])} xe"), headers=headers)
+        except Exception as e:
+            return BaseAPI._make_json_response(BaseAPI._handle_exception(e), status=500)
+
     # ============ TAG ASSIGNMENT APIs ============
     
     @http.route('/api/v1/assign-tag/vehicle', type='json', auth='public', methods=['POST'], csrf=False, cors="*")
-    def assign_tag_to_vehicle(self):
+    def assign_tag_to_vehicle(self, **kwargs):
         """Gán thẻ cho vehicle - API lắng nghe từ Windows app"""
         try:
-            data = json.loads(http.request.httprequest.data)
+            data = BaseAPI._get_payload()
+            error = BaseAPI._validate(data, ASSIGN_TAG_SCHEMA)
+            if error:
+                return error
             vehicle_id = data.get('vehicle_id')
             tag_id = data.get('tag_id')
-
-            if not vehicle_id or not tag_id:
-                return BaseAPI._get_response(False, message='vehicle_id and tag_id are required', error_code="MISSING_PARAMS")
             
             # Kiểm tra vehicle_id có tồn tại không
             vehicle = request.env['nsp.vehicle'].sudo().browse(vehicle_id)
@@ -1,9 +1,31 @@
+import base64
+import json
 import logging
+import random
+from odoo.http import request
 from odoo.exceptions import ValidationError, AccessError
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 _logger = logging.getLogger(__name__)
 
 BASE_URL = 'http://192.168.1.222:8069'
+# Số bản ghi tối đa mỗi trang của các API danh sách
+MAX_PAGE_SIZE = 200
+# Tỉ lệ response lỗi được ghi log ở mức INFO, toàn bộ response chỉ được ghi ở mức DEBUG
+LOG_SAMPLE_RATE = 0.01
+# Tên kiểu dữ liệu trong thông báo lỗi validate
+TYPE_NAMES = {
+    list: 'danh sách',
+    dict: 'object',
+    str: 'string',
+    int: 'số nguyên',
+    float: 'số',
+    bool: 'boolean',
+}
 
 class BaseAPI:
     @staticmethod
@@ -14,11 +36,134 @@ class BaseAPI:
             'message': message,
             'data': data or {}
         }
-        _logger.info(f"API Response: {response}")
         if error_code:
             response['error_code'] = error_code
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("API Response: %s", response)
+        elif not success and random.random() < LOG_SAMPLE_RATE:
+            _logger.info("API Response (sampled): %s - %s", error_code, message)
         return response
 
+    @staticmethod
+    def _get_payload():
+        """
+        Body của request JSON, dùng lại dữ liệu Odoo đã parse thay vì đọc lại httprequest.data
+        Chấp nhận cả body phẳng {"tag_ids": [...]} lẫn JSON-RPC {"params": {...}}
+        """
+        payload = getattr(request.dispatcher, 'jsonrequest', None)
+        if payload is None:
+            payload = json.loads(request.httprequest.get_data() or b'{}')
+        if isinstance(payload, dict) and isinstance(payload.get('params'), dict):
+            return payload['params']
+        return payload
+
+    @staticmethod
+    def _validate(data, schema):
+        """
+        Kiểm tra payload theo schema khai báo
+        Args:
+            data (dict): Payload
+            schema (dict): {field: {'type': kiểu hoặc tuple kiểu, 'required': bool}}
+        Returns:
+            dict: Response lỗi, None nếu hợp lệ
+        """
+        if not isinstance(data, dict):
+            return BaseAPI._get_response(False, message="Body phải là object JSON", error_code="INVALID_PARAMS")
+        for field, rule in schema.items():
+            value = data.get(field)
+            if value is None or value == '' or value == []:
+                if rule.get('required'):
+                    return BaseAPI._get_response(False, message=f"{field} is required", error_code="MISSING_PARAMS")
+                continue
+            types = rule.get('type')
+            if types and not isinstance(value, types):
+                types = types if isinstance(types, tuple) else (types,)
+                type_name = ' hoặc '.join(TYPE_NAMES.get(t, t.__name__) for t in types)
+                return BaseAPI._get_response(False, message=f"{field} phải là {type_name}", error_code="INVALID_PARAMS")
+        return None
+
+    @staticmethod
+    def _get_reader_token():
+        """Token của thiết bị trong header Authorization: Bearer <token> hoặc X-NSP-Reader-Token"""
+        headers = request.httprequest.headers
+        authorization = headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            return authorization[7:].strip()
+        return headers.get('X-NSP-Reader-Token')
+
+    @staticmethod
+    def _authenticate_reader(reader_code=None):
+        """
+        Xác thực thiết bị gọi API cổng theo token
+        Request không có token hợp lệ bị từ chối khi nsp.require_reader_token được bật,
+        hoặc khi reader_id khai báo trong payload là thiết bị đã được cấp token
+        Args:
+            reader_code (str): reader_id do client khai báo (optional)
+        Returns:
+            tuple: (nsp.reader hoặc recordset rỗng, response lỗi hoặc None)
+        """
+        token = BaseAPI._get_reader_token()
+        Reader = request.env['nsp.reader'].sudo()
+        reader = Reader._get_by_token(token)
+        if token and not reader:
+            return reader, BaseAPI._get_response(False, message="Token thiết bị không hợp lệ", error_code="UNAUTHORIZED")
+        if not reader and (reader_code in Reader._get_token_reader_codes()
+                           or request.env['ir.config_parameter'].sudo().get_param('nsp.require_reader_token')):
+            return reader, BaseAPI._get_response(False, message="Thiếu token thiết bị", error_code="UNAUTHORIZED")
+        return reader, None
+
+    @staticmethod
+    def _check_rate_limit(reader_id=None, cost=1):
+        """
+        Kiểm tra token bucket theo IP và theo thiết bị đọc
+        Bucket đã cạn được phát hiện trên cursor của request (một SELECT), request bị chặn không mở thêm kết nối.
+        Request được phép lấy token trên cursor riêng tự commit: nếu dùng cursor của request, khóa dòng
+        bucket bị giữ đến hết transaction của cổng và mọi request cùng IP/thiết bị phải chờ nhau.
+        Sau reverse proxy cần bật proxy_mode để remote_addr là IP của client (X-Forwarded-For),
+        nếu không mọi thiết bị dùng chung bucket IP của proxy.
+        Args:
+            reader_id (str): Mã thiết bị đã xác thực bằng token, None để chỉ kiểm tra theo IP
+            cost (int): Số token cần lấy, request cần nhiều hơn burst luôn bị chặn
+        Returns:
+            float: 0 nếu được phép, số giây cần chờ nếu vượt giới hạn
+        """
+        buckets = [('ip', request.httprequest.remote_addr)]
+        if reader_id:
+            buckets.append(('reader', reader_id))
+        RateLimit = request.env['nsp.rate.limit'].sudo()
+        for scope, identifier in buckets:
+            retry_after = RateLimit._precheck(scope, identifier, cost)
+            if retry_after:
+                return retry_after
+
+        with request.env.registry.cursor() as cr:
+            RateLimit = request.env(cr=cr, su=True)['nsp.rate.limit']
+            for scope, identifier in buckets:
+                retry_after = RateLimit._consume(scope, identifier, cost)
+                if retry_after:
+                    return retry_after
+        return 0
+
+    @staticmethod
+    def _rate_limited_response(retry_after):
+        return BaseAPI._get_response(False, data={'retry_after': retry_after},
+                                     message=f"Vượt quá giới hạn tần suất, thử lại sau {retry_after} giây",
+                                     error_code="RATE_LIMITED")
+
+    @staticmethod
+    def _json_dumps(data):
+        """Serialize JSON, dùng orjson nếu có cài đặt"""
+        if orjson is not None:
+            return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+
+    @staticmethod
+    def _make_json_response(data, status=200, headers=None):
+        """Response JSON cho các route type='http'"""
+        return request.make_response(BaseAPI._json_dumps(data), status=status, headers=[
+            ('Content-Type', 'application/json; charset=utf-8'),
+        ] + list(headers or []))
+
     @staticmethod
     def _handle_exception(e):
         """Xử lý exception và trả về response lỗi"""
@@ -31,4 +176,73 @@ class BaseAPI:
     
     @staticmethod
     def _base_url():
-        return BASE_URL
\ No newline at end of file
+        return BASE_URL
+
+    @staticmethod
+    def _page_size(limit, default=50):
+        """Chuẩn hóa limit của API danh sách"""
+        try:
+            limit = int(limit or default)
+        except (TypeError, ValueError):
+            raise ValidationError("limit phải là số")
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    @staticmethod
+    def _encode_cursor(values):
+        """Mã hóa vị trí bản ghi cuối của trang thành cursor cho trang tiếp theo"""
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        """
+        Giải mã cursor do _encode_cursor tạo ra
+        Returns:
+            list: [giá trị trường sắp xếp, id]
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError, AttributeError):
+            raise ValidationError("cursor không hợp lệ")
+        if not (isinstance(values, list) and len(values) == 2
+                and isinstance(values[0], (str, int, float, bool, type(None)))
+                and isinstance(values[1], int) and not isinstance(values[1], bool)):
+            raise ValidationError("cursor không hợp lệ")
+        return values
+
+    @staticmethod
+    def _keyset_domain(cursor, field='name'):
+        """
+        Domain lấy các bản ghi nằm sau cursor, với thứ tự '<field> desc nulls last, id desc'
+        Args:
+            cursor (str): Cursor của trang trước
+            field (str): Trường sắp xếp chính
+        Returns:
+            list: Domain keyset
+        """
+        value, record_id = BaseAPI._decode_cursor(cursor)
+        if value is False or value is None:
+            # Cursor nằm trong nhóm NULL ở cuối: chỉ còn các bản ghi NULL có id nhỏ hơn
+            return [(field, '=', False), ('id', '<', record_id)]
+        return ['|', '|', (field, '<', value), (field, '=', False),
+                '&', (field, '=', value), ('id', '<', record_id)]
+
+    @staticmethod
+    def _keyset_page(model, domain, fields, limit, cursor=None, field='name', offset=0):
+        """
+        Đọc một trang theo keyset pagination bằng search_read
+        offset chỉ được dùng khi không có cursor, để tương thích với client cũ
+        Returns:
+            tuple: (danh sách bản ghi, cursor trang tiếp theo hoặc None)
+        """
+        page_domain = list(domain)
+        if cursor:
+            page_domain += BaseAPI._keyset_domain(cursor, field)
+            offset = 0
+        records = model.search_read(
+            page_domain, fields, offset=offset, limit=limit + 1, order=f'{field} desc nulls last, id desc', load=None)
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            last = records[-1]
+            next_cursor = BaseAPI._encode_cursor([last[field], last['id']])
+        return records, next_cursor
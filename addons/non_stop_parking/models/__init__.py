@@ -1,11 +1,21 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 # models/__init__.py
+from . import plate
 from . import vehicle_logs
+from . import vehicle_logs_archive
+from . import gate_event
+from . import gate_engine
+from . import edge
+from . import idempotency
+from . import rate_limit
+from . import photo
 from . import tag
 from . import user
 from . import vehicle
 from . import reader
+from . import reader_metric
+from . import lot
 from . import role
 from . import bill
 from . import funds_package
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from odoo import models, fields, api, tools, _
+from .gate_engine import TagRow, VehicleRow, PartnerRow, GateContext
+
+_logger = logging.getLogger(__name__)
+
+# Số sự kiện gửi lại lên cloud mỗi lần chạy cron
+REPLAY_BATCH_SIZE = 200
+REPLAY_TIMEOUT = 10
+# Lỗi tạm thời từ cloud: dừng batch và giữ sự kiện ở trạng thái pending để gửi lại ở lần chạy sau
+# UNAUTHORIZED: token của node edge chưa được cấu hình hoặc đã bị thu hồi trên cloud
+REPLAY_RETRY_ERRORS = {'RATE_LIMITED', 'UNAUTHORIZED'}
+
+SNAPSHOT_SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE tags (key TEXT PRIMARY KEY, id INTEGER, tag_id TEXT, status TEXT,
+                       valid_from TEXT, valid_to TEXT, partner_id INTEGER, vehicle_id INTEGER);
+    CREATE TABLE vehicles (id INTEGER PRIMARY KEY, name TEXT, plate_number TEXT, owner_id INTEGER,
+                           vehicle_type TEXT, current_status TEXT, lot_id INTEGER);
+    CREATE TABLE partners (id INTEGER PRIMARY KEY, name TEXT, current_funds REAL);
+"""
+
+JOURNAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_id TEXT NOT NULL UNIQUE,
+        direction TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS journal_state_seq_idx ON journal (state, seq);
+    CREATE TABLE IF NOT EXISTS vehicle_state (
+        vehicle_id INTEGER PRIMARY KEY,
+        current_status TEXT,
+        lot_id INTEGER,
+        updated_at TEXT
+    );
+"""
+
+
+class EdgeStore:
+    """
+    Dữ liệu cục bộ của một node edge, không phụ thuộc PostgreSQL/ORM:
+    - snapshot.sqlite: thẻ, phương tiện, chủ sở hữu được phép; được thay nguyên file khi làm mới
+    - journal.sqlite: sự kiện ra vào ghi nhận khi offline và trạng thái xe kể từ snapshot
+    """
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot_path = os.path.join(path, 'snapshot.sqlite')
+        self.journal_path = os.path.join(path, 'journal.sqlite')
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._journal = sqlite3.connect(self.journal_path, check_same_thread=False, isolation_level=None)
+        self._journal.execute('PRAGMA journal_mode=WAL')
+        self._journal.executescript(JOURNAL_SCHEMA)
+        self._snapshot = None
+        self._snapshot_mtime = None
+
+    @classmethod
+    def get(cls, path):
+        with cls._stores_lock:
+            if path not in cls._stores:
+                cls._stores[path] = cls(path)
+            return cls._stores[path]
+
+    # ============ SNAPSHOT ============
+
+    def write_snapshot(self, tags, vehicles, partners):
+        """Ghi snapshot mới ra file tạm rồi thay file cũ, node đang đọc không bị gián đoạn"""
+        tmp_path = f"{self.snapshot_path}.{uuid.uuid4().hex}.tmp"
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(SNAPSHOT_SCHEMA)
+            conn.executemany('INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?, ?, ?, ?, ?)', tags)
+            conn.executemany('INSERT INTO vehicles VALUES (?, ?, ?, ?, ?, ?, ?)', vehicles)
+            conn.executemany('INSERT INTO partners VALUES (?, ?, ?)', partners)
+            conn.execute("INSERT INTO meta VALUES ('snapshot_date', ?)", (_utcnow(),))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _snapshot_conn(self):
+        """Kết nối chỉ đọc tới snapshot, mở lại khi file được thay"""
+        mtime = os.path.getmtime(self.snapshot_path)
+        if self._snapshot is None or mtime != self._snapshot_mtime:
+            if self._snapshot is not None:
+                self._snapshot.close()
+            self._snapshot = sqlite3.connect(f"file:{self.snapshot_path}?mode=ro", uri=True, check_same_thread=False)
+            self._snapshot_mtime = mtime
+        return self._snapshot
+
+    def has_snapshot(self):
+        return os.path.exists(self.snapshot_path)
+
+    def snapshot_date(self):
+        with self._lock:
+            row = self._snapshot_conn().execute("SELECT value FROM meta WHERE key = 'snapshot_date'").fetchone()
+        return row and row[0]
+
+    def load(self, keys):
+        """
+        Đọc thẻ, phương tiện, chủ sở hữu cho các key, trạng thái xe trong journal được ưu tiên
+        Returns:
+            tuple: (missing, tags, vehicles, partners) cùng kiểu với nsp.gate.engine
+        """
+        with self._lock:
+            conn = self._snapshot_conn()
+            placeholders = ','.join('?' * len(keys))
+            tag_rows = {row[0]: row for row in conn.execute(
+                f'SELECT key, id, tag_id, status, valid_from, valid_to, partner_id, vehicle_id '
+                f'FROM tags WHERE key IN ({placeholders})', keys)} if keys else {}
+
+            tags, missing, seen = [], [], set()
+            for key in keys:
+                row = tag_rows.get(key)
+                if not row:
+                    missing.append(key)
+                elif row[1] not in seen:
+                    seen.add(row[1])
+                    tags.append(TagRow(row[1], key, row[2], row[3], _to_datetime(row[4]), _to_datetime(row[5]),
+                                       row[6], row[7]))
+
+            vehicle_ids = [tag.vehicle_id for tag in tags if tag.vehicle_id]
+            vehicles = {}
+            if vehicle_ids:
+                placeholders = ','.join('?' * len(vehicle_ids))
+                states = {row[0]: row for row in self._journal.execute(
+                    f'SELECT vehicle_id, current_status, lot_id FROM vehicle_state WHERE vehicle_id IN ({placeholders})',
+                    vehicle_ids)}
+                for row in conn.execute(
+                        f'SELECT id, name, plate_number, owner_id, current_status, lot_id '
+                        f'FROM vehicles WHERE id IN ({placeholders})', vehicle_ids):
+                    state = states.get(row[0])
+                    current_status, lot_id = (state[1], state[2]) if state else (row[4], row[5])
+                    vehicles[row[0]] = VehicleRow(row[0], row[1], row[2], row[3], current_status, lot_id)
+
+            partner_ids = {tag.partner_id for tag in tags if tag.partner_id}
+            partner_ids.update(vehicle.owner_id for vehicle in vehicles.values() if vehicle.owner_id)
+            partners = {}
+            if partner_ids:
+                placeholders = ','.join('?' * len(partner_ids))
+                for row in conn.execute(f'SELECT id, name, current_funds FROM partners WHERE id IN ({placeholders})',
+                                        list(partner_ids)):
+                    partners[row[0]] = PartnerRow(*row)
+        return missing, tags, vehicles, partners
+
+    # ============ JOURNAL ============
+
+    def append(self, direction, payload, vehicle_states):
+        """
+        Ghi sự kiện vào journal cùng trạng thái mới của xe trong một transaction SQLite
+        Returns:
+            str: event_id (idempotency key khi gửi lại lên cloud)
+        """
+        event_id = payload.get('event_id') or uuid.uuid4().hex
+        payload = dict(payload, event_id=event_id)
+        now = _utcnow()
+        with self._lock, self._journal:
+            self._journal.execute('BEGIN')
+            self._journal.execute(
+                'INSERT OR IGNORE INTO journal (event_id, direction, payload, created_at) VALUES (?, ?, ?, ?)',
+                (event_id, direction, json.dumps(payload), now))
+            self._journal.executemany(
+                'INSERT OR REPLACE INTO vehicle_state VALUES (?, ?, ?, ?)',
+                [(vehicle_id, status, lot_id, now) for vehicle_id, status, lot_id in vehicle_states])
+        return event_id
+
+    def pending(self, limit):
+        with self._lock:
+            return self._journal.execute(
+                "SELECT seq, event_id, direction, payload FROM journal WHERE state = 'pending' ORDER BY seq LIMIT ?",
+                (limit,)).fetchall()
+
+    def mark(self, seq, state, error=None):
+        with self._lock:
+            self._journal.execute(
+                'UPDATE journal SET state = ?, attempts = attempts + 1, last_error = ? WHERE seq = ?',
+                (state, error, seq))
+
+    def forget_states_before(self, timestamp):
+        """Bỏ trạng thái xe cục bộ đã có trong snapshot mới"""
+        with self._lock:
+            self._journal.execute(
+                "DELETE FROM vehicle_state WHERE updated_at < ? AND NOT EXISTS "
+                "(SELECT 1 FROM journal WHERE state = 'pending')", (timestamp,))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._journal.execute('SELECT state, count(*) FROM journal GROUP BY state').fetchall())
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _to_text(value):
+    return value.isoformat() if value else None
+
+
+class EdgeService(models.AbstractModel):
+    """
+    Chế độ edge (nsp.edge_mode = True) cho server đặt tại bãi.
+    Quyết định ở cổng dùng snapshot SQLite và các luật của nsp.gate.engine nên vẫn hoạt động khi mất
+    kết nối tới cloud; sự kiện được ghi vào journal cục bộ và gửi lại theo thứ tự kèm event_id.
+    """
+    _name = "nsp.edge"
+    _description = "Chế độ edge"
+
+    @api.model
+    def _is_enabled(self):
+        return self.env['ir.config_parameter'].sudo().get_param('nsp.edge_mode') in ('1', 'True', 'true')
+
+    @api.model
+    def _get_store(self):
+        path = os.path.join(tools.config['data_dir'], 'nsp_edge', self.env.cr.dbname)
+        return EdgeStore.get(path)
+
+    @api.model
+    def _get_cloud_config(self):
+        """
+        Cùng cấu hình với nsp.tag.sync, thêm sync.reader_token là token thiết bị (nsp.reader)
+        mà cloud cấp cho node edge để gửi lại sự kiện khi cloud yêu cầu token thiết bị
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        return {
+            'url': params.get_param('sync.cloud_url'),
+            'api_key': params.get_param('sync.api_key', ''),
+            'reader_token': params.get_param('sync.reader_token', ''),
+        }
+
+    # ============ SNAPSHOT ============
+
+    @api.model
+    def _cron_refresh_snapshot(self):
+        """Cron job xuất thẻ đã gán, phương tiện và chủ sở hữu ra snapshot SQLite"""
+        if not self._is_enabled():
+            return False
+        tags = self.env['nsp.tag'].search_read(
+            ['|', ('partner_id', '!=', False), ('vehicle_id', '!=', False)],
+            ['tag_id', 'epc', 'status', 'valid_from', 'valid_to', 'partner_id', 'vehicle_id'], load=None)
+        tag_rows = []
+        for tag in tags:
+            row = (tag['id'], tag['tag_id'], tag['status'], _to_text(tag['valid_from']), _to_text(tag['valid_to']),
+                   tag['partner_id'] or None, tag['vehicle_id'] or None)
+            tag_rows.append((tag['tag_id'],) + row)
+            if tag['epc']:
+                tag_rows.append((tag['epc'],) + row)
+
+        vehicles = self.env['nsp.vehicle'].search_read(
+            [], ['name', 'plate_number', 'owner_partner_id', 'vehicle_type', 'current_status', 'current_lot_id'], load=None)
+        partner_ids = {tag['partner_id'] for tag in tags if tag['partner_id']}
+        partner_ids.update(vehicle['owner_partner_id'] for vehicle in vehicles if vehicle['owner_partner_id'])
+        partners = self.env['res.partner'].search_read([('id', 'in', list(partner_ids))], ['name', 'current_funds'])
+
+        store = self._get_store()
+        snapshot_start = _utcnow()
+        store.write_snapshot(
+            tag_rows,
+            [(v['id'], v['name'], v['plate_number'], v['owner_partner_id'] or None, v['vehicle_type'],
+              v['current_status'], v['current_lot_id'] or None) for v in vehicles],
+            [(p['id'], p['name'], p['current_funds']) for p in partners],
+        )
+        store.forget_states_before(snapshot_start)
+        _logger.info(f"Edge snapshot refreshed: {len(tags)} tags, {len(vehicles)} vehicles")
+        return True
+
+    # ============ GATE DECISIONS ============
+
+    @api.model
+    def check(self, direction, tag_ids, payload, lot_id=None):
+        """
+        Quyết định ở cổng từ snapshot và ghi sự kiện vào journal, không chạm tới ORM
+        Args:
+            direction (str): 'in' hoặc 'out'
+            tag_ids (list): TID/EPC đọc được
+            payload (dict): Body của request, được gửi lại nguyên vẹn lên cloud
+            lot_id (int): Bãi của cổng (optional)
+        Returns:
+            dict: Cùng định dạng với nsp.gate.engine.evaluate, thêm 'event_id' nếu được ghi nhận
+        """
+        store = self._get_store()
+        if not store.has_snapshot():
+            return {'allowed': False, 'error_code': 'EDGE_NOT_READY', 'reasons': [], 'vehicles': [],
+                    'message': _("Chưa có snapshot dữ liệu cho chế độ edge")}
+
+        keys = [key for key in tag_ids if key]
+        missing, tags, vehicles, partners = store.load(keys)
+        engine = self.env['nsp.gate.engine']
+        ctx = GateContext(direction, lot_id, fields.Datetime.now(), missing, tags, vehicles, partners,
+                          engine._get_min_balance() if direction == 'out' else None)
+        if direction == 'in':
+            decision = self._evaluate_check_in(engine, ctx)
+        else:
+            decision = engine._evaluate_context(ctx)
+        if not decision['allowed']:
+            return decision
+
+        status = 'inside' if direction == 'in' else 'outside'
+        vehicle_states = [(vehicle['vehicle_id'], status, lot_id if direction == 'in' else None)
+                          for vehicle in decision['vehicles']]
+        decision['event_id'] = store.append(direction, payload, vehicle_states)
+        return decision
+
+    @api.model
+    def _evaluate_check_in(self, engine, ctx):
+        """
+        Giống API check in: bỏ qua thẻ không có trong hệ thống và thẻ người dùng,
+        mỗi thẻ phương tiện được kiểm tra riêng và xe hợp lệ nào cũng được ghi nhận.
+        Sức chứa bãi (LOT_FULL) không được kiểm tra offline vì bộ đếm chỉ có trên cloud.
+        """
+        reasons = []
+        vehicles = []
+        for tag in ctx.tags:
+            if not tag.vehicle_id:
+                continue
+            decision = engine._evaluate_context(ctx._replace(missing=[], tags=[tag]))
+            vehicle = ctx.vehicles.get(tag.vehicle_id)
+            if decision['allowed'] and vehicle and not vehicle.owner_id:
+                reason = engine._reason(
+                    'VEHICLE_NOT_ASSIGNED', _(f"Phương tiện {vehicle.name} chưa được gán cho người dùng"), [tag.key])
+                decision['reasons'] = [dict(reason, rule='ownership')]
+            if decision['reasons']:
+                reasons += decision['reasons']
+            else:
+                vehicles += decision['vehicles']
+
+        if not vehicles and not reasons:
+            reasons.append(engine._reason('NO_VEHICLE_TAG', _("Phải có ít nhất 1 thẻ phương tiện")))
+        return {
+            'allowed': bool(vehicles),
+            'error_code': None if vehicles else reasons[0]['code'],
+            'message': ";\n".join(reason['message'] for reason in reasons),
+            'reasons': reasons,
+            'vehicles': vehicles,
+        }
+
+    # ============ REPLAY ============
+
+    @api.model
+    def _post_to_cloud(self, config, endpoint, payload):
+        """Gửi một sự kiện lên cloud, ném URLError khi mất kết nối"""
+        # Các API check đọc tham số ở body hoặc trong params của JSON-RPC
+        body = dict(payload, jsonrpc='2.0', method='call', params=payload)
+        headers = {'Content-Type': 'application/json', 'X-NSP-Api-Key': config['api_key']}
+        if config['reader_token']:
+            headers['Authorization'] = f"Bearer {config['reader_token']}"
+        request = urllib.request.Request(
+            f"{config['url']}{endpoint}",
+            data=json.dumps(body).encode('utf-8'),
+            headers=headers,
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=REPLAY_TIMEOUT) as response:
+            result = json.loads(response.read().decode('utf-8'))
+        return result.get('result', result)
+
+    @api.model
+    def _cron_replay_journal(self, limit=REPLAY_BATCH_SIZE):
+        """
+        Cron job gửi lại journal lên cloud theo đúng thứ tự ghi nhận
+        Dừng ở sự kiện đầu tiên gặp lỗi kết nối hoặc lỗi tạm thời (REPLAY_RETRY_ERRORS) để giữ thứ tự;
+        cloud bỏ qua event_id đã xử lý.
+        """
+        if not self._is_enabled():
+            return 0
+        config = self._get_cloud_config()
+        if not config['url']:
+            _logger.warning("Edge mode enabled but sync.cloud_url is not configured")
+            return 0
+
+        store = self._get_store()
+        sent = 0
+        for seq, event_id, direction, payload in store.pending(limit):
+            try:
+                result = self._post_to_cloud(config, f'/api/v1/check/{direction}', json.loads(payload))
+            except (urllib.error.URLError, TimeoutError, OSError) as e:
+                _logger.info(f"Cloud unreachable, edge replay paused at event {event_id}: {e}")
+                break
+            if result.get('success') or result.get('error_code') == 'DUPLICATE_EVENT':
+                store.mark(seq, 'sent')
+                sent += 1
+            elif result.get('error_code') in REPLAY_RETRY_ERRORS:
+                store.mark(seq, 'pending', result.get('message'))
+                _logger.info(f"Edge replay paused at event {event_id}: {result.get('error_code')}")
+                break
+            else:
+                # Cloud từ chối (dữ liệu đã khác snapshot): giữ lại để kiểm tra, không chặn các sự kiện sau
+                store.mark(seq, 'rejected', result.get('message'))
+                _logger.warning(f"Edge event {event_id} rejected by cloud: {result.get('message')}")
+        return sent
+
+    @api.model
+    def get_status(self):
+        """Trạng thái node edge: thời điểm snapshot và số sự kiện theo trạng thái"""
+        store = self._get_store()
+        return {
+            'enabled': self._is_enabled(),
+            'snapshot_date': store.snapshot_date() if store.has_snapshot() else None,
+            'journal': store.stats(),
+        }
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from collections import namedtuple
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Dữ liệu đã được đọc sẵn cho một lần quyết định ở cổng
+TagRow = namedtuple('TagRow', ['id', 'key', 'tag_id', 'status', 'valid_from', 'valid_to', 'partner_id', 'vehicle_id'])
+VehicleRow = namedtuple('VehicleRow', ['id', 'name', 'plate_number', 'owner_id', 'current_status', 'lot_id'])
+PartnerRow = namedtuple('PartnerRow', ['id', 'name', 'current_funds'])
+GateContext = namedtuple('GateContext', ['direction', 'lot_id', 'now', 'missing', 'tags', 'vehicles', 'partners', 'min_balance'])
+
+class GateEngine(models.AbstractModel):
+    """
+    Bộ luật quyết định cho xe qua cổng.
+    Toàn bộ dữ liệu (thẻ, phương tiện, chủ sở hữu, trạng thái trong bãi) được đọc một lần trong
+    _load_context; các luật chỉ làm việc trên tuple nên thêm luật mới không thêm truy vấn.
+    Module khác có thể thêm luật bằng cách kế thừa _get_rules.
+    """
+    _name = "nsp.gate.engine"
+    _description = "Bộ luật kiểm tra tại cổng"
+
+    @api.model
+    def _get_rules(self, direction):
+        """
+        Danh sách luật theo thứ tự đánh giá, mã lỗi của luật đầu tiên thất bại là mã lỗi của quyết định
+        Returns:
+            list: Tên method luật, mỗi method nhận GateContext và trả về danh sách lý do
+        """
+        rules = ['_rule_tags_exist', '_rule_tag_validity', '_rule_tag_status', '_rule_tag_assignment']
+        if direction == 'out':
+            rules += ['_rule_tag_composition', '_rule_ownership', '_rule_occupancy', '_rule_balance']
+        return rules
+
+    @api.model
+    def _get_min_balance(self):
+        """Số dư tối thiểu để ra khỏi bãi (nsp.min_balance), None nếu không kiểm tra"""
+        value = self.env['ir.config_parameter'].sudo().get_param('nsp.min_balance')
+        try:
+            return float(value) if value else None
+        except ValueError:
+            _logger.warning(f"Invalid nsp.min_balance value: {value}")
+            return None
+
+    @api.model
+    def _load_context(self, keys, direction, lot_id=None, now=None):
+        """
+        Đọc toàn bộ dữ liệu cần cho quyết định: một truy vấn cho thẻ, một cho phương tiện, một cho người dùng
+        Args:
+            keys (list): TID/EPC đọc được tại cổng
+            direction (str): 'in' hoặc 'out'
+            lot_id (int): Bãi của cổng (optional)
+        Returns:
+            GateContext
+        """
+        tag_rows = self.env['nsp.tag'].search_read(
+            ['|', ('tag_id', 'in', keys), ('epc', 'in', keys)],
+            ['tag_id', 'epc', 'status', 'valid_from', 'valid_to', 'partner_id', 'vehicle_id'],
+            load=None,
+        )
+        by_tid = {row['tag_id']: row for row in tag_rows}
+        by_epc = {row['epc']: row for row in tag_rows if row['epc']}
+
+        tags = []
+        missing = []
+        seen = set()
+        for key in keys:
+            row = by_tid.get(key) or by_epc.get(key)
+            if not row:
+                missing.append(key)
+            elif row['id'] not in seen:
+                seen.add(row['id'])
+                tags.append(TagRow(row['id'], key, row['tag_id'], row['status'], row['valid_from'],
+                                   row['valid_to'], row['partner_id'] or None, row['vehicle_id'] or None))
+
+        vehicle_ids = [tag.vehicle_id for tag in tags if tag.vehicle_id]
+        vehicles = {}
+        if vehicle_ids:
+            for row in self.env['nsp.vehicle'].search_read(
+                    [('id', 'in', vehicle_ids)],
+                    ['name', 'plate_number', 'owner_partner_id', 'current_status', 'current_lot_id'],
+                    load=None):
+                vehicles[row['id']] = VehicleRow(row['id'], row['name'], row['plate_number'],
+                                                 row['owner_partner_id'] or None, row['current_status'],
+                                                 row['current_lot_id'] or None)
+
+        partner_ids = {tag.partner_id for tag in tags if tag.partner_id}
+        partner_ids.update(vehicle.owner_id for vehicle in vehicles.values() if vehicle.owner_id)
+        partners = {}
+        if partner_ids:
+            for row in self.env['res.partner'].search_read(
+                    [('id', 'in', list(partner_ids))], ['name', 'current_funds'], load=None):
+                partners[row['id']] = PartnerRow(row['id'], row['name'], row['current_funds'])
+
+        return GateContext(direction, lot_id, now or fields.Datetime.now(), missing, tags, vehicles, partners,
+                           self._get_min_balance() if direction == 'out' else None)
+
+    @api.model
+    def evaluate(self, keys, direction, lot_id=None):
+        """
+        Đánh giá các luật cho một lượt đọc thẻ tại cổng
+        Args:
+            keys (list): TID/EPC đọc được
+            direction (str): 'in' hoặc 'out'
+            lot_id (int): Bãi của cổng (optional)
+        Returns:
+            dict: {
+                'allowed': bool,
+                'error_code': mã lỗi của lý do đầu tiên (None nếu hợp lệ),
+                'message': thông báo,
+                'reasons': [{'rule', 'code', 'message', 'tags'}],
+                'vehicles': [{'tag_id', 'vehicle_id', 'plate_number', 'owner_name'}],
+            }
+        """
+        keys = [key for key in keys if key]
+        return self._evaluate_context(self._load_context(keys, direction, lot_id))
+
+    @api.model
+    def _evaluate_context(self, ctx):
+        """Chạy các luật trên GateContext đã có sẵn (từ database hoặc snapshot của chế độ edge)"""
+        direction = ctx.direction
+        reasons = []
+        for rule in self._get_rules(direction):
+            for reason in getattr(self, rule)(ctx):
+                reason['rule'] = rule[len('_rule_'):]
+                reasons.append(reason)
+
+        vehicles = []
+        for tag in ctx.tags:
+            vehicle = ctx.vehicles.get(tag.vehicle_id)
+            if vehicle and not tag.partner_id:
+                owner = ctx.partners.get(vehicle.owner_id)
+                vehicles.append({
+                    'tag_id': tag.tag_id,
+                    'vehicle_id': vehicle.id,
+                    'plate_number': vehicle.plate_number,
+                    'owner_name': owner.name if owner else None,
+                })
+
+        return {
+            'allowed': not reasons,
+            'error_code': reasons[0]['code'] if reasons else None,
+            'message': ";\n".join(reason['message'] for reason in reasons),
+            'reasons': reasons,
+            'vehicles': vehicles,
+        }
+
+    @api.model
+    def _reason(self, code, message, tags=None):
+        return {'code': code, 'message': message, 'tags': tags or []}
+
+    # ============ RULES ============
+
+    @api.model
+    def _rule_tags_exist(self, ctx):
+        if ctx.missing:
+            return [self._reason('TAGS_NOT_FOUND', _(f"Các thẻ {', '.join(ctx.missing)} không tồn tại trong hệ thống"), ctx.missing)]
+        return []
+
+    @api.model
+    def _rule_tag_validity(self, ctx):
+        Tag = self.env['nsp.tag']
+        expired, not_yet_valid = [], []
+        for tag in ctx.tags:
+            error = Tag._validity_error(tag.status, tag.valid_from, tag.valid_to, ctx.now)
+            if error == 'TAG_EXPIRED':
+                expired.append(tag.key)
+            elif error == 'TAG_NOT_YET_VALID':
+                not_yet_valid.append(tag.key)
+        reasons = []
+        if expired:
+            reasons.append(self._reason('TAGS_EXPIRED', _(f"Các thẻ {', '.join(expired)} đã hết hạn"), expired))
+        if not_yet_valid:
+            reasons.append(self._reason('TAGS_NOT_YET_VALID', _(f"Các thẻ {', '.join(not_yet_valid)} chưa đến thời hạn sử dụng"), not_yet_valid))
+        return reasons
+
+    @api.model
+    def _rule_tag_status(self, ctx):
+        # Thẻ hết hạn đã được báo bởi _rule_tag_validity
+        inactive = [tag.key for tag in ctx.tags if tag.status not in ('active', 'expired')]
+        if inactive:
+            return [self._reason('TAGS_NOT_ACTIVE', _(f"Các thẻ {', '.join(inactive)} không hoạt động"), inactive)]
+        return []
+
+    @api.model
+    def _rule_tag_assignment(self, ctx):
+        reasons = []
+        unassigned = [tag.key for tag in ctx.tags if not tag.partner_id and not tag.vehicle_id]
+        mixed = [tag.key for tag in ctx.tags if tag.partner_id and tag.vehicle_id]
+        if unassigned:
+            reasons.append(self._reason('TAGS_NOT_ASSIGNED', _(f"Các thẻ {', '.join(unassigned)} không được gắn với phương tiện hoặc người dùng"), unassigned))
+        if mixed:
+            reasons.append(self._reason('TAGS_MIXED_ASSIGNED', _(f"Các thẻ {', '.join(mixed)} đã được gắn với cả phương tiện và người dùng"), mixed))
+        return reasons
+
+    @api.model
+    def _rule_tag_composition(self, ctx):
+        """Khi ra phải có ít nhất 1 thẻ người dùng và 1 thẻ phương tiện"""
+        reasons = []
+        if not any(tag.partner_id and not tag.vehicle_id for tag in ctx.tags):
+            reasons.append(self._reason('NO_PERSON_TAG', _("Phải có ít nhất 1 thẻ người dùng")))
+        if not any(tag.vehicle_id and not tag.partner_id for tag in ctx.tags):
+            reasons.append(self._reason('NO_VEHICLE_TAG', _("Phải có ít nhất 1 thẻ phương tiện")))
+        return reasons
+
+    @api.model
+    def _rule_ownership(self, ctx):
+        """Mỗi xe phải thuộc về ít nhất 1 người trong danh sách thẻ người dùng"""
+        persons = {tag.partner_id for tag in ctx.tags if tag.partner_id and not tag.vehicle_id}
+        reasons = []
+        for tag in ctx.tags:
+            vehicle = ctx.vehicles.get(tag.vehicle_id)
+            if not vehicle or tag.partner_id:
+                continue
+            if not vehicle.owner_id:
+                reasons.append(self._reason('INVALID_OWNERSHIP', _(f"Xe {vehicle.name} không có người sở hữu"), [tag.key]))
+            elif vehicle.owner_id not in persons:
+                owner = ctx.partners.get(vehicle.owner_id)
+                reasons.append(self._reason('INVALID_OWNERSHIP', _(f"Xe {vehicle.name} không thuộc về người dùng {owner.name if owner else ''}"), [tag.key]))
+        return reasons
+
+    @api.model
+    def _rule_occupancy(self, ctx):
+        """Xe phải đang ở trong bãi khi ra, và đúng bãi của cổng nếu biết"""
+        reasons = []
+        for tag in ctx.tags:
+            vehicle = ctx.vehicles.get(tag.vehicle_id)
+            if not vehicle or tag.partner_id:
+                continue
+            if vehicle.current_status != 'inside':
+                reasons.append(self._reason('INVALID_STATUS', _(f"Xe {vehicle.name} - {vehicle.plate_number} không đang ở trong bãi"), [tag.key]))
+            elif ctx.lot_id and vehicle.lot_id and vehicle.lot_id != ctx.lot_id:
+                reasons.append(self._reason('WRONG_LOT', _(f"Xe {vehicle.name} - {vehicle.plate_number} đang ở bãi khác"), [tag.key]))
+        return reasons
+
+    @api.model
+    def _rule_balance(self, ctx):
+        """Chủ xe phải còn đủ số dư tối thiểu (nsp.min_balance) khi ra"""
+        if ctx.min_balance is None:
+            return []
+        reasons = []
+        for tag in ctx.tags:
+            vehicle = ctx.vehicles.get(tag.vehicle_id)
+            owner = vehicle and ctx.partners.get(vehicle.owner_id)
+            if owner and not tag.partner_id and owner.current_funds < ctx.min_balance:
+                reasons.append(self._reason('INSUFFICIENT_BALANCE', _(f"Số dư của {owner.name} không đủ để ra khỏi bãi"), [tag.key]))
+        return reasons
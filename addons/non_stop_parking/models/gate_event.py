@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from odoo.tools.sql import create_index
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class GateEvent(models.Model):
+    """
+    Sự kiện ra vào ở chế độ ghi log gọn (nsp.log_mode = 'lean').
+    Bảng không có chatter, follower hay các trường related lưu sẵn; chỉ những sự kiện
+    bất thường mới được tạo thêm bản ghi nsp.vehicle.logs để theo dõi.
+    """
+    _name = "nsp.gate.event"
+    _description = "Sự kiện ra vào cổng"
+    _order = "event_time desc, id desc"
+    _log_access = False
+
+    event_time = fields.Datetime(string="Thời gian", required=True, readonly=True, default=fields.Datetime.now)
+    vehicle_id = fields.Many2one('nsp.vehicle', string="Phương tiện", required=True, readonly=True, ondelete='cascade')
+    partner_id = fields.Many2one('res.partner', string="Người dùng", required=True, readonly=True, ondelete='cascade')
+    tag_id = fields.Many2one('nsp.tag', string='Thẻ RFID', required=True, readonly=True, ondelete='cascade')
+    direction = fields.Selection([
+        ('in', 'Vào'),
+        ('out', 'Ra')
+    ], string="Hướng", required=True, readonly=True)
+    lot_id = fields.Many2one('nsp.lot', string="Bãi đỗ xe", readonly=True, ondelete='set null')
+    gate_id = fields.Many2one('nsp.gate', string="Cổng", readonly=True, ondelete='set null')
+    photo_url = fields.Char(string="Đường dẫn ảnh", readonly=True)
+    photo_id = fields.Many2one('nsp.photo', string="Ảnh chụp", readonly=True, ondelete='set null')
+    notes = fields.Text(string="Ghi chú", readonly=True)
+    parking_time = fields.Float(string="Thời gian đỗ (giờ)", digits=(16, 2), readonly=True)
+    is_anomaly = fields.Boolean(string="Bất thường", readonly=True)
+    log_id = fields.Many2one('nsp.vehicle.logs', string="Log bất thường", readonly=True, ondelete='set null',
+                             help="Log đầy đủ được tạo khi sự kiện này bất thường")
+
+    parking_time_display = fields.Char(string="Thời gian đỗ", compute="_compute_parking_time_display")
+
+    def init(self):
+        # Tìm sự kiện cuối cùng của xe trên hot path
+        create_index(self._cr, 'nsp_gate_event_vehicle_time_idx', self._table, ['vehicle_id', 'event_time DESC'])
+        create_index(self._cr, 'nsp_gate_event_lot_time_idx', self._table, ['lot_id', 'event_time DESC'])
+
+    @api.depends('parking_time')
+    def _compute_parking_time_display(self):
+        for record in self:
+            record.parking_time_display = self.env['nsp.vehicle.logs']._format_parking_time(record.parking_time)
+
+    @api.model
+    def _get_last_event(self, vehicle_id):
+        """Lấy sự kiện cuối cùng của xe"""
+        return self.search([('vehicle_id', '=', vehicle_id)], order='event_time desc, id desc', limit=1)
+
+    @api.model
+    def record_event(self, vehicle, partner, tag, direction, photo_url=None, notes=None, photo=None, gate=None):
+        """
+        Ghi sự kiện ra vào vào bảng gọn, chỉ tạo nsp.vehicle.logs khi bất thường
+        Args:
+            vehicle (nsp.vehicle): Phương tiện
+            partner (res.partner): Người dùng
+            tag (nsp.tag): Thẻ RFID
+            direction (str): 'in' hoặc 'out'
+            gate (nsp.gate): Cổng ghi nhận (optional)
+        Returns:
+            nsp.gate.event: Sự kiện vừa tạo
+        """
+        now = fields.Datetime.now()
+        last_event = self._get_last_event(vehicle.id)
+
+        parking_time = 0.0
+        if direction == 'out' and last_event and last_event.direction == 'in':
+            parking_time = (now - last_event.event_time).total_seconds() / 3600.0
+
+        is_anomaly = bool(last_event) and last_event.direction == direction
+        event = self.create({
+            'event_time': now,
+            'vehicle_id': vehicle.id,
+            'partner_id': partner.id,
+            'tag_id': tag.id,
+            'direction': direction,
+            'lot_id': gate.lot_id.id if gate else False,
+            'gate_id': gate.id if gate else False,
+            'photo_url': photo_url,
+            'photo_id': photo.id if photo else False,
+            'notes': notes,
+            'parking_time': parking_time,
+            'is_anomaly': is_anomaly,
+        })
+
+        if is_anomaly:
+            event._promote_anomaly(last_event)
+        return event
+
+    def _promote_anomaly(self, last_event):
+        """Tạo log đầy đủ có chatter cho sự kiện bất thường"""
+        self.ensure_one()
+        direction_text = 'Vào' if self.direction == 'in' else 'Ra'
+        log = self.env['nsp.vehicle.logs'].with_context(nsp_skip_consistency_check=True).create({
+            'vehicle_id': self.vehicle_id.id,
+            'partner_id': self.partner_id.id,
+            'tag_id': self.tag_id.id,
+            'direction': self.direction,
+            'lot_id': self.lot_id.id,
+            'gate_id': self.gate_id.id,
+            'gate_name': self.gate_id.name,
+            'photo_url': self.photo_url,
+            'photo_id': self.photo_id.id,
+            'notes': self.notes,
+            'is_anomaly': True,
+            'anomaly_reason': _(f"Xe {self.vehicle_id.name} {direction_text} 2 lần liên tiếp."
+                                f"Lần cuối là: {last_event.event_time.strftime('%d/%m/%Y %H:%M:%S')}"),
+        })
+        self.log_id = log.id
+        _logger.warning(f"Inconsistent gate event detected: Vehicle {self.vehicle_id.plate_number} "
+                        f"direction '{self.direction}' twice in a row. "
+                        f"Last: {last_event.event_time}, Current: {self.event_time}")
+        try:
+            log._create_anomaly_notification(log, last_event.event_time)
+        except Exception as e:
+            _logger.error(f"Lỗi khi tạo notification: {e}")
+        return log
+
+    def _prepare_websocket_message(self):
+        """Dữ liệu gửi qua WebSocket, cùng định dạng với nsp.vehicle.logs"""
+        self.ensure_one()
+        return {
+            'type': 'parking_log_update',
+            'log_id': self.log_id.id or None,
+            'event_id': self.id,
+            'vehicle_plate': self.vehicle_id.plate_number,
+            'partner_name': self.partner_id.name,
+            'direction': self.direction,
+            'time': self.event_time.strftime('%d/%m/%Y %H:%M:%S'),
+            'is_anomaly': self.is_anomaly,
+            'parking_time_display': self.parking_time_display,
+            'photo_url': self.photo_url,
+            'lot_id': self.lot_id.id or None,
+            'gate_name': self.gate_id.name,
+        }
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from datetime import timedelta
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Thời gian giữ kết quả của một sự kiện nếu chưa cấu hình nsp.idempotency_ttl_hours
+DEFAULT_TTL_HOURS = 24
+
+class IdempotencyKey(models.Model):
+    """
+    Kết quả đã trả về cho các sự kiện ở cổng, theo idempotency key do thiết bị gửi lên.
+    Request gửi lại (reader retry, edge replay) nhận lại đúng kết quả cũ chỉ với một lần dò index.
+    """
+    _name = "nsp.idempotency.key"
+    _description = "Idempotency key của sự kiện cổng"
+    _order = "created_at desc"
+    _rec_name = "key"
+    _log_access = False
+
+    key = fields.Char(string="Key", required=True, readonly=True)
+    endpoint = fields.Char(string="API", readonly=True)
+    response = fields.Text(string="Kết quả", readonly=True)
+    created_at = fields.Datetime(string="Thời gian", required=True, readonly=True, default=fields.Datetime.now, index=True)
+
+    _sql_constraints = [
+        ('key_unique', 'UNIQUE(key)', 'Idempotency key phải là duy nhất'),
+    ]
+
+    @api.model
+    def _get_key(self, data):
+        """
+        Idempotency key của request: event_id, hoặc reader_id + seq
+        Returns:
+            str: Key, None nếu thiết bị không gửi
+        """
+        event_id = data.get('event_id')
+        if event_id:
+            return str(event_id)
+        if data.get('reader_id') and data.get('seq') is not None:
+            return f"{data['reader_id']}:{data['seq']}"
+        return None
+
+    @api.model
+    def _claim(self, key, endpoint):
+        """
+        Giữ key cho request hiện tại
+        Request trùng đang chạy song song sẽ chờ ở unique index đến khi request đầu commit.
+        Returns:
+            tuple: (True, None) nếu được xử lý, (False, kết quả cũ hoặc None) nếu là request gửi lại
+        """
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO nsp_idempotency_key (key, endpoint, created_at)
+            VALUES (%s, %s, now() at time zone 'UTC')
+            ON CONFLICT (key) DO NOTHING
+            RETURNING id
+        """, (key, endpoint))
+        if cr.fetchone():
+            return True, None
+        cr.execute("SELECT response FROM nsp_idempotency_key WHERE key = %s", (key,))
+        row = cr.fetchone()
+        return False, json.loads(row[0]) if row and row[0] else None
+
+    @api.model
+    def _store_response(self, key, response):
+        self.env.cr.execute(
+            "UPDATE nsp_idempotency_key SET response = %s WHERE key = %s",
+            (json.dumps(response, default=str), key))
+
+    @api.model
+    def _release(self, key):
+        """Bỏ key khi request lỗi hệ thống để thiết bị có thể gửi lại"""
+        self.env.cr.execute("DELETE FROM nsp_idempotency_key WHERE key = %s", (key,))
+
+    @api.model
+    def _get_ttl_hours(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('nsp.idempotency_ttl_hours')
+        try:
+            return int(value) if value else DEFAULT_TTL_HOURS
+        except ValueError:
+            _logger.warning(f"Invalid nsp.idempotency_ttl_hours value: {value}")
+            return DEFAULT_TTL_HOURS
+
+    @api.model
+    def _cron_purge_expired(self):
+        """Cron job xóa các key đã hết hạn"""
+        cutoff = fields.Datetime.now() - timedelta(hours=self._get_ttl_hours())
+        self.env.cr.execute("DELETE FROM nsp_idempotency_key WHERE created_at < %s", (cutoff,))
+        _logger.info(f"Purged {self.env.cr.rowcount} idempotency keys older than {cutoff}")
+        return self.env.cr.rowcount
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, tools, _
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class Lot(models.Model):
+    """
+    Bãi đỗ xe. Một hệ thống Odoo có thể quản lý nhiều bãi; log, sự kiện, trạng thái xe trong bãi
+    và kênh WebSocket được tách theo bãi để tải ở bãi này không ảnh hưởng bãi khác.
+    """
+    _name = "nsp.lot"
+    _description = "Bãi đỗ xe"
+    _order = "name"
+
+    name = fields.Char(string="Tên bãi", required=True)
+    code = fields.Char(string="Mã bãi", required=True)
+    address = fields.Char(string="Địa chỉ")
+    active = fields.Boolean(string="Hoạt động", default=True)
+
+    # Sức chứa - occupied là bộ đếm được tăng/giảm nguyên tử khi xe qua cổng
+    capacity = fields.Integer(string="Sức chứa", default=0, help="0 là không giới hạn")
+    occupied = fields.Integer(string="Đang đỗ", default=0, readonly=True, copy=False)
+    available = fields.Integer(string="Còn trống", compute="_compute_available")
+    capacity_ids = fields.One2many('nsp.lot.capacity', 'lot_id', string="Sức chứa theo loại xe")
+
+    # Relations
+    gate_ids = fields.One2many('nsp.gate', 'lot_id', string="Cổng")
+    reader_ids = fields.One2many('nsp.reader', 'lot_id', string="Thiết bị đọc")
+    vehicle_inside_ids = fields.One2many('nsp.vehicle', 'current_lot_id', string="Xe trong bãi")
+
+    _sql_constraints = [
+        ('code_unique', 'UNIQUE(code)', 'Mã bãi phải là duy nhất'),
+        ('capacity_positive', 'CHECK(capacity >= 0)', 'Sức chứa không được âm'),
+    ]
+
+    @api.depends('capacity', 'occupied')
+    def _compute_available(self):
+        for lot in self:
+            lot.available = max(lot.capacity - lot.occupied, 0) if lot.capacity else 0
+
+    def _bus_channel(self):
+        """Kênh WebSocket riêng của bãi"""
+        self.ensure_one()
+        return f"nsp_lot_{self.id}"
+
+    def _reserve_slot(self, vehicle_type):
+        """
+        Giữ một chỗ cho xe vào bãi bằng câu lệnh UPDATE có điều kiện, không đếm log
+        Returns:
+            bool: False nếu bãi hoặc khu vực của loại xe đã đầy
+        """
+        self.ensure_one()
+        cr = self.env.cr
+        cr.execute("""
+            UPDATE nsp_lot_capacity
+               SET occupied = occupied + 1
+             WHERE lot_id = %s AND vehicle_type = %s
+               AND (capacity = 0 OR occupied < capacity)
+         RETURNING vehicle_type, capacity, occupied
+        """, (self.id, vehicle_type))
+        type_row = cr.fetchone()
+        if not type_row and vehicle_type in self._get_limited_types():
+            return False
+
+        cr.execute("""
+            UPDATE nsp_lot
+               SET occupied = occupied + 1
+             WHERE id = %s
+               AND (capacity = 0 OR occupied < capacity)
+         RETURNING capacity, occupied
+        """, (self.id,))
+        lot_row = cr.fetchone()
+        if not lot_row:
+            if type_row:
+                # Trả lại chỗ của loại xe đã giữ ở trên
+                cr.execute("""
+                    UPDATE nsp_lot_capacity SET occupied = occupied - 1
+                     WHERE lot_id = %s AND vehicle_type = %s
+                """, (self.id, vehicle_type))
+            return False
+
+        self._after_occupancy_change(lot_row, type_row)
+        return True
+
+    def _release_slot(self, vehicle_type):
+        """Trả lại một chỗ khi xe ra khỏi bãi"""
+        self.ensure_one()
+        cr = self.env.cr
+        cr.execute("""
+            UPDATE nsp_lot_capacity
+               SET occupied = GREATEST(occupied - 1, 0)
+             WHERE lot_id = %s AND vehicle_type = %s
+         RETURNING vehicle_type, capacity, occupied
+        """, (self.id, vehicle_type))
+        type_row = cr.fetchone()
+        cr.execute("""
+            UPDATE nsp_lot
+               SET occupied = GREATEST(occupied - 1, 0)
+             WHERE id = %s
+         RETURNING capacity, occupied
+        """, (self.id,))
+        self._after_occupancy_change(cr.fetchone(), type_row)
+
+    @tools.ormcache('self.id')
+    def _get_limited_types(self):
+        """Các loại xe có giới hạn sức chứa riêng trong bãi"""
+        return frozenset(self.capacity_ids.filtered(lambda line: line.capacity).mapped('vehicle_type'))
+
+    def _after_occupancy_change(self, lot_row, type_row=None):
+        """Làm mới cache ORM và gửi số chỗ trống lên bảng điện tử qua kênh của bãi"""
+        self.invalidate_recordset(['occupied'])
+        self.capacity_ids.invalidate_recordset(['occupied'])
+        capacity, occupied = lot_row
+        message = {
+            'type': 'lot_availability',
+            'lot_id': self.id,
+            'capacity': capacity,
+            'occupied': occupied,
+            'available': max(capacity - occupied, 0) if capacity else None,
+        }
+        if type_row:
+            vehicle_type, type_capacity, type_occupied = type_row
+            message['vehicle_type'] = {
+                'vehicle_type': vehicle_type,
+                'capacity': type_capacity,
+                'occupied': type_occupied,
+                'available': max(type_capacity - type_occupied, 0) if type_capacity else None,
+            }
+        try:
+            self.env['bus.bus']._sendone(self._bus_channel(), 'lot_availability', message)
+        except Exception as e:
+            _logger.error(f"Fail to send lot availability: {e}")
+
+    def action_recount_occupancy(self):
+        """Đếm lại số xe trong bãi từ trạng thái xe, dùng khi bộ đếm bị lệch"""
+        cr = self.env.cr
+        for lot in self:
+            cr.execute("""
+                UPDATE nsp_lot
+                   SET occupied = (SELECT count(*) FROM nsp_vehicle WHERE current_lot_id = %(lot)s)
+                 WHERE id = %(lot)s
+            """, {'lot': lot.id})
+            cr.execute("""
+                UPDATE nsp_lot_capacity c
+                   SET occupied = (SELECT count(*) FROM nsp_vehicle v
+                                    WHERE v.current_lot_id = %(lot)s AND v.vehicle_type = c.vehicle_type)
+                 WHERE c.lot_id = %(lot)s
+            """, {'lot': lot.id})
+        self.invalidate_recordset(['occupied'])
+        self.capacity_ids.invalidate_recordset(['occupied'])
+        return True
+
+    @api.model
+    @api.readonly
+    def get_availability(self, lot_code=None):
+        """
+        Số chỗ trống của các bãi, đọc trực tiếp từ bộ đếm
+        Returns:
+            list: [{'lot_id', 'code', 'name', 'capacity', 'occupied', 'available', 'vehicle_types': [...]}]
+        """
+        domain = [('code', '=', lot_code)] if lot_code else []
+        lots = self.search_read(domain, ['code', 'name', 'capacity', 'occupied'])
+        lines = self.env['nsp.lot.capacity'].search_read(
+            [('lot_id', 'in', [lot['id'] for lot in lots])],
+            ['lot_id', 'vehicle_type', 'capacity', 'occupied'], load=None)
+        by_lot = {}
+        for line in lines:
+            by_lot.setdefault(line['lot_id'], []).append({
+                'vehicle_type': line['vehicle_type'],
+                'capacity': line['capacity'],
+                'occupied': line['occupied'],
+                'available': max(line['capacity'] - line['occupied'], 0) if line['capacity'] else None,
+            })
+        return [{
+            'lot_id': lot['id'],
+            'code': lot['code'],
+            'name': lot['name'],
+            'capacity': lot['capacity'],
+            'occupied': lot['occupied'],
+            'available': max(lot['capacity'] - lot['occupied'], 0) if lot['capacity'] else None,
+            'vehicle_types': by_lot.get(lot['id'], []),
+        } for lot in lots]
+
+
+class LotCapacity(models.Model):
+    _name = "nsp.lot.capacity"
+    _description = "Sức chứa theo loại xe"
+    _order = "lot_id, vehicle_type"
+
+    lot_id = fields.Many2one('nsp.lot', string="Bãi đỗ xe", required=True, ondelete='cascade')
+    vehicle_type = fields.Selection([
+        ('car', 'Ô tô'),
+        ('motorcycle', 'Xe máy'),
+        ('bicycle', 'Xe đạp'),
+        ('truck', 'Xe tải'),
+        ('other', 'Khác')
+    ], string='Loại xe', required=True)
+    capacity = fields.Integer(string="Sức chứa", default=0, help="0 là không giới hạn")
+    occupied = fields.Integer(string="Đang đỗ", default=0, readonly=True, copy=False)
+
+    _sql_constraints = [
+        ('lot_vehicle_type_unique', 'UNIQUE(lot_id, vehicle_type)', 'Mỗi loại xe chỉ có một dòng sức chứa trong bãi'),
+        ('capacity_positive', 'CHECK(capacity >= 0)', 'Sức chứa không được âm'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return lines
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'capacity' in vals or 'vehicle_type' in vals:
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+
+class Gate(models.Model):
+    _name = "nsp.gate"
+    _description = "Cổng ra vào"
+    _order = "lot_id, name"
+
+    name = fields.Char(string="Tên cổng", required=True)
+    code = fields.Char(string="Mã cổng", required=True)
+    lot_id = fields.Many2one('nsp.lot', string="Bãi đỗ xe", required=True, index=True, ondelete='cascade')
+    type = fields.Selection([
+        ('entry', 'Cổng vào'),
+        ('exit', 'Cổng ra'),
+        ('both', 'Cổng vào và ra')
+    ], string="Loại cổng", required=True, default='both')
+    active = fields.Boolean(string="Hoạt động", default=True)
+
+    reader_ids = fields.One2many('nsp.reader', 'gate_id', string="Thiết bị đọc")
+
+    _sql_constraints = [
+        ('code_unique', 'UNIQUE(code)', 'Mã cổng phải là duy nhất'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        gates = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return gates
+
+    def write(self, vals):
+        result = super().write(vals)
+        if {'code', 'lot_id', 'active'} & set(vals):
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+    @api.model
+    @tools.ormcache('code')
+    def _get_gate_id_by_code(self, code):
+        """ID cổng theo mã, được cache theo từng worker"""
+        gate = self.search([('code', '=', code)], limit=1)
+        return gate.id or None
+
+    @api.model
+    @tools.ormcache('reader_id')
+    def _get_gate_id_by_reader(self, reader_id):
+        """ID cổng của thiết bị đọc theo reader_id, được cache theo từng worker"""
+        reader = self.env['nsp.reader'].search([('reader_id', '=', reader_id)], limit=1)
+        return reader.gate_id.id or None
+
+    @api.model
+    def _resolve_gate(self, gate_code=None, reader_id=None):
+        """
+        Xác định cổng từ mã cổng hoặc mã thiết bị đọc gửi lên từ làn
+        Returns:
+            nsp.gate: Cổng (rỗng nếu không xác định được)
+        """
+        gate_id = None
+        if gate_code:
+            gate_id = self._get_gate_id_by_code(gate_code)
+        elif reader_id:
+            gate_id = self._get_gate_id_by_reader(reader_id)
+        return self.browse(gate_id)
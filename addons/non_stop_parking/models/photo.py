@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+import psycopg2
+
+_logger = logging.getLogger(__name__)
+
+# Kích thước đọc mỗi lần từ request stream
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Ảnh từ camera làn không được vượt quá kích thước này
+MAX_PHOTO_SIZE = 10 * 1024 * 1024
+
+class Photo(models.Model):
+    """
+    Ảnh chụp từ camera làn, lưu theo nội dung (SHA-1) trong filestore.
+    Ảnh trùng nội dung chỉ được lưu một lần; thumbnail được tạo bởi cron chạy nền.
+    """
+    _name = "nsp.photo"
+    _description = "Ảnh chụp tại cổng"
+    _order = "id desc"
+    _rec_name = "checksum"
+
+    checksum = fields.Char(string="Checksum", required=True, readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', string="Ảnh gốc", readonly=True, ondelete='restrict')
+    file_size = fields.Integer(string="Kích thước (bytes)", readonly=True)
+    thumbnail = fields.Image(string="Thumbnail", max_width=256, max_height=256, attachment=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Chờ xử lý'),
+        ('done', 'Đã xử lý'),
+        ('error', 'Lỗi'),
+    ], string="Trạng thái", default='pending', required=True, readonly=True)
+
+    log_ids = fields.One2many('nsp.vehicle.logs', 'photo_id', string="Lịch sử ra vào")
+
+    _sql_constraints = [
+        ('checksum_unique', 'UNIQUE(checksum)', 'Ảnh đã tồn tại'),
+    ]
+
+    @api.model
+    def _get_by_token(self, token):
+        """Tìm ảnh theo token (checksum) trả về từ API upload"""
+        if not token:
+            return self.browse()
+        return self.search([('checksum', '=', token)], limit=1)
+
+    @api.model
+    def store_stream(self, stream, content_length=None, mimetype='image/jpeg'):
+        """
+        Ghi ảnh từ stream vào filestore theo từng chunk, không giữ toàn bộ ảnh trong bộ nhớ
+        Args:
+            stream: File-like chứa nội dung ảnh (request stream)
+            content_length (int): Kích thước do client khai báo (optional)
+            mimetype (str): Kiểu ảnh
+        Returns:
+            tuple: (nsp.photo, True nếu ảnh mới được tạo)
+        """
+        if content_length and content_length > MAX_PHOTO_SIZE:
+            raise ValidationError(_("Ảnh vượt quá kích thước cho phép"))
+
+        Attachment = self.env['ir.attachment'].sudo()
+        tmp_dir = os.path.join(Attachment._filestore(), 'nsp_upload')
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        sha = hashlib.sha1()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+            tmp_path = tmp.name
+            try:
+                while True:
+                    chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > MAX_PHOTO_SIZE:
+                        raise ValidationError(_("Ảnh vượt quá kích thước cho phép"))
+                    sha.update(chunk)
+                    tmp.write(chunk)
+            except Exception:
+                tmp.close()
+                os.unlink(tmp_path)
+                raise
+
+        if not size:
+            os.unlink(tmp_path)
+            raise ValidationError(_("Ảnh rỗng"))
+
+        checksum = sha.hexdigest()
+        photo = self._get_by_token(checksum)
+        if photo:
+            # Khung hình giống hệt đã được lưu
+            os.unlink(tmp_path)
+            return photo, False
+
+        try:
+            with self.env.cr.savepoint():
+                photo = self.create({'checksum': checksum, 'file_size': size})
+        except psycopg2.IntegrityError:
+            # Một camera khác vừa upload cùng khung hình
+            os.unlink(tmp_path)
+            return self._get_by_token(checksum), False
+
+        attachment_vals = {
+            'name': f"{checksum}.jpg",
+            'type': 'binary',
+            'mimetype': mimetype,
+            'res_model': self._name,
+            'res_id': photo.id,
+        }
+        if Attachment._storage() == 'file':
+            # Cùng cách đặt tên với filestore của Odoo để file được chia sẻ và GC đúng
+            fname = f"{checksum[:2]}/{checksum}"
+            full_path = Attachment._full_path(fname)
+            if os.path.isfile(full_path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(tmp_path, full_path)
+                # Như _file_write của Odoo: file được đưa vào danh sách GC của filestore,
+                # nếu transaction rollback thì file không có attachment sẽ bị xóa ở lần autovacuum sau
+                Attachment._mark_for_gc(fname)
+            attachment_vals.update({
+                'store_fname': fname,
+                'checksum': checksum,
+                'file_size': size,
+            })
+        else:
+            with open(tmp_path, 'rb') as tmp:
+                attachment_vals['raw'] = tmp.read()
+            os.unlink(tmp_path)
+
+        photo.attachment_id = Attachment.create(attachment_vals)
+
+        # Tạo thumbnail ngay khi có worker rảnh
+        self.env.ref('non_stop_parking.ir_cron_generate_photo_thumbnails').sudo()._trigger()
+        return photo, True
+
+    @api.model
+    def _cron_generate_thumbnails(self, limit=100):
+        """Cron job tạo thumbnail cho ảnh mới"""
+        photos = self.search([('state', '=', 'pending')], limit=limit, order='id')
+        for photo in photos:
+            try:
+                photo.write({
+                    'thumbnail': base64.b64encode(photo.attachment_id.raw),
+                    'state': 'done',
+                })
+            except Exception as e:
+                _logger.error(f"Fail to generate thumbnail for photo {photo.checksum}: {e}")
+                photo.state = 'error'
+        return len(photos)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.sql import make_index_name
+import psycopg2
+
+# Cùng quy tắc với normalize_plate, dùng trong SQL với {} là cột biển số
+PLATE_KEY_SQL = "upper(regexp_replace({}, '[^[:alnum:]]', '', 'g'))"
+
+
+def normalize_plate(plate):
+    """
+    Chuẩn hóa biển số để tra cứu: bỏ dấu phân cách và viết hoa
+    Ví dụ: '51f-123.45' -> '51F12345'
+    """
+    if not plate:
+        return False
+    return ''.join(char for char in plate if char.isalnum()).upper()
+
+
+def ensure_trigram(cr, registry):
+    """
+    Bật extension pg_trgm cho index trigram của plate_key, báo lỗi rõ ràng nếu không có quyền
+    Không dùng index btree thay thế: LIKE '%key%' trên bảng log khi đó sẽ quét toàn bảng.
+    """
+    if registry.has_trigram:
+        return
+    try:
+        with cr.savepoint():
+            cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except psycopg2.Error as e:
+        raise UserError(_("Không tạo được extension pg_trgm: %s\n"
+                          "Hãy chạy CREATE EXTENSION pg_trgm trên database bằng tài khoản có quyền rồi cập nhật lại module.", e))
+    registry.has_trigram = True
+
+
+def drop_btree_index(cr, table, column):
+    """Xóa index btree của trường index='trigram' tạo khi chưa có pg_trgm, để ORM tạo lại index GIN"""
+    indexname = make_index_name(table, column)
+    cr.execute("SELECT indexdef FROM pg_indexes WHERE indexname = %s", (indexname,))
+    row = cr.fetchone()
+    if row and 'USING gin' not in row[0]:
+        cr.execute(f'DROP INDEX "{indexname}"')
+
+
+class PlateSearchMixin(models.AbstractModel):
+    """
+    Tìm kiếm theo biển số đã chuẩn hóa.
+    Model kế thừa phải có trường plate_key (biển số chuẩn hóa, index trigram).
+    """
+    _name = "nsp.plate.search.mixin"
+    _description = "Tìm kiếm biển số"
+
+    plate_search = fields.Char(string="Tìm biển số", compute="_compute_plate_search", search="_search_plate_search")
+
+    def _compute_plate_search(self):
+        for record in self:
+            record.plate_search = record.plate_key
+
+    def _search_plate_search(self, operator, value):
+        """'51F-123.45', '51f12345' hay '123.45' đều khớp với plate_key qua index trigram"""
+        if operator not in ('=', 'ilike', 'like', '=ilike', '=like') or not isinstance(value, str):
+            raise UserError(_("Toán tử tìm kiếm biển số không được hỗ trợ"))
+        key = normalize_plate(value)
+        if not key:
+            return [(0, '=', 1)]
+        if operator in ('=', '=ilike', '=like'):
+            return [('plate_key', '=', key)]
+        return [('plate_key', 'like', key)]
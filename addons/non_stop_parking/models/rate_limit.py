@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Giới hạn mặc định (số request mỗi giây, burst) nếu chưa cấu hình nsp.rate_limit_<scope> = "rate,burst"
+DEFAULT_RATE_LIMITS = {
+    'reader': (5.0, 20),
+    'ip': (20.0, 100),
+}
+# Bucket không được dùng quá thời gian này sẽ bị xóa
+STALE_BUCKET_DAYS = 1
+
+class RateLimit(models.Model):
+    """
+    Token bucket giới hạn tần suất gọi API cổng theo thiết bị đọc và theo IP.
+    Bucket được lưu trong bảng để mọi worker dùng chung; mỗi lần kiểm tra là một SELECT và một câu UPSERT.
+    """
+    _name = "nsp.rate.limit"
+    _description = "Giới hạn tần suất API"
+    _order = "throttled_count desc, key"
+    _rec_name = "key"
+    _log_access = False
+
+    key = fields.Char(string="Key", required=True, readonly=True)
+    scope = fields.Selection([
+        ('reader', 'Thiết bị đọc'),
+        ('ip', 'Địa chỉ IP'),
+    ], string="Phạm vi", required=True, readonly=True)
+    tokens = fields.Float(string="Token còn lại", readonly=True)
+    updated_at = fields.Datetime(string="Lần gọi cuối", readonly=True)
+    allowed_count = fields.Integer(string="Số request hợp lệ", readonly=True)
+    throttled_count = fields.Integer(string="Số request bị chặn", readonly=True)
+    last_throttled = fields.Datetime(string="Lần bị chặn cuối", readonly=True)
+
+    _sql_constraints = [
+        ('key_unique', 'UNIQUE(key)', 'Key phải là duy nhất'),
+    ]
+
+    @api.model
+    def _get_limit(self, scope):
+        """
+        Giới hạn của một phạm vi
+        Returns:
+            tuple: (rate, burst), None nếu giới hạn bị tắt (cấu hình "0")
+        """
+        value = self.env['ir.config_parameter'].sudo().get_param(f'nsp.rate_limit_{scope}')
+        if not value:
+            return DEFAULT_RATE_LIMITS[scope]
+        try:
+            rate, _sep, burst = value.partition(',')
+            rate = float(rate)
+            burst = int(burst) if burst else max(1, int(rate))
+        except ValueError:
+            _logger.warning(f"Invalid nsp.rate_limit_{scope} value: {value}")
+            return DEFAULT_RATE_LIMITS[scope]
+        return (rate, burst) if rate > 0 else None
+
+    @api.model
+    def _precheck(self, scope, identifier, cost=1):
+        """
+        Kiểm tra nhanh bucket trên cursor hiện tại, không khóa dòng khi request được phép.
+        Request bị chặn chỉ cộng bộ đếm chặn nên không cần mở cursor riêng cho _consume.
+        Args:
+            scope (str): 'reader' hoặc 'ip'
+            identifier (str): Mã thiết bị hoặc địa chỉ IP
+            cost (int): Số token cần lấy
+        Returns:
+            float: 0 nếu có thể được phép, số giây cần chờ nếu chắc chắn bị chặn
+        """
+        limit = self._get_limit(scope)
+        if not limit or not identifier:
+            return 0
+        rate, burst = limit
+        now = fields.Datetime.now()
+        key = f"{scope}:{identifier}"
+        self.env.cr.execute(f"SELECT tokens, updated_at FROM {self._table} WHERE key = %s", (key,))
+        row = self.env.cr.fetchone()
+        tokens = min(burst, row[0] + rate * (now - row[1]).total_seconds()) if row else burst
+        if tokens >= cost:
+            return 0
+        if row:
+            self.env.cr.execute(f"""
+                UPDATE {self._table}
+                   SET throttled_count = throttled_count + 1, last_throttled = %s
+                 WHERE key = %s
+            """, (now, key))
+        return self._retry_after(rate, burst, tokens, cost)
+
+    @staticmethod
+    def _retry_after(rate, burst, tokens, cost):
+        """Số giây chờ đến khi đủ token, request cần nhiều hơn burst được tính như request cần đúng burst token"""
+        return round(max(min(cost, burst) - tokens, 0) / rate, 2) or round(1 / rate, 2)
+
+    @api.model
+    def _consume(self, scope, identifier, cost=1):
+        """
+        Lấy token từ bucket của thiết bị hoặc IP
+        Nên gọi trên cursor riêng tự commit để khóa dòng không bị giữ đến hết request.
+        Request cần nhiều token hơn burst luôn bị chặn.
+        Args:
+            scope (str): 'reader' hoặc 'ip'
+            identifier (str): Mã thiết bị hoặc địa chỉ IP
+            cost (int): Số token cần lấy (số sự kiện trong request)
+        Returns:
+            float: 0 nếu được phép, số giây cần chờ nếu bị chặn
+        """
+        limit = self._get_limit(scope)
+        if not limit or not identifier:
+            return 0
+        rate, burst = limit
+        refill = "LEAST(%(burst)s, r.tokens + %(rate)s * EXTRACT(EPOCH FROM %(now)s - r.updated_at))"
+        allowed = f"{refill} >= %(cost)s"
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS r (key, scope, tokens, updated_at, allowed_count, throttled_count, last_throttled)
+            SELECT %(key)s, %(scope)s, CASE WHEN fits THEN %(burst)s - %(cost)s ELSE %(burst)s END, %(now)s,
+                   CASE WHEN fits THEN 1 ELSE 0 END, CASE WHEN fits THEN 0 ELSE 1 END,
+                   CASE WHEN fits THEN NULL ELSE %(now)s END
+              FROM (SELECT %(burst)s >= %(cost)s AS fits) f
+            ON CONFLICT (key) DO UPDATE SET
+                tokens = {refill} - CASE WHEN {allowed} THEN %(cost)s ELSE 0 END,
+                updated_at = %(now)s,
+                allowed_count = r.allowed_count + CASE WHEN {allowed} THEN 1 ELSE 0 END,
+                throttled_count = r.throttled_count + CASE WHEN {allowed} THEN 0 ELSE 1 END,
+                last_throttled = CASE WHEN {allowed} THEN r.last_throttled ELSE %(now)s END
+            RETURNING tokens, last_throttled = %(now)s
+        """, {
+            'key': f"{scope}:{identifier}",
+            'scope': scope,
+            'rate': rate,
+            'burst': burst,
+            'cost': cost,
+            'now': fields.Datetime.now(),
+        })
+        tokens, throttled = self.env.cr.fetchone()
+        if not throttled:
+            return 0
+        return self._retry_after(rate, burst, tokens, cost)
+
+    @api.model
+    def _cron_purge_stale(self):
+        """Cron job xóa bucket không còn được dùng"""
+        cutoff = fields.Datetime.now() - timedelta(days=STALE_BUCKET_DAYS)
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE updated_at < %s", (cutoff,))
+        return self.env.cr.rowcount
@@ -1,7 +1,12 @@
 # # -*- coding: utf-8 -*-
 # # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import copy
+import hashlib
+import math
+import secrets
 import socket
+import threading
 import time
 import json
 import logging
@@ -9,11 +14,63 @@ import datetime
 import urllib.parse as uparse
 import urllib.request as ureq
 import urllib.error as uerr
-from odoo import models, fields, api, _
+from collections import defaultdict
+from odoo import models, fields, api, tools, SUPERUSER_ID, _
 from odoo.exceptions import ValidationError
 
 _logger = logging.getLogger(__name__)
 
+# Thời gian token cũ còn hiệu lực sau khi xoay vòng nếu chưa cấu hình nsp.reader_token_grace_minutes
+DEFAULT_TOKEN_GRACE_MINUTES = 60
+# Thống kê thiết bị được cache trong khoảng thời gian này (giây)
+STATISTICS_TTL = 30
+# Hằng số thời gian (giây) của trung bình trượt tốc độ đọc
+READ_RATE_WINDOW = 300
+# Thiết bị không được kiểm tra quá thời gian này (giây) được xem là mất liên lạc
+STALE_CHECK_AGE = 3600
+# Số lần đọc được cộng dồn trong bộ nhớ và ghi xuống database tối đa một lần mỗi khoảng này (giây)
+READ_FLUSH_INTERVAL = 10
+
+
+class ReadBuffer:
+    """
+    Số lần đọc thẻ chưa ghi của một worker, theo database và mã thiết bị.
+    Sự kiện cổng chỉ cộng vào bộ nhớ nên không khóa dòng nsp_reader trong transaction của cổng;
+    phần chưa ghi bị mất nếu worker dừng đột ngột.
+    """
+    _counts = {}
+    _flushed_at = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def add(cls, dbname, reader_code, reads, errors):
+        """Cộng số lần đọc, trả về True nếu đã đến lúc ghi xuống database"""
+        now = time.monotonic()
+        with cls._lock:
+            counts = cls._counts.setdefault(dbname, {}).setdefault(reader_code, [0, 0])
+            counts[0] += reads
+            counts[1] += errors
+            if now - cls._flushed_at.get(dbname, 0) < READ_FLUSH_INTERVAL:
+                return False
+            cls._flushed_at[dbname] = now
+            return True
+
+    @classmethod
+    def pop(cls, dbname):
+        with cls._lock:
+            return cls._counts.pop(dbname, {})
+
+    @classmethod
+    def restore(cls, dbname, pending):
+        """Trả lại số liệu chưa ghi được để lần ghi sau xử lý"""
+        with cls._lock:
+            counts = cls._counts.setdefault(dbname, {})
+            for reader_code, (reads, errors) in pending.items():
+                current = counts.setdefault(reader_code, [0, 0])
+                current[0] += reads
+                current[1] += errors
+
+
 class NSPReader(models.Model):
     _name = "nsp.reader"
     _description = "Thiết bị"
@@ -28,6 +85,8 @@ class NSPReader(models.Model):
     port = fields.Integer(string="Cổng mạng", help="Cổng mạng TCP/UDP của thiết bị")
     com_port = fields.Char(string="Cổng COM", help="Cổng nối tiếp của thiết bị (ví dụ: COM1, COM2)")
     location = fields.Char(string="Vị trí", help="Vị trí của thiết bị")
+    gate_id = fields.Many2one('nsp.gate', string="Cổng", index=True, help="Cổng mà thiết bị đọc được lắp đặt")
+    lot_id = fields.Many2one('nsp.lot', string="Bãi đỗ xe", related='gate_id.lot_id', store=True, index=True)
     
     # Reader configuration
     type = fields.Selection([
@@ -51,7 +110,24 @@ class NSPReader(models.Model):
     # Technical fields
     end_point = fields.Char(string="End point")
     auto_discovered = fields.Boolean(string="Tự động phát hiện", default=False)
+    # Chỉ lưu SHA-256 của token, token gốc chỉ hiển thị một lần khi tạo
+    token_hash = fields.Char(string="Token hash", copy=False, readonly=True, groups="non_stop_parking.group_nsp_admin")
+    token_prefix = fields.Char(string="Token", copy=False, readonly=True,
+                               help="Vài ký tự đầu của token hiện tại để đối chiếu với thiết bị")
+    token_previous_hash = fields.Char(string="Token hash cũ", copy=False, readonly=True, groups="non_stop_parking.group_nsp_admin")
+    token_previous_expiry = fields.Datetime(string="Token cũ hết hạn", copy=False, readonly=True,
+                                            help="Token trước khi xoay vòng còn hiệu lực đến thời điểm này")
     
+    # Số liệu đọc thẻ, cộng dồn trong ReadBuffer rồi ghi bằng SQL theo lô
+    read_count = fields.Integer(string="Số lần đọc", readonly=True, copy=False)
+    read_error_count = fields.Integer(string="Số lần đọc lỗi", readonly=True, copy=False)
+    last_read_at = fields.Datetime(string="Lần đọc cuối", readonly=True, copy=False)
+    read_rate = fields.Float(string="Tốc độ đọc tại lần đọc cuối", readonly=True, copy=False,
+                             help="Trung bình trượt số lần đọc mỗi giây, tính tại last_read_at")
+    read_error_rate = fields.Float(string="Tốc độ lỗi tại lần đọc cuối", readonly=True, copy=False)
+    throughput = fields.Float(string="Lượt đọc/phút", compute="_compute_throughput", digits=(16, 2))
+    error_ratio = fields.Float(string="Tỉ lệ lỗi (%)", compute="_compute_throughput", digits=(16, 2))
+
     # Relations
     vehicle_logs_ids = fields.One2many('nsp.vehicle.logs', 'reader_device', string="Lịch sử ra vào")
         
@@ -95,12 +171,101 @@ class NSPReader(models.Model):
                 if existing:
                     raise ValidationError(_("Cổng '%s' đã tồn tại") % record.port)
 
+    @api.depends('read_rate', 'read_error_rate', 'last_read_at')
+    def _compute_throughput(self):
+        now = fields.Datetime.now()
+        for record in self:
+            read_rate, error_rate = self._decay_rates(record.read_rate, record.read_error_rate, record.last_read_at, now)
+            record.throughput = read_rate * 60
+            record.error_ratio = error_rate / read_rate * 100 if read_rate else 0.0
+
+    @staticmethod
+    def _decay_rates(read_rate, error_rate, last_read_at, now):
+        """Trung bình trượt tốc độ đọc và lỗi (lần/giây) tại thời điểm now"""
+        if not last_read_at:
+            return 0.0, 0.0
+        decay = math.exp(-min((now - last_read_at).total_seconds() / READ_RATE_WINDOW, 50))
+        return (read_rate or 0.0) * decay, (error_rate or 0.0) * decay
+
+    @api.model
+    def _record_read(self, reader_code, success, reads=1):
+        """
+        Cộng số liệu đọc thẻ cho thiết bị vào bộ nhớ của worker, không truy vấn database.
+        Số liệu được ghi sau khi transaction hiện tại commit, tối đa một lần mỗi READ_FLUSH_INTERVAL.
+        Args:
+            reader_code (str): Mã thiết bị (reader_id)
+            success (bool): Sự kiện được xử lý thành công
+            reads (int): Số lần đọc
+        """
+        if not reader_code:
+            return
+        dbname = self.env.cr.dbname
+        if ReadBuffer.add(dbname, reader_code, reads, 0 if success else reads):
+            registry = self.env.registry
+            self.env.cr.postcommit.add(lambda: NSPReader._flush_reads_in_new_cursor(registry))
+
+    @staticmethod
+    def _flush_reads_in_new_cursor(registry):
+        """Ghi số liệu đọc thẻ trong transaction riêng, lỗi không ảnh hưởng request đã commit"""
+        try:
+            with registry.cursor() as cr:
+                api.Environment(cr, SUPERUSER_ID, {})['nsp.reader']._flush_reads()
+        except Exception as e:
+            _logger.warning(f"Failed to flush reader read counts: {e}")
+
+    @api.model
+    def _flush_reads(self):
+        """
+        Ghi số liệu đọc thẻ đang chờ của worker này: một câu UPDATE cho mọi thiết bị
+        và một bucket phút của nsp.reader.metric cho mỗi thiết bị
+        """
+        dbname = self.env.cr.dbname
+        pending = ReadBuffer.pop(dbname)
+        if not pending:
+            return
+        codes = list(pending)
+        try:
+            self.env.cr.execute(f"""
+                UPDATE {self._table} r
+                   SET read_count = COALESCE(r.read_count, 0) + b.reads,
+                       read_error_count = COALESCE(r.read_error_count, 0) + b.errors,
+                       read_rate = COALESCE(r.read_rate * exp(-LEAST(EXTRACT(EPOCH FROM %(now)s - r.last_read_at) / %(window)s, 50)), 0)
+                                   + b.reads::float / %(window)s,
+                       read_error_rate = COALESCE(r.read_error_rate * exp(-LEAST(EXTRACT(EPOCH FROM %(now)s - r.last_read_at) / %(window)s, 50)), 0)
+                                         + b.errors::float / %(window)s,
+                       last_read_at = %(now)s
+                  FROM unnest(%(codes)s::varchar[], %(reads)s::int[], %(errors)s::int[]) AS b(code, reads, errors)
+                 WHERE r.reader_id = b.code
+             RETURNING r.id, b.reads, b.errors
+            """, {
+                'codes': codes,
+                'reads': [pending[code][0] for code in codes],
+                'errors': [pending[code][1] for code in codes],
+                'now': fields.Datetime.now(),
+                'window': READ_RATE_WINDOW,
+            })
+            Metric = self.env['nsp.reader.metric']
+            for reader_id, reads, errors in self.env.cr.fetchall():
+                Metric._add_sample(reader_id, reads=reads, read_errors=errors)
+        except Exception:
+            ReadBuffer.restore(dbname, pending)
+            raise
+        self.invalidate_model(['read_count', 'read_error_count', 'read_rate', 'read_error_rate', 'last_read_at'])
+
+    @api.model
+    def _cron_flush_reads(self):
+        """Cron job ghi số liệu đọc thẻ còn chờ khi HTTP và cron chạy chung tiến trình (chế độ threaded)"""
+        self._flush_reads()
+
     @api.model        
     def create(self, vals):
         """Override create to validate IP and port"""
         if vals.get('ip_address') and vals.get('port'):
             self._validate_ip_port(vals['ip_address'], vals['port'])
-        return super().create(vals)
+        reader = super().create(vals)
+        # Cổng và token của thiết bị được cache trong nsp.gate._get_gate_id_by_reader và _get_token_map
+        self.env.registry.clear_cache()
+        return reader
         
     def write(self, vals):
         """Override write to validate IP and port"""
@@ -110,7 +275,111 @@ class NSPReader(models.Model):
                 port = vals.get('port', record.port)
                 is_connected = vals.get('is_connected', record.is_connected)
                 self._validate_ip_port(ip, port)
-        return super().write(vals)
+        # Trạng thái chỉ xóa cache thống kê khi thực sự thay đổi, ghi lại cùng giá trị không làm mất cache
+        status_changed = any(
+            record[name] != vals[name]
+            for name in ('status', 'is_connected', 'auto_discovered') if name in vals
+            for record in self
+        )
+        result = super().write(vals)
+        if status_changed or {'gate_id', 'reader_id', 'token_hash', 'token_previous_hash', 'token_previous_expiry'} & set(vals):
+            # Cổng, token và trạng thái của thiết bị được cache trong nsp.gate._get_gate_id_by_reader,
+            # _get_token_map và _get_statistics
+            self.env.registry.clear_cache()
+        return result
+
+    @staticmethod
+    def _hash_token(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @api.model
+    def _get_token_grace_minutes(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('nsp.reader_token_grace_minutes')
+        try:
+            return int(value) if value else DEFAULT_TOKEN_GRACE_MINUTES
+        except ValueError:
+            _logger.warning(f"Invalid nsp.reader_token_grace_minutes value: {value}")
+            return DEFAULT_TOKEN_GRACE_MINUTES
+
+    def action_generate_token(self):
+        """
+        Xoay vòng token của thiết bị
+        Token cũ còn hiệu lực thêm nsp.reader_token_grace_minutes phút để thiết bị kịp cập nhật.
+        Token mới chỉ được hiển thị một lần.
+        """
+        self.ensure_one()
+        token = secrets.token_urlsafe(32)
+        grace = self._get_token_grace_minutes()
+        self.sudo().write({
+            'token_hash': self._hash_token(token),
+            'token_prefix': token[:6],
+            'token_previous_hash': self.sudo().token_hash if grace else False,
+            'token_previous_expiry': fields.Datetime.now() + datetime.timedelta(minutes=grace) if grace else False,
+        })
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Token mới của thiết bị %s", self.name),
+                'message': _("%s\nToken chỉ hiển thị một lần, hãy lưu lại vào thiết bị.", token),
+                'type': 'warning',
+                'sticky': True,
+            },
+        }
+
+    def action_revoke_token(self):
+        """Thu hồi token của thiết bị, kể cả token cũ đang trong thời gian chuyển tiếp"""
+        self.sudo().write({
+            'token_hash': False,
+            'token_prefix': False,
+            'token_previous_hash': False,
+            'token_previous_expiry': False,
+        })
+        return True
+
+    @api.model
+    @tools.ormcache()
+    def _get_token_reader_codes(self):
+        """Mã các thiết bị đã được cấp token, cache cùng với _get_token_map"""
+        self.env.cr.execute(f"""
+            SELECT reader_id FROM {self._table}
+             WHERE token_hash IS NOT NULL AND reader_id IS NOT NULL
+        """)
+        return frozenset(row[0] for row in self.env.cr.fetchall())
+
+    @api.model
+    @tools.ormcache()
+    def _get_token_map(self):
+        """
+        Bảng tra token hash -> (id thiết bị, hạn dùng), cache trong bộ nhớ của worker
+        Returns:
+            dict: {token_hash: (reader_id, expiry hoặc None)}
+        """
+        self.env.cr.execute(f"""
+            SELECT id, token_hash, token_previous_hash, token_previous_expiry
+              FROM {self._table}
+             WHERE token_hash IS NOT NULL OR token_previous_hash IS NOT NULL
+        """)
+        token_map = {}
+        for reader_id, token_hash, previous_hash, previous_expiry in self.env.cr.fetchall():
+            if previous_hash and previous_expiry:
+                token_map[previous_hash] = (reader_id, previous_expiry)
+            if token_hash:
+                token_map[token_hash] = (reader_id, None)
+        return token_map
+
+    @api.model
+    def _get_by_token(self, token):
+        """Tìm thiết bị theo token truy cập, không truy vấn database khi cache còn hiệu lực"""
+        if not token:
+            return self.browse()
+        entry = self._get_token_map().get(self._hash_token(token))
+        if not entry:
+            return self.browse()
+        reader_id, expiry = entry
+        if expiry and expiry < fields.Datetime.now():
+            return self.browse()
+        return self.sudo().browse(reader_id)
 
     def _validate_ip_port(self, ip, port):
         """Validate IP address format and port range"""
@@ -210,18 +479,39 @@ class NSPReader(models.Model):
         url = f"http://{self.ip_address}:{self.port}{self._CHECK_URL}"
         return self._http_get_request(url, timeout=5)
 
+    def _probe(self):
+        """
+        Kiểm tra thiết bị, cập nhật trạng thái và ghi RTT vào nsp.reader.metric
+        RTT là thời gian mở kết nối socket đến thiết bị.
+        Returns:
+            tuple: (kết nối socket thành công, thông tin trạng thái từ API)
+        """
+        started = time.monotonic()
+        connected = self._check_connection_socket()
+        rtt = (time.monotonic() - started) * 1000
+        status_info = self._check_reader_status() if connected else None
+        self._set_probe_result(bool(status_info), rtt)
+        return connected, status_info
+
+    def _set_probe_result(self, success, rtt=None):
+        """Lưu kết quả kiểm tra, chỉ ghi trạng thái khi thay đổi để không xóa cache thống kê mỗi lần kiểm tra"""
+        vals = {
+            'status': 'active' if success else 'error',
+            'is_connected': success,
+        }
+        vals = {name: value for name, value in vals.items() if self[name] != value}
+        vals['last_checked'] = fields.Datetime.now()
+        self.write(vals)
+        self.env['nsp.reader.metric'].sudo()._add_sample(self.id, probe=success, rtt=rtt)
+
     # action test kết nối đến thiết bị
     def action_check_status(self):
         """Manual check reader status"""
         for reader in self:
             try:
+                connected, status_info = reader._probe()
                 # First check basic connection
-                if not reader._check_connection_socket():
-                    reader.write({
-                        'status': 'error',
-                        'is_connected': False,
-                        'last_checked': fields.Datetime.now(),
-                    })
+                if not connected:
                     return {
                         'type': 'ir.actions.client',
                         'tag': 'display_notification',
@@ -233,13 +523,7 @@ class NSPReader(models.Model):
                     }
                 
                 # Then check reader status via API
-                status_info = reader._check_reader_status()
                 if status_info:
-                    reader.write({
-                        'status': 'active',
-                        'is_connected': True,
-                        'last_checked': fields.Datetime.now(),
-                    })
                     return {
                         'type': 'ir.actions.client',
                         'tag': 'display_notification',
@@ -250,11 +534,6 @@ class NSPReader(models.Model):
                         }
                     }
                 else:
-                    reader.write({
-                        'status': 'error',
-                        'is_connected': False,
-                        'last_checked': fields.Datetime.now(),
-                    })
                     return {
                         'type': 'ir.actions.client',
                         'tag': 'display_notification',
@@ -267,11 +546,7 @@ class NSPReader(models.Model):
                  
             except Exception as e:
                 _logger.error(f"Error checking reader {reader.name}: {str(e)}")
-                reader.write({
-                    'status': 'error',
-                    'is_connected': False,
-                    'last_checked': fields.Datetime.now()
-                })
+                reader._set_probe_result(False)
                 return {
                     'type': 'ir.actions.client',
                     'tag': 'display_notification',
@@ -529,32 +804,18 @@ class NSPReader(models.Model):
             }
         }
     
-    # TODO Cron job kiểm tra trạng thái thiết bị
-    # @api.model
-    # def _cron_check_readers_status(self):
-    #     """Cron job to check all readers status"""
-    #     readers = self.search([('status', 'in', ['active', 'error'])])
-
-    #     for reader in readers:
-    #         try:
-    #             if reader._check_connection_socket():
-    #                 status_info = reader._check_reader_status()
-    #                 if status_info:
-    #                     reader.write({
-    #                         'status': 'active',
-    #                         'last_checked': fields.Datetime.now(),
-    #                     })
-    #                 else:
-    #                     reader.write({
-    #                         'status': 'error',
-    #                         'last_checked': fields.Datetime.now(),
-    #                     })
-    #         except Exception as e:
-    #             _logger.error(f"Error checking reader {reader.name} in cron: {str(e)}")
-    #             reader.write({
-    #                 'status': 'error',
-    #                 'last_checked': fields.Datetime.now(),
-    #             })
+    # Cron job kiểm tra trạng thái thiết bị
+    @api.model
+    def _cron_check_readers_status(self):
+        """Cron job to check all readers status, kết quả được ghi vào chuỗi thời gian nsp.reader.metric"""
+        readers = self.search([('status', 'in', ['active', 'error'])])
+
+        for reader in readers:
+            try:
+                reader._probe()
+            except Exception as e:
+                _logger.error(f"Error checking reader {reader.name} in cron: {str(e)}")
+                reader._set_probe_result(False)
     
     # # Công việc Cron để định kỳ khám phá những người đọc mới
     # @api.model
@@ -568,22 +829,74 @@ class NSPReader(models.Model):
         for reader in self:
             if reader.status == 'active':
                 raise ValidationError(_("Không thể xóa reader đang hoạt động. Vui lòng tắt reader trước khi xóa."))
-        return super().unlink()
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
     
     # Nhận số liệu thống kê người đọc cho dashboard
     @api.model
+    @api.readonly
     def get_reader_statistics(self):
-        """Get reader statistics for dashboard"""
-        total_readers = self.search_count([])
-        active_readers = self.search_count([('status', '=', 'active')])
-        error_readers = self.search_count([('status', '=', 'error')])
-        auto_discovered = self.search_count([('auto_discovered', '=', True)])
-        
+        """
+        Thống kê thiết bị đọc cho dashboard, cache STATISTICS_TTL giây
+        Cache bị xóa khi trạng thái thiết bị thay đổi, số liệu đọc được cập nhật sau tối đa STATISTICS_TTL giây.
+        Returns:
+            dict: Số thiết bị theo trạng thái, kết nối, tuổi lần kiểm tra cuối và số liệu đọc của từng thiết bị
+        """
+        return copy.deepcopy(self._get_statistics(int(time.time() // STATISTICS_TTL)))
+
+    @tools.ormcache('bucket')
+    def _get_statistics(self, bucket):
+        """Tính thống kê bằng một câu truy vấn, bucket là khoảng thời gian của cache"""
+        now = fields.Datetime.now()
+        self.env.cr.execute(f"""
+            SELECT id, name, reader_id, status, is_connected, auto_discovered,
+                   EXTRACT(EPOCH FROM %(now)s - last_checked),
+                   read_count, read_error_count, read_rate, read_error_rate, last_read_at
+              FROM {self._table}
+             ORDER BY name
+        """, {'now': now})
+        rows = self.env.cr.fetchall()
+
+        status_counts = defaultdict(int)
+        readers = []
+        connected = stale = 0
+        oldest_check_age = None
+        for (reader_id, name, code, status, is_connected, auto_discovered, check_age,
+             read_count, read_error_count, read_rate, read_error_rate, last_read_at) in rows:
+            status_counts[status or 'unknown'] += 1
+            status_counts['auto_discovered'] += bool(auto_discovered)
+            connected += bool(is_connected)
+            if check_age is None or check_age > STALE_CHECK_AGE:
+                stale += 1
+            if check_age is not None:
+                oldest_check_age = max(oldest_check_age or 0, float(check_age))
+            read_rate, read_error_rate = self._decay_rates(read_rate, read_error_rate, last_read_at, now)
+            readers.append({
+                'id': reader_id,
+                'name': name,
+                'reader_id': code,
+                'status': status,
+                'is_connected': bool(is_connected),
+                'last_check_age': float(check_age) if check_age is not None else None,
+                'read_count': read_count or 0,
+                'read_error_count': read_error_count or 0,
+                'throughput': round(read_rate * 60, 2),
+                'error_ratio': round(read_error_rate / read_rate * 100, 2) if read_rate else 0.0,
+            })
+
         return {
-            'total_readers': total_readers,
-            'active_readers': active_readers,
-            'error_readers': error_readers,
-            'auto_discovered': auto_discovered,
+            'total_readers': len(rows),
+            'active_readers': status_counts['active'],
+            'error_readers': status_counts['error'],
+            'maintenance_readers': status_counts['maintenance'],
+            'inactive_readers': status_counts['inactive'],
+            'auto_discovered': status_counts['auto_discovered'],
+            'connected_readers': connected,
+            'stale_readers': stale,
+            'oldest_check_age': oldest_check_age,
+            'readers': readers,
+            'computed_at': now,
         }
 
     @api.model
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from datetime import timedelta
+
+# (độ phân giải, số ngày giữ lại), bucket nhỏ được gộp thành bucket kế tiếp trước khi bị xóa
+RESOLUTIONS = [
+    ('minute', 2),
+    ('hour', 90),
+    ('day', None),
+]
+# Khoảng thời gian được tổng hợp lại mỗi lần chạy cron, đủ để bù các lần cron bị lỡ
+ROLLUP_LOOKBACK = {
+    'hour': timedelta(days=1),
+    'day': timedelta(days=7),
+}
+
+class ReaderMetric(models.Model):
+    """
+    Chuỗi thời gian của thiết bị đọc: kết quả kiểm tra (RTT, thành công/thất bại) và số lần đọc thẻ.
+    Dữ liệu được ghi vào bucket theo phút rồi gộp dần thành bucket giờ và ngày,
+    bucket cũ bị xóa theo thời gian giữ lại nên bảng không tăng vô hạn.
+    """
+    _name = "nsp.reader.metric"
+    _description = "Số liệu thiết bị đọc theo thời gian"
+    _order = "bucket_start desc"
+    _log_access = False
+
+    reader_id = fields.Many2one('nsp.reader', string="Thiết bị", required=True, readonly=True, ondelete='cascade')
+    resolution = fields.Selection([
+        ('minute', 'Phút'),
+        ('hour', 'Giờ'),
+        ('day', 'Ngày'),
+    ], string="Độ phân giải", required=True, readonly=True)
+    bucket_start = fields.Datetime(string="Thời gian", required=True, readonly=True)
+
+    probe_count = fields.Integer(string="Số lần kiểm tra", readonly=True)
+    probe_failures = fields.Integer(string="Số lần kiểm tra lỗi", readonly=True)
+    rtt_sum = fields.Float(string="Tổng RTT (ms)", readonly=True, aggregator=False)
+    rtt_max = fields.Float(string="RTT lớn nhất (ms)", readonly=True, aggregator='max')
+    read_count = fields.Integer(string="Số lần đọc", readonly=True)
+    read_errors = fields.Integer(string="Số lần đọc lỗi", readonly=True)
+
+    uptime = fields.Float(string="Uptime (%)", readonly=True, aggregator='avg', digits=(16, 2))
+    rtt_avg = fields.Float(string="RTT trung bình (ms)", readonly=True, aggregator='avg', digits=(16, 2))
+    read_rate = fields.Float(string="Lượt đọc/phút", readonly=True, aggregator='avg', digits=(16, 2))
+
+    _sql_constraints = [
+        ('bucket_unique', 'UNIQUE(reader_id, resolution, bucket_start)', 'Mỗi thiết bị chỉ có một bucket cho mỗi thời điểm'),
+    ]
+
+    @api.model
+    def _add_sample(self, reader_id, probe=None, rtt=None, reads=0, read_errors=0):
+        """
+        Cộng một mẫu vào bucket phút hiện tại của thiết bị
+        Args:
+            reader_id (int): ID thiết bị
+            probe (bool): Kết quả kiểm tra, None nếu mẫu chỉ gồm số lần đọc
+            rtt (float): Thời gian phản hồi (ms) của lần kiểm tra thành công
+            reads (int): Số lần đọc thẻ
+            read_errors (int): Số lần đọc lỗi
+        """
+        cr = self.env.cr
+        cr.execute(f"""
+            INSERT INTO {self._table} AS m (reader_id, resolution, bucket_start, probe_count, probe_failures,
+                                             rtt_sum, rtt_max, read_count, read_errors, read_rate)
+            VALUES (%(reader_id)s, 'minute', date_trunc('minute', %(now)s::timestamp), %(probes)s, %(failures)s,
+                    %(rtt)s, %(rtt)s, %(reads)s, %(read_errors)s, %(reads)s)
+            ON CONFLICT (reader_id, resolution, bucket_start) DO UPDATE SET
+                probe_count = m.probe_count + EXCLUDED.probe_count,
+                probe_failures = m.probe_failures + EXCLUDED.probe_failures,
+                rtt_sum = m.rtt_sum + EXCLUDED.rtt_sum,
+                rtt_max = GREATEST(m.rtt_max, EXCLUDED.rtt_max),
+                read_count = m.read_count + EXCLUDED.read_count,
+                read_errors = m.read_errors + EXCLUDED.read_errors,
+                read_rate = m.read_count + EXCLUDED.read_count
+            RETURNING id
+        """, {
+            'reader_id': reader_id,
+            'now': fields.Datetime.now(),
+            'probes': 0 if probe is None else 1,
+            'failures': 1 if probe is False else 0,
+            'rtt': rtt if probe else 0.0,
+            'reads': reads,
+            'read_errors': read_errors,
+        })
+        if probe is not None:
+            self._refresh_derived("id = %s", (cr.fetchone()[0],))
+
+    @api.model
+    def _refresh_derived(self, where, params):
+        """Tính lại uptime, RTT trung bình và tốc độ đọc từ các cột tổng"""
+        self.env.cr.execute(f"""
+            UPDATE {self._table}
+               SET uptime = CASE WHEN probe_count > 0
+                                 THEN 100.0 * (probe_count - probe_failures) / probe_count END,
+                   rtt_avg = CASE WHEN probe_count > probe_failures
+                                  THEN rtt_sum / (probe_count - probe_failures) END,
+                   read_rate = read_count / CASE resolution WHEN 'minute' THEN 1.0 WHEN 'hour' THEN 60.0 ELSE 1440.0 END
+             WHERE {where}
+        """, params)
+
+    @api.model
+    def _rollup(self, source, target, now):
+        """
+        Gộp các bucket đã đủ thời gian của độ phân giải source thành bucket target
+        Bucket target được tính lại toàn bộ nên cron chạy lại nhiều lần vẫn cho cùng kết quả.
+        """
+        since = now - ROLLUP_LOOKBACK[target]
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} (reader_id, resolution, bucket_start, probe_count, probe_failures,
+                                       rtt_sum, rtt_max, read_count, read_errors)
+            SELECT reader_id, %(target)s, date_trunc(%(target)s, bucket_start),
+                   sum(probe_count), sum(probe_failures), sum(rtt_sum), max(rtt_max), sum(read_count), sum(read_errors)
+              FROM {self._table}
+             WHERE resolution = %(source)s
+               AND bucket_start >= date_trunc(%(target)s, %(since)s::timestamp)
+               AND bucket_start < date_trunc(%(target)s, %(now)s::timestamp)
+             GROUP BY reader_id, date_trunc(%(target)s, bucket_start)
+            ON CONFLICT (reader_id, resolution, bucket_start) DO UPDATE SET
+                probe_count = EXCLUDED.probe_count,
+                probe_failures = EXCLUDED.probe_failures,
+                rtt_sum = EXCLUDED.rtt_sum,
+                rtt_max = EXCLUDED.rtt_max,
+                read_count = EXCLUDED.read_count,
+                read_errors = EXCLUDED.read_errors
+        """, {'source': source, 'target': target, 'since': since, 'now': now})
+        rows = self.env.cr.rowcount
+        self._refresh_derived("resolution = %s AND bucket_start >= date_trunc(%s, %s::timestamp)", (target, target, since))
+        return rows
+
+    @api.model
+    def _cron_downsample(self):
+        """Cron job gộp bucket phút thành giờ, giờ thành ngày và xóa bucket hết hạn"""
+        now = fields.Datetime.now()
+        for (source, _days), (target, _target_days) in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+            self._rollup(source, target, now)
+        for resolution, retention_days in RESOLUTIONS:
+            if retention_days:
+                self.env.cr.execute(
+                    f"DELETE FROM {self._table} WHERE resolution = %s AND bucket_start < %s",
+                    (resolution, now - timedelta(days=retention_days)))
+        self.invalidate_model()
+        return True
+
+    @api.model
+    @api.readonly
+    def get_series(self, reader_ids, resolution='hour', date_from=None, date_to=None, limit=1000):
+        """
+        Chuỗi thời gian của các thiết bị
+        Args:
+            reader_ids (list): ID thiết bị
+            resolution (str): 'minute', 'hour' hoặc 'day'
+            date_from (datetime): Từ thời điểm (optional)
+            date_to (datetime): Đến thời điểm (optional)
+            limit (int): Số bucket tối đa của mỗi thiết bị, lấy các bucket mới nhất
+        Returns:
+            dict: {reader_id: [bucket, ...]} theo thứ tự thời gian tăng dần
+        """
+        self.check_access('read')
+        where = ["reader_id = ANY(%(reader_ids)s)", "resolution = %(resolution)s"]
+        if date_from:
+            where.append("bucket_start >= %(date_from)s")
+        if date_to:
+            where.append("bucket_start < %(date_to)s")
+        # Giới hạn theo từng thiết bị bằng window function, một truy vấn cho mọi thiết bị
+        self.env.cr.execute(f"""
+            SELECT reader_id, bucket_start, probe_count, probe_failures, uptime::float, rtt_avg::float, rtt_max,
+                   read_count, read_errors, read_rate::float
+              FROM (
+                    SELECT *, row_number() OVER (PARTITION BY reader_id ORDER BY bucket_start DESC) AS rank
+                      FROM {self._table}
+                     WHERE {' AND '.join(where)}
+                   ) m
+             WHERE rank <= %(limit)s
+             ORDER BY reader_id, bucket_start
+        """, {
+            'reader_ids': list(reader_ids),
+            'resolution': resolution,
+            'date_from': date_from,
+            'date_to': date_to,
+            'limit': limit,
+        })
+
+        series = {reader_id: [] for reader_id in reader_ids}
+        for row in self.env.cr.dictfetchall():
+            row['bucket_start'] = row['bucket_start'].isoformat()
+            series[row.pop('reader_id')].append(row)
+        return series
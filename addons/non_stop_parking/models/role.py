@@ -15,3 +15,10 @@ class Roles(models.Model):
     )
 
     date_created = fields.Date("Creation Date")
+
+    def write(self, vals):
+        result = super().write(vals)
+        # Đồng bộ lại group cho người dùng đang giữ role khi quyền của role thay đổi
+        if 'group_id' in vals:
+            self.env['res.partner'].search([('roles', 'in', self.ids)]).assign_groups_from_roles()
+        return result
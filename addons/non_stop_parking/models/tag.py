@@ -3,6 +3,18 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.tools.sql import create_index
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Số thẻ được insert trong một câu lệnh khi nhập hàng loạt
+BULK_BATCH_SIZE = 5000
+# Trường chủ sở hữu trên thẻ -> (model, trường thẻ trên chủ sở hữu)
+TAG_OWNER_FIELDS = {
+    'vehicle_id': ('nsp.vehicle', 'vehicle_tag_id'),
+    'partner_id': ('res.partner', 'partner_tag_id'),
+}
 
 class Tag(models.Model):
     _name = 'nsp.tag'
@@ -17,11 +29,14 @@ class Tag(models.Model):
         [('active', 'Hoạt động'),
         ('inactive', 'Không hoạt động'),
         ('pending', 'Chưa kích hoạt'),
-        ('lost', 'Đánh mất')],
+        ('lost', 'Đánh mất'),
+        ('expired', 'Hết hạn')],
         string="Trạng thái",
         default='pending',
         required=True
     )
+    expired_by_validity = fields.Boolean(string="Hết hạn theo thời hạn", readonly=True, copy=False,
+                                         help="Thẻ bị cron chuyển sang hết hạn, sẽ được kích hoạt lại khi gia hạn valid_to")
 
     # Fields for syncnarization
     last_sync_date = fields.Datetime('Last Sync Date')
@@ -39,8 +54,20 @@ class Tag(models.Model):
     # SQL Constraints
     _sql_constraints = [
         ('tag_id_unique', 'UNIQUE(tag_id)', 'Tag ID phải là duy nhất'),
+        ('epc_unique', 'UNIQUE(epc)', 'EPC phải là duy nhất'),
     ]
     
+    def init(self):
+        # Cron hết hạn chỉ quét các thẻ đang hoạt động có ngày kết thúc
+        create_index(self._cr, 'nsp_tag_active_valid_to_idx', self._table, ['valid_to'],
+                     where="status = 'active' AND valid_to IS NOT NULL")
+
+    def write(self, vals):
+        # Trạng thái do người dùng đặt không được cron tự kích hoạt lại
+        if 'status' in vals and 'expired_by_validity' not in vals:
+            vals = dict(vals, expired_by_validity=False)
+        return super().write(vals)
+
     # Xóa thẻ
     def unlink(self):
         """Xóa thẻ"""
@@ -49,18 +76,6 @@ class Tag(models.Model):
                 raise ValidationError(_("Thẻ vẫn đang hoạt động, vui lòng thu hồi trước khi xóa."))
         return super().unlink()
 
-    @api.constrains('tag_id')
-    def _check_tag_id_unique(self):
-        """Kiểm tra xem thẻ đã được tồn tại chưa"""
-        for record in self: 
-            if record.tag_id:
-                existing = self.search([
-                    ('tag_id', '=', record.tag_id),
-                    ('id', '!=', record.id)
-                ])
-                if existing:
-                    raise ValidationError(_("Tag ID '%s' đã tồn tại") % record.tag_id)
-
     # Thẻ chỉ được gán cho một người dùng hoặc một phương tiện (Không được có cả hai hoặc rỗng)
     @api.constrains('partner_id', 'vehicle_id')
     def _check_owner_type(self):
@@ -69,4 +84,402 @@ class Tag(models.Model):
         """
         for record in self:
             if record.partner_id and record.vehicle_id:
-                raise ValidationError(_("Thẻ chỉ được gán cho một người dùng hoặc một phương tiện (Không được có cả hai)"))
\ No newline at end of file
+                raise ValidationError(_("Thẻ chỉ được gán cho một người dùng hoặc một phương tiện (Không được có cả hai)"))
+
+    def _get_validity_error(self, now=None):
+        """
+        Kiểm tra thời hạn hiệu lực từ valid_from/valid_to đã được đọc cùng thẻ, không truy vấn thêm
+        Returns:
+            str: Mã lỗi nếu thẻ ngoài thời hạn, None nếu hợp lệ
+        """
+        self.ensure_one()
+        return self._validity_error(self.status, self.valid_from, self.valid_to, now)
+
+    @api.model
+    def _validity_error(self, status, valid_from, valid_to, now=None):
+        """Cùng logic với _get_validity_error trên giá trị thô (dùng bởi nsp.gate.engine)"""
+        now = now or fields.Datetime.now()
+        if status == 'expired' or (valid_to and now > valid_to):
+            return 'TAG_EXPIRED'
+        if valid_from and now < valid_from:
+            return 'TAG_NOT_YET_VALID'
+        return None
+
+    @api.model
+    def _cron_refresh_validity(self):
+        """Cron job chuyển trạng thái thẻ theo thời hạn hiệu lực bằng câu lệnh hàng loạt"""
+        self.flush_model(['status', 'expired_by_validity', 'valid_to', 'partner_id', 'vehicle_id'])
+        cr = self.env.cr
+        cr.execute("""
+            UPDATE nsp_tag
+               SET status = 'expired', expired_by_validity = TRUE,
+                   write_uid = %(uid)s, write_date = now() at time zone 'UTC'
+             WHERE status = 'active'
+               AND valid_to IS NOT NULL
+               AND valid_to < now() at time zone 'UTC'
+        """, {'uid': self.env.uid})
+        expired = cr.rowcount
+
+        # Thẻ do cron chuyển sang hết hạn được kích hoạt lại khi gia hạn valid_to và vẫn đang được gán,
+        # thẻ hết hạn do người dùng đặt thì giữ nguyên
+        cr.execute("""
+            UPDATE nsp_tag
+               SET status = 'active', expired_by_validity = FALSE,
+                   write_uid = %(uid)s, write_date = now() at time zone 'UTC'
+             WHERE status = 'expired'
+               AND expired_by_validity
+               AND valid_to IS NOT NULL
+               AND valid_to >= now() at time zone 'UTC'
+               AND (partner_id IS NOT NULL OR vehicle_id IS NOT NULL)
+        """, {'uid': self.env.uid})
+        renewed = cr.rowcount
+
+        if expired or renewed:
+            self.invalidate_model(['status', 'expired_by_validity', 'write_uid', 'write_date'])
+        _logger.info(f"Tag validity refreshed: {expired} expired, {renewed} renewed")
+        return {'expired': expired, 'renewed': renewed}
+
+    @api.model
+    def _resolve_tags(self, keys):
+        """
+        Tìm thẻ theo TID hoặc EPC trong một truy vấn (dùng index unique của cả hai cột)
+        Args:
+            keys (list): Danh sách TID và/hoặc EPC
+        Returns:
+            dict: {key: nsp.tag} cho các key tìm thấy, TID được ưu tiên nếu trùng với EPC thẻ khác
+        """
+        keys = [key for key in keys if key]
+        if not keys:
+            return {}
+        tags = self.search(['|', ('tag_id', 'in', keys), ('epc', 'in', keys)])
+        by_tid = {tag.tag_id: tag for tag in tags}
+        by_epc = {tag.epc: tag for tag in tags if tag.epc}
+        resolved = {}
+        for key in keys:
+            tag = by_tid.get(key) or by_epc.get(key)
+            if tag:
+                resolved[key] = tag
+        return resolved
+
+    @api.model
+    def _resolve_tag(self, key):
+        """Tìm một thẻ theo TID hoặc EPC"""
+        return self._resolve_tags([key]).get(key, self.browse())
+
+    @api.model
+    def bulk_provision(self, rows, status='pending', batch_size=BULK_BATCH_SIZE):
+        """
+        Tạo thẻ hàng loạt, dựa vào ràng buộc UNIQUE của database để loại thẻ trùng
+        Args:
+            rows (list): Danh sách dict {'tag_id': TID, 'epc': EPC, 'status': trạng thái (optional)}
+            status (str): Trạng thái mặc định của thẻ mới
+            batch_size (int): Số thẻ mỗi câu lệnh INSERT
+        Returns:
+            dict: {'created': số thẻ đã tạo, 'conflicts': [{'row', 'tag_id', 'error_code'}]}
+        """
+        valid_status = dict(self._fields['status'].selection)
+        conflicts = []
+        pending = []
+        seen = set()
+        seen_epcs = set()
+        for index, row in enumerate(rows):
+            tag_id = (row.get('tag_id') or '').strip()
+            epc = (row.get('epc') or '').strip() or None
+            row_status = row.get('status') or status
+            if not tag_id:
+                conflicts.append({'row': index, 'tag_id': tag_id, 'error_code': 'MISSING_TAG_ID'})
+            elif row_status not in valid_status:
+                conflicts.append({'row': index, 'tag_id': tag_id, 'error_code': 'INVALID_STATUS'})
+            elif tag_id in seen or (epc and epc in seen_epcs):
+                conflicts.append({'row': index, 'tag_id': tag_id, 'error_code': 'DUPLICATE_IN_REQUEST'})
+            else:
+                seen.add(tag_id)
+                if epc:
+                    seen_epcs.add(epc)
+                pending.append((index, tag_id, epc, row_status))
+
+        self.flush_model(['tag_id', 'epc'])
+        created = 0
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            self.env.cr.execute("""
+                INSERT INTO nsp_tag (tag_id, epc, status, sync_status, sync_from_cloud,
+                                     create_uid, create_date, write_uid, write_date)
+                SELECT t.tag_id, t.epc, t.status, 'pending', false,
+                       %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+                  FROM unnest(%(tag_ids)s::varchar[], %(epcs)s::varchar[], %(statuses)s::varchar[])
+                       AS t(tag_id, epc, status)
+                    ON CONFLICT DO NOTHING
+             RETURNING tag_id
+            """, {
+                'uid': self.env.uid,
+                'tag_ids': [row[1] for row in batch],
+                'epcs': [row[2] for row in batch],
+                'statuses': [row[3] for row in batch],
+            })
+            inserted = {row[0] for row in self.env.cr.fetchall()}
+            created += len(inserted)
+            skipped = [(index, tag_id, epc) for index, tag_id, epc, _status in batch if tag_id not in inserted]
+            conflicts += self._insert_conflicts(skipped)
+
+        conflicts.sort(key=lambda conflict: conflict['row'])
+        return {'created': created, 'conflicts': conflicts}
+
+    @api.model
+    def _insert_conflicts(self, skipped):
+        """
+        Xác định ràng buộc unique đã chặn các dòng bị bỏ qua bởi INSERT ... ON CONFLICT DO NOTHING
+        Args:
+            skipped (list): Danh sách (dòng, TID, EPC) không được tạo
+        Returns:
+            list: [{'row', 'tag_id', 'error_code'}] với error_code là TAG_EXISTS hoặc EPC_EXISTS
+        """
+        if not skipped:
+            return []
+        self.env.cr.execute("""
+            SELECT tag_id, epc FROM nsp_tag WHERE tag_id = ANY(%s) OR epc = ANY(%s)
+        """, ([row[1] for row in skipped], [row[2] for row in skipped if row[2]]))
+        existing_tids, existing_epcs = set(), set()
+        for tag_id, epc in self.env.cr.fetchall():
+            existing_tids.add(tag_id)
+            existing_epcs.add(epc)
+        return [{
+            'row': index,
+            'tag_id': tag_id,
+            'error_code': 'EPC_EXISTS' if tag_id not in existing_tids and epc in existing_epcs else 'TAG_EXISTS',
+        } for index, tag_id, epc in skipped]
+
+    @api.model
+    def bulk_assign(self, assignments, batch_size=BULK_BATCH_SIZE):
+        """
+        Gán thẻ hàng loạt cho phương tiện hoặc người dùng trong cùng một transaction.
+        Xung đột được kiểm tra theo tập hợp, mọi thay đổi được ghi bằng các câu lệnh UPDATE/INSERT gộp.
+        Thẻ chưa tồn tại được tạo mới; thẻ đang hoạt động không được gán lại.
+        Thẻ cũ của chủ sở hữu được thu hồi để mỗi phương tiện/người dùng chỉ có một thẻ hoạt động.
+        Args:
+            assignments (list): Danh sách dict {'tag_id': TID/EPC, 'vehicle_id': id} hoặc {'tag_id': ..., 'partner_id': id}
+            batch_size (int): Số dòng mỗi câu lệnh
+        Returns:
+            dict: {'assigned': số thẻ đã gán, 'created': số thẻ tạo mới, 'replaced': số thẻ cũ bị thu hồi,
+                   'conflicts': [{'row', 'tag_id', 'error_code'}]}
+        """
+        conflicts = []
+        pending = []
+        seen_keys = set()
+        seen_owners = set()
+        for index, row in enumerate(assignments):
+            key = (row.get('tag_id') or '').strip()
+            owners = [(field, row.get(field)) for field in TAG_OWNER_FIELDS if row.get(field)]
+            if not key or len(owners) != 1:
+                conflicts.append({'row': index, 'tag_id': key, 'error_code': 'MISSING_PARAMS'})
+                continue
+            owner_field, owner_id = owners[0]
+            if not isinstance(owner_id, int):
+                conflicts.append({'row': index, 'tag_id': key, 'error_code': 'INVALID_PARAMS'})
+            elif key in seen_keys:
+                conflicts.append({'row': index, 'tag_id': key, 'error_code': 'DUPLICATE_IN_REQUEST'})
+            elif (owner_field, owner_id) in seen_owners:
+                conflicts.append({'row': index, 'tag_id': key, 'error_code': 'DUPLICATE_OWNER'})
+            else:
+                seen_keys.add(key)
+                seen_owners.add((owner_field, owner_id))
+                pending.append((index, key, owner_field, owner_id))
+
+        # Chủ sở hữu phải tồn tại: một truy vấn cho mỗi model
+        existing_owners = set()
+        for owner_field, (model, _tag_field) in TAG_OWNER_FIELDS.items():
+            ids = [owner_id for _index, _key, field, owner_id in pending if field == owner_field]
+            if ids:
+                existing_owners.update((owner_field, owner_id) for owner_id in self.env[model].browse(ids).exists().ids)
+
+        resolved = self._resolve_tags([key for _index, key, _field, _owner in pending])
+        to_update = []
+        to_create = []
+        used_tags = set()
+        for index, key, owner_field, owner_id in pending:
+            tag = resolved.get(key)
+            if (owner_field, owner_id) not in existing_owners:
+                conflicts.append({'row': index, 'tag_id': key, 'error_code': 'OWNER_NOT_FOUND'})
+            elif not tag:
+                to_create.append((index, key, owner_field, owner_id))
+            elif tag.id in used_tags:
+                # TID và EPC của cùng một thẻ trong cùng request
+                conflicts.append({'row': index, 'tag_id': key, 'error_code': 'DUPLICATE_IN_REQUEST'})
+            elif tag.status == 'active':
+                conflicts.append({'row': index, 'tag_id': key, 'error_code': 'TAG_IN_USE'})
+            else:
+                used_tags.add(tag.id)
+                to_update.append((index, key, tag.id, owner_field, owner_id))
+
+        cr = self.env.cr
+        assigned = []
+        for start in range(0, len(to_update), batch_size):
+            batch = to_update[start:start + batch_size]
+            # Điều kiện status <> 'active' chặn trường hợp thẻ vừa được gán bởi request khác
+            cr.execute("""
+                UPDATE nsp_tag t
+                   SET status = 'active', vehicle_id = v.vehicle_id, partner_id = v.partner_id,
+                       expired_by_validity = FALSE,
+                       write_uid = %(uid)s, write_date = now() at time zone 'UTC'
+                  FROM unnest(%(tag_ids)s::int[], %(vehicle_ids)s::int[], %(partner_ids)s::int[])
+                       AS v(tag_id, vehicle_id, partner_id)
+                 WHERE t.id = v.tag_id
+                   AND t.status <> 'active'
+             RETURNING t.id
+            """, {
+                'uid': self.env.uid,
+                'tag_ids': [row[2] for row in batch],
+                'vehicle_ids': [row[4] if row[3] == 'vehicle_id' else None for row in batch],
+                'partner_ids': [row[4] if row[3] == 'partner_id' else None for row in batch],
+            })
+            updated = {row[0] for row in cr.fetchall()}
+            for index, key, tag_id, owner_field, owner_id in batch:
+                if tag_id in updated:
+                    assigned.append((tag_id, owner_field, owner_id))
+                else:
+                    conflicts.append({'row': index, 'tag_id': key, 'error_code': 'TAG_IN_USE'})
+
+        created = 0
+        for start in range(0, len(to_create), batch_size):
+            batch = to_create[start:start + batch_size]
+            cr.execute("""
+                INSERT INTO nsp_tag (tag_id, status, vehicle_id, partner_id, sync_status, sync_from_cloud,
+                                     create_uid, create_date, write_uid, write_date)
+                SELECT v.tag_id, 'active', v.vehicle_id, v.partner_id, 'pending', false,
+                       %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+                  FROM unnest(%(tag_ids)s::varchar[], %(vehicle_ids)s::int[], %(partner_ids)s::int[])
+                       AS v(tag_id, vehicle_id, partner_id)
+                    ON CONFLICT DO NOTHING
+             RETURNING id, tag_id
+            """, {
+                'uid': self.env.uid,
+                'tag_ids': [row[1] for row in batch],
+                'vehicle_ids': [row[3] if row[2] == 'vehicle_id' else None for row in batch],
+                'partner_ids': [row[3] if row[2] == 'partner_id' else None for row in batch],
+            })
+            inserted = {tag_key: tag_id for tag_id, tag_key in cr.fetchall()}
+            created += len(inserted)
+            skipped = []
+            for index, key, owner_field, owner_id in batch:
+                if key in inserted:
+                    assigned.append((inserted[key], owner_field, owner_id))
+                else:
+                    skipped.append((index, key, None))
+            conflicts += self._insert_conflicts(skipped)
+
+        replaced = 0
+        if assigned:
+            replaced = self._write_owner_tags(assigned, batch_size)
+            self.invalidate_model(['status', 'vehicle_id', 'partner_id', 'expired_by_validity', 'write_uid', 'write_date'])
+
+        conflicts.sort(key=lambda conflict: conflict['row'])
+        return {'assigned': len(assigned), 'created': created, 'replaced': replaced, 'conflicts': conflicts}
+
+    @api.model
+    def _write_owner_tags(self, assigned, batch_size=BULK_BATCH_SIZE):
+        """
+        Cập nhật trường thẻ trên phương tiện/người dùng sau khi gán hàng loạt
+        và thu hồi thẻ cũ của các chủ sở hữu này (giống _revoke)
+        Args:
+            assigned (list): Danh sách (id thẻ, trường chủ sở hữu, id chủ sở hữu)
+        Returns:
+            int: Số thẻ cũ bị thu hồi
+        """
+        cr = self.env.cr
+        replaced = 0
+        for owner_field, (model, tag_field) in TAG_OWNER_FIELDS.items():
+            pairs = [(tag_id, owner_id) for tag_id, field, owner_id in assigned if field == owner_field]
+            if not pairs:
+                continue
+            table = self.env[model]._table
+            self.flush_model([owner_field, 'status'])
+            self.env[model].flush_model([tag_field])
+            for start in range(0, len(pairs), batch_size):
+                batch = pairs[start:start + batch_size]
+                tag_ids = [pair[0] for pair in batch]
+                owner_ids = [pair[1] for pair in batch]
+                # Thu hồi thẻ đang gán cho chủ sở hữu (theo cột chủ sở hữu trên thẻ hoặc trường thẻ của chủ sở hữu)
+                cr.execute(f"""
+                    UPDATE nsp_tag
+                       SET status = 'inactive', vehicle_id = NULL, partner_id = NULL, expired_by_validity = FALSE,
+                           write_uid = %(uid)s, write_date = now() at time zone 'UTC'
+                     WHERE id <> ALL(%(tag_ids)s)
+                       AND ({owner_field} = ANY(%(owner_ids)s)
+                            OR id IN (SELECT {tag_field} FROM {table} WHERE id = ANY(%(owner_ids)s)))
+                """, {
+                    'uid': self.env.uid,
+                    'owner_ids': owner_ids,
+                    'tag_ids': tag_ids,
+                })
+                replaced += cr.rowcount
+                # Bỏ tham chiếu cũ của chủ sở hữu khác tới các thẻ này (giữ ràng buộc unique của xe)
+                cr.execute(f"""
+                    UPDATE {table} SET {tag_field} = NULL
+                     WHERE {tag_field} = ANY(%s)
+                """, (tag_ids,))
+                cr.execute(f"""
+                    UPDATE {table} o
+                       SET {tag_field} = v.tag_id, write_uid = %(uid)s, write_date = now() at time zone 'UTC'
+                      FROM unnest(%(owner_ids)s::int[], %(tag_ids)s::int[]) AS v(owner_id, tag_id)
+                     WHERE o.id = v.owner_id
+                """, {
+                    'uid': self.env.uid,
+                    'owner_ids': owner_ids,
+                    'tag_ids': tag_ids,
+                })
+            self.env[model].invalidate_model([tag_field, 'write_uid', 'write_date'])
+        return replaced
+
+    @api.model
+    def bulk_revoke(self, keys):
+        """
+        Thu hồi thẻ hàng loạt theo TID hoặc EPC
+        Args:
+            keys (list): Danh sách TID/EPC
+        Returns:
+            dict: {'revoked': số thẻ đã thu hồi, 'conflicts': [{'row', 'tag_id', 'error_code'}]}
+        """
+        resolved = self._resolve_tags(keys)
+        conflicts = [
+            {'row': index, 'tag_id': key, 'error_code': 'TAG_NOT_FOUND'}
+            for index, key in enumerate(keys) if key not in resolved
+        ]
+        tags = self.browse().union(*resolved.values())
+        tags._revoke()
+        return {'revoked': len(tags), 'conflicts': conflicts}
+
+    def _revoke(self):
+        """Thu hồi các thẻ trong recordset: gỡ khỏi chủ sở hữu và chuyển về không hoạt động"""
+        if not self:
+            return
+        for model, tag_field in TAG_OWNER_FIELDS.values():
+            owners = self.env[model].search([(tag_field, 'in', self.ids)])
+            if owners:
+                owners.write({tag_field: False})
+        self.write({
+            'partner_id': False,
+            'vehicle_id': False,
+            'status': 'inactive',
+        })
+
+    def action_revoke(self):
+        """Thu hồi các thẻ được chọn (server action trên danh sách thẻ)"""
+        self._revoke()
+        return self._notify_revoked()
+
+    @api.model
+    def _notify_revoked(self):
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Thu hồi thẻ thành công'),
+                'message': _('Thẻ đã được thu hồi thành công'),
+                'type': 'success',
+                'sticky': False,
+                'next': {
+                    'type': 'ir.actions.client',
+                    'tag': 'reload',
+                }
+            }
+        }
@@ -4,6 +4,10 @@
 from odoo import models, fields, api, _
 from odoo.http import request
 from odoo.exceptions import ValidationError
+from collections import defaultdict
+
+# Số partner được tạo mỗi lần khi nhập khách hàng hàng loạt
+ONBOARD_BATCH_SIZE = 1000
 
 class ResPartner(models.Model):
     """
@@ -89,26 +93,26 @@ class ResPartner(models.Model):
         }
 
     # Tạo partner và user
-    @api.model
-    def create(self, vals):
-        """Tạo partner và user"""
-        partner = super().create(vals)
-
-        user = self.env['res.users'].create({
-            'name': partner.name,
-            'login': partner.email,
-            'email': partner.email,
-            'partner_id': partner.id,
-        })
-
-        partner.assign_default_roles()
-        return partner
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Tạo partner và user
+        Partner chưa có email (hoặc tạo với context nsp_skip_login) chưa có tài khoản đăng nhập,
+        có thể tạo sau bằng action_create_login.
+        """
+        partners = super().create(vals_list)
+        partners.assign_default_roles()
+        if not self.env.context.get('nsp_skip_login'):
+            partners._create_logins()
+        return partners
 	
     # Cập nhật partner
     def write(self, vals):
         """Cập nhật partner"""
         result = super().write(vals)
-        self.assign_groups_from_roles()
+        # Chỉ đồng bộ group khi role thay đổi: ghi groups_id làm mới cache phân quyền của mọi worker
+        if 'roles' in vals and not self.env.context.get('nsp_skip_role_sync'):
+            self.assign_groups_from_roles()
         return result
     
     def unlink(self):
@@ -183,31 +187,9 @@ class ResPartner(models.Model):
 
     # Thu hồi thẻ
     def action_revoke_tag(self):
-        """Thu hồi thẻ"""
-        for partner in self:
-            tag = partner.partner_tag_id
-            if tag:
-                tag.write({
-                    'partner_id': False,
-                    'vehicle_id': False,
-                    'status': 'inactive',
-                })
-                partner.partner_tag_id = False
-                
-        return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _('Thu hồi thẻ thành công'),
-                'message': _('Thẻ đã được thu hồi thành công'),
-                'type': 'success',
-                'sticky': False,
-                'next': {
-                    'type': 'ir.actions.client',
-                    'tag': 'reload',
-                }
-            }
-        }
+        """Thu hồi thẻ của các bản ghi được chọn bằng các câu lệnh gộp"""
+        self.partner_tag_id._revoke()
+        return self.env['nsp.tag']._notify_revoked()
     
     @api.depends('roles', 'roles.group_id')
     def _compute_groups_from_roles(self):
@@ -217,23 +199,96 @@ class ResPartner(models.Model):
 
     #Update role của user, bỏ hết các group mặc định
     #Chỉ assign vào group NSP để chỉ hiển thị NSP
+    #Các user có cùng tập role được ghi trong một lần write
     def assign_groups_from_roles(self):
+        users_by_groups = defaultdict(lambda: self.env['res.users'])
         for partner in self:
-            if partner.user_ids and not partner.user_ids.has_groups('base.group_system'):
+            if partner.user_ids and not any(user._is_system() for user in partner.user_ids):
                 nsp_group = partner.roles.mapped('group_id')
-                partner.user_ids.write({'groups_id': [(6, 0, nsp_group.ids)]})
+                users_by_groups[tuple(sorted(nsp_group.ids))] |= partner.user_ids
+        for group_ids, users in users_by_groups.items():
+            users.write({'groups_id': [(6, 0, list(group_ids))]})
 
     #Set role của User tạo mới mặc định là User
     def assign_default_roles(self):
-        for partner in self:
-            if not partner.roles: #Kiểm tra xem role User đã tạo chưa để tránh tạo duplicate
-                group = self.env.ref('non_stop_parking.group_nsp_users')
-                role = self.env['nsp.role'].search([('name', '=', 'User')], limit=1)
-                if not role:
-                    role = self.env['nsp.role'].create({
-                        'name': 'User',
-                        'description': "Default User access rights",
-                        'group_id': [(6, 0, [group.id])]
-                    })
-                partner.roles = [(4, role.id)]
-                partner.user_ids.write({'groups_id': [(6, 0, [group.id])]})
\ No newline at end of file
+        partners = self.filtered(lambda partner: not partner.roles) #Kiểm tra xem role User đã tạo chưa để tránh tạo duplicate
+        if not partners:
+            return
+        role = self._get_default_role()
+        # Group của user được ghi một lần bên dưới, không cần đồng bộ lại theo role
+        partners.with_context(nsp_skip_role_sync=True).write({'roles': [(4, role.id)]})
+        users = partners.user_ids
+        if users:
+            users.write({'groups_id': [(6, 0, role.group_id.ids)]})
+
+    @api.model
+    def _get_default_role(self):
+        """Role mặc định của người dùng mới, tạo nếu chưa có"""
+        role = self.env['nsp.role'].search([('name', '=', 'User')], limit=1)
+        if not role:
+            group = self.env.ref('non_stop_parking.group_nsp_users')
+            role = self.env['nsp.role'].create({
+                'name': 'User',
+                'description': "Default User access rights",
+                'group_id': [(6, 0, [group.id])]
+            })
+        return role
+
+    def _create_logins(self):
+        """
+        Tạo tài khoản đăng nhập cho các partner có email mà chưa có user, trong một lần create
+        Group được gán ngay khi tạo theo role của partner
+        """
+        partners = self.filtered(lambda partner: partner.email and not partner.user_ids)
+        if not partners:
+            return self.env['res.users']
+        return self.env['res.users'].create([{
+            'name': partner.name,
+            'login': partner.email,
+            'email': partner.email,
+            'partner_id': partner.id,
+            'groups_id': [(6, 0, partner.roles.group_id.ids)],
+        } for partner in partners])
+
+    def action_create_login(self):
+        """Tạo tài khoản đăng nhập cho các người dùng được chọn"""
+        users = self._create_logins()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Tạo tài khoản đăng nhập'),
+                'message': _(f'Đã tạo {len(users)} tài khoản đăng nhập'),
+                'type': 'success',
+                'sticky': False,
+            }
+        }
+
+    @api.model
+    def bulk_onboard_customers(self, vals_list, batch_size=ONBOARD_BATCH_SIZE, create_login=False):
+        """
+        Nhập khách hàng hàng loạt
+        Partner được tạo theo batch, role mặc định chỉ được tìm một lần cho mỗi batch,
+        tài khoản đăng nhập chỉ được tạo khi create_login=True (hoặc sau này bằng action_create_login)
+        Args:
+            vals_list (list): Danh sách dict giá trị của partner
+            batch_size (int): Số partner mỗi lần create
+            create_login (bool): Tạo luôn tài khoản đăng nhập cho partner có email
+        Returns:
+            list: ID các partner đã tạo
+        """
+        Partner = self.with_context(
+            nsp_skip_login=not create_login,
+            no_reset_password=True,
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+        )
+        partner_ids = []
+        for start in range(0, len(vals_list), batch_size):
+            partners = Partner.create(vals_list[start:start + batch_size])
+            partner_ids.extend(partners.ids)
+            # Giải phóng cache giữa các batch để bộ nhớ không tăng theo số khách hàng
+            partners.env.flush_all()
+            partners.env.invalidate_all()
+        return partner_ids
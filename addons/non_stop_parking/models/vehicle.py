@@ -4,15 +4,22 @@
 from odoo import models, fields, api, _
 from odoo.http import request
 from odoo.exceptions import ValidationError
+from odoo.tools.sql import create_index
+from .plate import normalize_plate, ensure_trigram, drop_btree_index
+import hashlib
 
 class Vehicle(models.Model):
     _name="nsp.vehicle"
     _description="Phương tiện"
+    _inherit = ["nsp.plate.search.mixin"]
     _rec_name = 'plate_number'
+    _rec_names_search = ['plate_search', 'name']
     
     name = fields.Char(string="Tên phương tiện", required=True)
     brand = fields.Char(string="Hãng xe")
     plate_number = fields.Char(string="Biến số xe", size=20, required=True)
+    plate_key = fields.Char(string="Biển số chuẩn hóa", compute="_compute_plate_key", store=True, index='trigram',
+                            help="Biển số bỏ dấu phân cách và viết hoa, dùng để tra cứu")
     color = fields.Char(string="Màu sắc")
     vehicle_type = fields.Selection([
         ('car', 'Ô tô'),
@@ -33,6 +40,11 @@ class Vehicle(models.Model):
         ('unknown', 'Không xác định')
     ], string="Trạng thái hiện tại", default='unknown', compute="_compute_current_status", store=True, help="Hướng di chuyển cuối cùng của xe")
 
+    current_lot_id = fields.Many2one('nsp.lot', string="Bãi hiện tại", index=True, readonly=True,
+                                     help="Bãi mà xe đang ở trong, cập nhật khi xe qua cổng")
+    last_event_time = fields.Datetime(string="Lần qua cổng cuối", readonly=True,
+                                      help="Thời điểm xe qua cổng gần nhất, là giờ vào bãi khi xe đang trong bãi")
+
     # Relations
     # Quan hệ Nhiều-Một: Nhiều xe thuộc về một chủ sở hữu
     owner_partner_id = fields.Many2one('res.partner', string="Chủ sở hữu")
@@ -50,6 +62,35 @@ class Vehicle(models.Model):
         ('vehicle_tag_id_unique', 'UNIQUE(vehicle_tag_id)', 'Mỗi thẻ chỉ được gán cho một xe!')
     ]
 
+    def _auto_init(self):
+        # Index trigram của plate_key cần pg_trgm
+        ensure_trigram(self._cr, self.env.registry)
+        drop_btree_index(self._cr, self._table, 'plate_key')
+        return super()._auto_init()
+
+    def init(self):
+        # Keyset pagination của /api/v1/vehicle/list, cùng thứ tự 'name desc nulls last, id desc'
+        create_index(self._cr, 'nsp_vehicle_owner_name_id_idx', self._table,
+                     ['owner_partner_id', 'name DESC NULLS LAST', 'id DESC'])
+        # Lấy thời điểm qua cổng cuối từ lịch sử cho các xe chưa có
+        self._cr.execute(f"""
+            UPDATE {self._table} v
+               SET last_event_time = s.event_time
+              FROM (
+                    SELECT vehicle_id, max(event_time) AS event_time
+                      FROM (SELECT vehicle_id, create_date AS event_time FROM nsp_vehicle_logs
+                            UNION ALL
+                            SELECT vehicle_id, event_time FROM nsp_gate_event) e
+                     GROUP BY vehicle_id
+                   ) s
+             WHERE s.vehicle_id = v.id AND v.last_event_time IS NULL
+        """)
+
+    @api.depends('plate_number')
+    def _compute_plate_key(self):
+        for vehicle in self:
+            vehicle.plate_key = normalize_plate(vehicle.plate_number)
+
     @api.depends('last_direction')
     def _compute_current_status(self):
         """Tính toán trạng thái hiện tại dựa trên hướng cuối cùng"""
@@ -72,6 +113,53 @@ class Vehicle(models.Model):
         result = super().write(vals)
         return result
     
+    @api.model
+    @api.readonly
+    def get_status(self, domain, now=None):
+        """
+        Trạng thái của nhiều xe từ trạng thái ra vào lưu trên xe, không đọc lịch sử
+        Args:
+            domain (list): Domain chọn xe
+            now (datetime): Thời điểm tính thời gian đỗ và phí (mặc định là hiện tại)
+        Returns:
+            dict: {'vehicles': [...], 'last_modified': datetime, 'etag': str}
+        """
+        now = now or fields.Datetime.now()
+        vehicles = self.search_read(domain, [
+            'plate_number', 'vehicle_type', 'current_status', 'last_direction',
+            'current_lot_id', 'last_event_time', 'write_date',
+        ], order='id', load=None)
+        price_map, price_date = self.env['nsp.vehicle.price']._get_price_map()
+        Logs = self.env['nsp.vehicle.logs']
+        Price = self.env['nsp.vehicle.price']
+
+        result = []
+        for vehicle in vehicles:
+            entry_time = vehicle['last_event_time'] if vehicle['current_status'] == 'inside' else None
+            dwell = (now - entry_time).total_seconds() / 3600.0 if entry_time else 0.0
+            result.append({
+                'vehicle_id': vehicle['id'],
+                'plate_number': vehicle['plate_number'],
+                'vehicle_type': vehicle['vehicle_type'],
+                'status': vehicle['current_status'],
+                'last_direction': vehicle['last_direction'],
+                'lot_id': vehicle['current_lot_id'] or None,
+                'last_event_time': vehicle['last_event_time'] and vehicle['last_event_time'].isoformat(),
+                'entry_time': entry_time and entry_time.isoformat(),
+                'current_parking_time': round(dwell, 4),
+                'current_parking_time_display': Logs._format_parking_time(dwell),
+                'fee_so_far': Price._quote(price_map, vehicle['vehicle_type'], entry_time, now) if entry_time else 0,
+            })
+
+        # Thời gian đỗ và phí được client tính tiếp từ entry_time, ETag chỉ đổi khi trạng thái hoặc bảng giá đổi
+        last_modified = max([vehicle['write_date'] for vehicle in vehicles] + [price_date], key=lambda d: d or now.min)
+        state = repr([(vehicle['id'], vehicle['write_date']) for vehicle in vehicles] + [price_date])
+        return {
+            'vehicles': result,
+            'last_modified': last_modified,
+            'etag': hashlib.sha1(state.encode('utf-8')).hexdigest(),
+        }
+
     @api.model
     def assign_tag_to_vehicle(self, vehicle_id, tag_id):
         """API method để gán tag trực tiếp cho vehicle"""
@@ -136,31 +224,9 @@ class Vehicle(models.Model):
 
     # Thu hồi thẻ
     def action_revoke_tag(self):
-        """Thu hồi thẻ"""
-        for vehicle in self:
-            tag = vehicle.vehicle_tag_id
-            if tag:
-                tag.write({
-                    'partner_id': False,
-                    'vehicle_id': False,
-                    'status': 'inactive',
-                })
-                vehicle.vehicle_tag_id = False
-                
-        return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _('Thu hồi thẻ thành công'),
-                'message': _('Thẻ đã được thu hồi thành công'),
-                'type': 'success',
-                'sticky': False,
-                'next': {
-                    'type': 'ir.actions.client',
-                    'tag': 'reload',
-                }
-            }
-        }
+        """Thu hồi thẻ của các bản ghi được chọn bằng các câu lệnh gộp"""
+        self.vehicle_tag_id._revoke()
+        return self.env['nsp.tag']._notify_revoked()
 
     # def action_check_in(self):
     #     """Thực hiện check in thủ công"""
@@ -2,18 +2,107 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
+from odoo.exceptions import ValidationError, UserError
+from odoo.tools.sql import create_index, column_exists, create_column, table_exists
+from .plate import normalize_plate, ensure_trigram, drop_btree_index, PLATE_KEY_SQL
 from datetime import datetime, timedelta
+import csv
+import io
+import uuid
 import logging
 
 _logger = logging.getLogger(__name__)
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Số dòng đọc mỗi lần từ server-side cursor khi export
+EXPORT_CHUNK_SIZE = 5000
+
+# Các cột export - (tên cột, kiểu pyarrow)
+EXPORT_COLUMNS = [
+    ('source', 'string'),
+    ('id', 'int64'),
+    ('time', 'timestamp'),
+    ('direction', 'string'),
+    ('plate_number', 'string'),
+    ('partner_name', 'string'),
+    ('vehicle_name', 'string'),
+    ('tag_code', 'string'),
+    ('gate_name', 'string'),
+    ('reader_device', 'string'),
+    ('parking_time', 'float64'),
+    ('is_anomaly', 'bool'),
+    ('notes', 'string'),
+]
+
+# Các bảng được export (log, sự kiện gọn và log đã lưu trữ) - FROM, biểu thức SQL theo thứ tự EXPORT_COLUMNS, cột dùng để lọc và điều kiện riêng.
+# Sự kiện gọn (nsp.log_mode = 'lean') đã có log bất thường (log_id) được export từ bảng log.
+EXPORT_SOURCES = [
+    {
+        'from': "nsp_vehicle_logs l",
+        'columns': ["'log'", 'l.id', 'l.create_date', 'l.direction', 'l.plate_number', 'l.partner_name',
+                    'l.vehicle_name', 'l.tag_code', 'l.gate_name', 'l.reader_device', 'l.parking_time',
+                    'l.is_anomaly', 'l.notes'],
+        'filters': {'time': 'l.create_date', 'gate_name': 'l.gate_name', 'plate_key': 'l.plate_key'},
+    },
+    {
+        'from': """nsp_gate_event l
+                   JOIN nsp_vehicle v ON v.id = l.vehicle_id
+                   JOIN res_partner p ON p.id = l.partner_id
+                   JOIN nsp_tag t ON t.id = l.tag_id
+                   LEFT JOIN nsp_gate g ON g.id = l.gate_id""",
+        'columns': ["'event'", 'l.id', 'l.event_time', 'l.direction', 'v.plate_number', 'p.name',
+                    'v.name', 't.tag_id', 'g.name', 'NULL', 'l.parking_time', 'l.is_anomaly', 'l.notes'],
+        'filters': {'time': 'l.event_time', 'gate_name': 'g.name', 'plate_key': 'v.plate_key'},
+        'where': "l.log_id IS NULL",
+    },
+    {
+        'from': """nsp_vehicle_logs_archive l
+                   LEFT JOIN nsp_vehicle v ON v.id = l.vehicle_id
+                   LEFT JOIN res_partner p ON p.id = l.partner_id
+                   LEFT JOIN nsp_tag t ON t.id = l.tag_id""",
+        'columns': ["'archive'", 'l.id', 'l.log_date', 'l.direction', 'l.plate_number', 'p.name',
+                    'v.name', 't.tag_id', 'l.gate_name', 'l.reader_device', 'l.parking_time',
+                    'l.is_anomaly', 'l.notes'],
+        'filters': {'time': 'l.log_date', 'gate_name': 'l.gate_name', 'plate_key': 'l.plate_key'},
+    },
+]
+
+class _ChunkSink(io.RawIOBase):
+    """File-like chỉ ghi, gom các bytes đã ghi để trả về theo từng chunk"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
 class VehicleLog(models.Model):
     _name = "nsp.vehicle.logs"
     _description = "Lịch sử ra vào phương tiện"
     _order = "create_date desc"
     _rec_name = "display_name"
-    _inherit = ["mail.thread", "mail.activity.mixin"]
+    _inherit = ["mail.thread", "mail.activity.mixin", "nsp.plate.search.mixin"]
 
     # Relations - Core fields
     vehicle_id = fields.Many2one('nsp.vehicle', string="Phương tiện", required=True, ondelete='cascade')
@@ -25,6 +114,7 @@ class VehicleLog(models.Model):
     partner_name = fields.Char(string="Tên người dùng", related='partner_id.name', store=True)
     vehicle_name = fields.Char(string="Tên phương tiện", related='vehicle_id.name', store=True)
     plate_number = fields.Char(string="Biển số xe", related='vehicle_id.plate_number', store=True)
+    plate_key = fields.Char(string="Biển số chuẩn hóa", related='vehicle_id.plate_key', store=True, index='trigram')
     tag_code = fields.Char(string="mã thẻ", related='tag_id.tag_id', store=True)
 
     direction = fields.Selection([
@@ -34,11 +124,15 @@ class VehicleLog(models.Model):
 
     photo_url = fields.Char(string="Đường dẫn ảnh", help='URL hoặc đường dẫn đến ảnh')
     photo_binary = fields.Binary(string="Ảnh", attachment=True)
+    photo_id = fields.Many2one('nsp.photo', string="Ảnh chụp", ondelete='set null', help="Ảnh upload từ camera làn")
+    photo_thumbnail = fields.Image(string="Thumbnail", related='photo_id.thumbnail')
     # TODO thêm attachment
     photo_filename = fields.Char(string="Tên file ảnh")
 
     # additional into fields
     gate_name = fields.Char(string="Tên cổng", help="Tên cổng ra/vào")
+    lot_id = fields.Many2one('nsp.lot', string="Bãi đỗ xe", index=True, readonly=True)
+    gate_id = fields.Many2one('nsp.gate', string="Cổng", readonly=True)
     reader_device = fields.Char(string="Thiết bị đọc", help="Thiết bị đọc RFID")
     notes = fields.Text(string="Ghi chú")
     
@@ -147,6 +241,9 @@ class VehicleLog(models.Model):
     @api.constrains('vehicle_id', 'tag_id')
     def _check_vehicle_tag_consistency(self):
         """Kiểm tra tính nhất quán giữa xe và thẻ"""
+        # Log được tạo từ sự kiện bất thường ở chế độ lean đã được đánh dấu sẵn
+        if self.env.context.get('nsp_skip_consistency_check'):
+            return
         for record in self:
             if not record.id:  # Skip nếu record chưa được tạo
                 continue
@@ -178,11 +275,11 @@ class VehicleLog(models.Model):
                 
                 # Tạo notification (optional) - chỉ tạo nếu không có lỗi
                 try:
-                    self._create_anomaly_notification(record, last_log)
+                    self._create_anomaly_notification(record, last_log.create_date)
                 except Exception as e:
                     _logger.error(f"Lỗi khi tạo notification: {e}")
 
-    def _create_anomaly_notification(self, current_log, last_log):
+    def _create_anomaly_notification(self, current_log, last_time):
         """Tạo thông báo khi phát hiện bất thường"""
         try:
             # Tìm model_id cho nsp.vehicle.logs
@@ -196,7 +293,7 @@ class VehicleLog(models.Model):
                 "activity_type_id": self.env.ref('mail.mail_activity_data_warning').id,
                 'note': f"Phát hiện bất thường trong lịch sử ra vào xe {current_log.vehicle_id.plate_number}: \n"
                         f"- Hướng: {current_log.direction} \n"
-                        f"- Thời gian trước: {last_log.create_date} \n"
+                        f"- Thời gian trước: {last_time} \n"
                         f"Vui lòng kiểm tra lại dữ liệu.",
                 'res_model_id': model.id,
                 'res_id': current_log.id,
@@ -205,20 +302,27 @@ class VehicleLog(models.Model):
         except Exception as e:
             _logger.error(f"Fail to create anomaly notification: {e}")
     
+    def _prepare_websocket_message(self):
+        """Dữ liệu gửi qua WebSocket cho log"""
+        self.ensure_one()
+        return {
+            'type': 'parking_log_update',
+            'log_id': self.id,
+            'vehicle_plate': self.vehicle_id.plate_number,
+            'partner_name': self.partner_id.name,
+            'direction': self.direction,
+            'time': self.create_date.strftime('%d/%m/%Y %H:%M:%S'),
+            'is_anomaly': self.is_anomaly,
+            'parking_time_display': self.parking_time_display,
+            'photo_url': self.photo_url,
+            'lot_id': self.lot_id.id or None,
+            'gate_name': self.gate_name,
+        }
+
     def _send_websocket_notification(self, log, vehicle, partner):
         """Gửi thông báo qua WebSocket"""
         try:
-            message_data = {
-                'type': 'parking_log_update',
-                'log_id': log.id,
-                'vehicle_plate': vehicle.plate_number,
-                'partner_name': partner.name,
-                'direction': log.direction,
-                'time': log.create_date.strftime('%d/%m/%Y %H:%M:%S'),
-                'is_anomaly': log.is_anomaly,
-                'parking_time_display': log.parking_time_display,
-                'photo_url': log.photo_url,
-            }
+            message_data = log._prepare_websocket_message()
             
             # Gửi notification đến channel 'nsp_system' như JavaScript đang subscribe
             self.env['bus.bus']._sendone(
@@ -226,6 +330,9 @@ class VehicleLog(models.Model):
                 'parking_log_update',  # notification type
                 message_data
             )
+            # Màn hình của từng bãi chỉ cần nghe kênh riêng của bãi
+            if log.lot_id:
+                self.env['bus.bus']._sendone(log.lot_id._bus_channel(), 'parking_log_update', message_data)
                     
             _logger.info(f"WebSocket notification sent for vehicle {vehicle.plate_number}")
 
@@ -233,20 +340,22 @@ class VehicleLog(models.Model):
             _logger.error(f"Fail to send websocket notification: {e}")
 
     @api.model
-    def create_log_entry(self, direction, tag_id, photo_url=None, notes=None):
+    def create_log_entry(self, direction, tag_id, photo_url=None, notes=None, photo_token=None, gate=None):
         """
         Tạo log entry từ tag_id
         Args:
-            tag_id (str): ID của thẻ RFID
+            tag_id (str): TID hoặc EPC của thẻ RFID
             direction (str): 'in' hoặc 'out'
             photo_url (str): URL hình ảnh (optional)
             notes (str): Ghi chú (optional)
+            photo_token (str): Token ảnh trả về từ /api/v1/photo/upload (optional)
+            gate (nsp.gate): Cổng ghi nhận (optional)
         Returns:
             dict: Kết quả tạo log
         """
         try:
-            # Tìm thẻ
-            tag = self.env['nsp.tag'].search([('tag_id', '=', tag_id)], limit=1)
+            # Tìm thẻ theo TID hoặc EPC
+            tag = self.env['nsp.tag']._resolve_tag(tag_id)
 
             if not tag:
                 return {
@@ -255,6 +364,15 @@ class VehicleLog(models.Model):
                     'error_code': 'TAG_NOT_FOUND'
                 }
 
+            # Kiểm tra thời hạn hiệu lực của thẻ
+            validity_error = tag._get_validity_error()
+            if validity_error:
+                return {
+                    'success': False,
+                    'message': _(f"Thẻ {tag_id} đã hết hạn") if validity_error == 'TAG_EXPIRED' else _(f"Thẻ {tag_id} chưa đến thời hạn sử dụng"),
+                    'error_code': validity_error
+                }
+
             # Kiểm tra thẻ có active không
             if tag.status != 'active':
                 return {
@@ -304,26 +422,45 @@ class VehicleLog(models.Model):
                     'error_code': 'INVALID_TAG_ASSIGNMENT'
                 }
 
-            # Tạo log entry
-            log_data = {
-                'vehicle_id': vehicle.id,
-                'partner_id': partner.id,
-                'tag_id': tag.id,
-                'direction': direction,
-                'photo_url': photo_url,
-                'notes': notes,
-            }
+            photo = self.env['nsp.photo']._get_by_token(photo_token)
+
+            # Giữ chỗ, tạo log và cập nhật xe trong cùng một savepoint:
+            # lỗi ở bất kỳ bước nào đều trả lại chỗ đã giữ để bộ đếm không bị lệch
+            with self.env.cr.savepoint():
+                # Cập nhật bộ đếm chỗ trong bãi, từ chối ngay nếu bãi đã đầy
+                if not self._update_occupancy(vehicle, direction, gate):
+                    return {
+                        'success': False,
+                        'message': _(f"Bãi {gate.lot_id.name} đã hết chỗ cho {vehicle.plate_number}"),
+                        'error_code': 'LOT_FULL'
+                    }
+
+                # Chế độ lean: ghi sự kiện vào bảng gọn, chỉ tạo log đầy đủ khi bất thường
+                if self._get_log_mode() == 'lean':
+                    return self._create_lean_entry(vehicle, partner, tag, direction, photo_url, notes, photo, gate)
+
+                # Tạo log entry
+                log_data = {
+                    'vehicle_id': vehicle.id,
+                    'partner_id': partner.id,
+                    'tag_id': tag.id,
+                    'direction': direction,
+                    'photo_url': photo_url,
+                    'photo_id': photo.id,
+                    'notes': notes,
+                }
+                if gate:
+                    log_data.update({
+                        'gate_id': gate.id,
+                        'lot_id': gate.lot_id.id,
+                        'gate_name': gate.name,
+                    })
 
-            # Tạo log
-            log = self.create(log_data)
+                # Tạo log
+                log = self.create(log_data)
 
-            # Cập nhật trạng thái xe
-            try:
-                vehicle.write({
-                    'last_direction': direction,
-                })
-            except Exception as e:
-                _logger.error(f"Lỗi khi cập nhật trạng thái xe: {e}")
+                # Cập nhật trạng thái xe
+                vehicle.write(self._prepare_vehicle_state(direction, gate))
 
             # Send notification through WebSocket
             self._send_websocket_notification(log, vehicle, partner)
@@ -351,6 +488,68 @@ class VehicleLog(models.Model):
             }
 
     @api.model
+    def _get_log_mode(self):
+        """Chế độ ghi log: 'full' (mặc định) hoặc 'lean'"""
+        return self.env['ir.config_parameter'].sudo().get_param('nsp.log_mode', 'full')
+
+    @api.model
+    def _prepare_vehicle_state(self, direction, gate=None):
+        """Trạng thái của xe sau khi qua cổng, bãi hiện tại chỉ được gán khi biết cổng"""
+        vals = {'last_direction': direction, 'last_event_time': fields.Datetime.now()}
+        if direction == 'out':
+            vals['current_lot_id'] = False
+        elif gate:
+            vals['current_lot_id'] = gate.lot_id.id
+        return vals
+
+    @api.model
+    def _update_occupancy(self, vehicle, direction, gate=None):
+        """
+        Tăng/giảm bộ đếm chỗ của bãi trong cùng transaction với log
+        Xe vào lại bãi đang ở (bất thường) không bị đếm hai lần.
+        Returns:
+            bool: False nếu bãi đã đầy
+        """
+        current_lot = vehicle.current_lot_id
+        if direction == 'in':
+            if not gate or gate.lot_id == current_lot:
+                return True
+            if not gate.lot_id._reserve_slot(vehicle.vehicle_type):
+                return False
+            if current_lot:
+                current_lot._release_slot(vehicle.vehicle_type)
+        elif current_lot:
+            current_lot._release_slot(vehicle.vehicle_type)
+        return True
+
+    @api.model
+    def _create_lean_entry(self, vehicle, partner, tag, direction, photo_url=None, notes=None, photo=None, gate=None):
+        """Ghi nhận ra vào ở chế độ lean qua nsp.gate.event"""
+        event = self.env['nsp.gate.event'].record_event(vehicle, partner, tag, direction, photo_url, notes, photo, gate)
+
+        # Cập nhật trạng thái xe, lỗi được ném lên để create_log_entry trả lại chỗ đã giữ
+        vehicle.write(self._prepare_vehicle_state(direction, gate))
+
+        self._send_websocket_notification(event, vehicle, partner)
+
+        return {
+            'success': True,
+            'message': f'Ghi nhận thành công: {vehicle.plate_number} - {direction}',
+            'data': {
+                'log_id': event.log_id.id or None,
+                'event_id': event.id,
+                'vehicle': vehicle.plate_number,
+                'partner': partner.name,
+                'direction': direction,
+                'time': event.event_time.strftime('%d/%m/%Y %H:%M:%S'),
+                'is_anomaly': event.is_anomaly,
+                'parking_time': event.parking_time,
+                'parking_time_display': event.parking_time_display,
+            }
+        }
+
+    @api.model
+    @api.readonly
     def get_vehicle_status(self, vehicle_id):
         """
         Lấy trạng thái hiện tại của xe (in/out)
@@ -360,42 +559,27 @@ class VehicleLog(models.Model):
             dict: Trạng thái xe
         """
         try:
-            vehicle = self.env['nsp.vehicle'].browse(vehicle_id)
-            if not vehicle.exists():
+            status = self.env['nsp.vehicle'].get_status([('id', '=', vehicle_id)])['vehicles']
+            if not status:
                 return {
                     'success': False,
                     'message': f"Không tìm thấy xe",
                     'error_code': "VEHICLE_NOT_FOUND"
                 }
-                
-            # Lấy log cuối cùng
-            last_log = self.search([('vehicle_id', '=', vehicle.id)], limit=1, order='create_date desc')
-
-            if not last_log:
-                status = 'unknown'
-                last_time = None
-                current_parking_time = 0
-            else:
-                status = 'in' if last_log.direction == 'in' else 'out'
-                last_time = last_log.create_date.strftime('%d/%m/%Y %H:%M:%S')
-
-                # Tính thời gian đỗ hiện tại nếu xe đang trong bãi
-                if status == "in":
-                    time_diff = datetime.now() - last_log.create_date
-                    current_parking_time = time_diff.total_seconds() / 3600.0
-                else:
-                    current_parking_time = 0.0
 
+            vehicle = status[0]
+            last_time = vehicle['last_event_time'] and datetime.fromisoformat(vehicle['last_event_time'])
             return {
                 'success': True,
                 'data': {
                     'vehicle_id': vehicle_id,
-                    'plate_number': vehicle.plate_number,
-                    'status': status,
-                    'last_time': last_time,
-                    'last_direction': last_log.direction if last_log else None,
-                    'current_parking_time': current_parking_time,
-                    'current_parking_time_display': self._format_parking_time(current_parking_time)
+                    'plate_number': vehicle['plate_number'],
+                    'status': vehicle['last_direction'] if last_time else 'unknown',
+                    'last_time': last_time and last_time.strftime('%d/%m/%Y %H:%M:%S'),
+                    'last_direction': vehicle['last_direction'] if last_time else None,
+                    'current_parking_time': vehicle['current_parking_time'],
+                    'current_parking_time_display': vehicle['current_parking_time_display'],
+                    'fee_so_far': vehicle['fee_so_far'],
                 }
             }
         except Exception as e:
@@ -468,6 +652,164 @@ class VehicleLog(models.Model):
                 'flags': {'mode': 'readonly'},
             }
 
+    def _auto_init(self):
+        # Tạo và điền plate_key bằng SQL, tránh để ORM tính lại trường related trên toàn bộ bảng log
+        if table_exists(self._cr, self._table) and not column_exists(self._cr, self._table, 'plate_key'):
+            create_column(self._cr, self._table, 'plate_key', 'varchar')
+            self._cr.execute(f"""
+                UPDATE {self._table}
+                   SET plate_key = {PLATE_KEY_SQL.format('plate_number')}
+                 WHERE plate_number IS NOT NULL
+            """)
+        # Index trigram của plate_key cần pg_trgm
+        ensure_trigram(self._cr, self.env.registry)
+        drop_btree_index(self._cr, self._table, 'plate_key')
+        return super()._auto_init()
+
+    def init(self):
+        # Export và báo cáo lọc theo khoảng thời gian
+        create_index(self._cr, 'nsp_vehicle_logs_create_date_idx', self._table, ['create_date'])
+        # Báo cáo và màn hình theo từng bãi
+        create_index(self._cr, 'nsp_vehicle_logs_lot_create_date_idx', self._table, ['lot_id', 'create_date'])
+        # Cron lưu trữ kiểm tra log vào bãi còn được log ra tham chiếu
+        create_index(self._cr, 'nsp_vehicle_logs_entry_log_id_idx', self._table, ['entry_log_id'],
+                     where='entry_log_id IS NOT NULL')
+
+    # ============ EXPORT ============
+
+    @api.model
+    def _get_export_query(self, date_from=None, date_to=None, gate_name=None, vehicle_id=None, plate_number=None):
+        """
+        Tạo câu SQL export theo bộ lọc, gộp log đầy đủ, sự kiện gọn (nsp.log_mode = 'lean') và log đã lưu trữ
+        Args:
+            date_from (str): Từ ngày (YYYY-MM-DD)
+            date_to (str): Đến ngày (YYYY-MM-DD), bao gồm cả ngày này
+            gate_name (str): Tên cổng
+            vehicle_id (int): ID của xe
+            plate_number (str): Biển số xe
+        Returns:
+            tuple: (câu SQL, tham số)
+        """
+        filters = {
+            'date_from': date_from and fields.Date.to_date(date_from),
+            'date_to': date_to and fields.Date.to_date(date_to) + timedelta(days=1),
+            'gate_name': gate_name,
+            'vehicle_id': vehicle_id and int(vehicle_id),
+            'plate_key': plate_number and normalize_plate(plate_number),
+        }
+        selects = []
+        for source in EXPORT_SOURCES:
+            filter_columns = source['filters']
+            where = [source['where']] if source.get('where') else []
+            if date_from:
+                where.append(f"{filter_columns['time']} >= %(date_from)s")
+            if date_to:
+                where.append(f"{filter_columns['time']} < %(date_to)s")
+            if gate_name:
+                where.append(f"{filter_columns['gate_name']} = %(gate_name)s")
+            if vehicle_id:
+                where.append("l.vehicle_id = %(vehicle_id)s")
+            if plate_number:
+                where.append(f"{filter_columns['plate_key']} = %(plate_key)s")
+            select = f"SELECT {', '.join(source['columns'])} FROM {source['from']}"
+            if where:
+                select += " WHERE " + " AND ".join(where)
+            selects.append(select)
+
+        query = " UNION ALL ".join(f"({select})" for select in selects) + " ORDER BY 3, 1, 2"
+        return query, filters
+
+    @api.model
+    def _iter_export_chunks(self, cr, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+        """
+        Đọc log bằng server-side cursor, trả về từng chunk để bộ nhớ không phụ thuộc số dòng
+        Args:
+            cr: Cursor của Odoo dùng để mở named cursor
+            chunk_size (int): Số dòng mỗi chunk
+        """
+        query, params = self._get_export_query(**filters)
+        with cr._cnx.cursor(name=f"nsp_export_{uuid.uuid4().hex}") as server_cursor:
+            server_cursor.itersize = chunk_size
+            server_cursor.execute(query, params)
+            while True:
+                rows = server_cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    @api.model
+    def _export_csv_stream(self, chunks):
+        """Ghi CSV tăng dần, mỗi chunk dòng trả về một khối bytes"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # BOM để Excel đọc đúng tiếng Việt
+        buffer.write('\ufeff')
+        writer.writerow([column[0] for column in EXPORT_COLUMNS])
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    @api.model
+    def _export_parquet_stream(self, chunks):
+        """Ghi Parquet, mỗi chunk dòng là một row group"""
+        types = {
+            'int64': pa.int64(),
+            'timestamp': pa.timestamp('us'),
+            'string': pa.string(),
+            'float64': pa.float64(),
+            'bool': pa.bool_(),
+        }
+        schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+        sink = _ChunkSink()
+        with pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='zstd') as writer:
+            for rows in chunks:
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+                yield sink.drain()
+        yield sink.drain()
+
+    @api.model
+    def _check_export_format(self, file_format):
+        """Kiểm tra định dạng export có dùng được không"""
+        if file_format not in ('csv', 'parquet'):
+            raise UserError(_("Định dạng export không hỗ trợ: %s") % file_format)
+        if file_format == 'parquet' and pa is None:
+            raise UserError(_("Cần cài đặt thư viện pyarrow để export Parquet"))
+
+    @api.model
+    def _export_stream(self, cr, file_format='csv', **filters):
+        """Trả về generator bytes của file export theo định dạng"""
+        self._check_export_format(file_format)
+        chunks = self._iter_export_chunks(cr, **filters)
+        if file_format == 'parquet':
+            return self._export_parquet_stream(chunks)
+        return self._export_csv_stream(chunks)
+
+    @api.model
+    def export_logs_to_file(self, path, file_format='csv', **filters):
+        """
+        Export log ra file trên đĩa, ghi tăng dần theo từng chunk
+        Args:
+            path (str): Đường dẫn file đích
+            file_format (str): 'csv' hoặc 'parquet'
+        Returns:
+            int: Số bytes đã ghi
+        """
+        written = 0
+        with open(path, 'wb') as output:
+            for data in self._export_stream(self.env.cr, file_format, **filters):
+                output.write(data)
+                written += len(data)
+        _logger.info(f"Exported vehicle logs to {path} ({written} bytes)")
+        return written
+
     # Todo
     """
     Lấy thống kê ra vào bãi xe
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api, _
+from odoo.tools.sql import create_index, column_exists
+from .plate import PLATE_KEY_SQL, ensure_trigram
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Số ngày giữ log trong bảng chính nếu chưa cấu hình nsp.log_retention_days
+DEFAULT_RETENTION_DAYS = 180
+ARCHIVE_BATCH_SIZE = 10000
+
+class VehicleLogArchive(models.Model):
+    """
+    Lịch sử ra vào đã lưu trữ.
+    Bảng được phân vùng theo tháng (PostgreSQL declarative partitioning) và không có
+    chatter, follower hay các trường related lưu sẵn như bảng nsp.vehicle.logs.
+    ID được giữ nguyên theo log gốc; sự kiện gọn (nsp.gate.event) nhận ID mới từ sequence
+    của nsp.vehicle.logs và giữ ID gốc ở gate_event_id.
+    """
+    _name = "nsp.vehicle.logs.archive"
+    _description = "Lịch sử ra vào đã lưu trữ"
+    _order = "log_date desc"
+    _rec_name = "plate_number"
+    _inherit = ["nsp.plate.search.mixin"]
+    _auto = False
+
+    log_date = fields.Datetime(string="Thời gian", readonly=True)
+    vehicle_id = fields.Many2one('nsp.vehicle', string="Phương tiện", readonly=True)
+    partner_id = fields.Many2one('res.partner', string="Người dùng", readonly=True)
+    tag_id = fields.Many2one('nsp.tag', string="Thẻ RFID", readonly=True)
+    plate_number = fields.Char(string="Biển số xe", readonly=True)
+    plate_key = fields.Char(string="Biển số chuẩn hóa", readonly=True)
+    direction = fields.Selection([
+        ('in', 'Vào'),
+        ('out', 'Ra')
+    ], string="Hướng", readonly=True)
+    gate_name = fields.Char(string="Tên cổng", readonly=True)
+    lot_id = fields.Many2one('nsp.lot', string="Bãi đỗ xe", readonly=True)
+    gate_id = fields.Many2one('nsp.gate', string="Cổng", readonly=True)
+    reader_device = fields.Char(string="Thiết bị đọc", readonly=True)
+    parking_time = fields.Float(string="Thời gian đỗ (giờ)", digits=(16, 2), readonly=True)
+    entry_log_id = fields.Integer(string="ID log vào bãi", readonly=True)
+    gate_event_id = fields.Integer(string="ID sự kiện cổng", readonly=True)
+    is_anomaly = fields.Boolean(string="Bất thường", readonly=True)
+    anomaly_reason = fields.Text(string="Lý do bất thường", readonly=True)
+    photo_url = fields.Char(string="Đường dẫn ảnh", readonly=True)
+    notes = fields.Text(string="Ghi chú", readonly=True)
+
+    def init(self):
+        self._cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self._table} (
+                id integer NOT NULL,
+                log_date timestamp without time zone NOT NULL,
+                vehicle_id integer,
+                partner_id integer,
+                tag_id integer,
+                plate_number varchar,
+                direction varchar,
+                gate_name varchar,
+                reader_device varchar,
+                parking_time numeric,
+                entry_log_id integer,
+                is_anomaly boolean,
+                anomaly_reason text,
+                photo_url varchar,
+                notes text,
+                PRIMARY KEY (id, log_date)
+            ) PARTITION BY RANGE (log_date)
+        """)
+        # Cột thêm sau khi bảng đã được tạo
+        self._cr.execute(f"""
+            ALTER TABLE {self._table}
+                ADD COLUMN IF NOT EXISTS lot_id integer,
+                ADD COLUMN IF NOT EXISTS gate_id integer,
+                ADD COLUMN IF NOT EXISTS gate_event_id integer
+        """)
+        if not column_exists(self._cr, self._table, 'plate_key'):
+            self._cr.execute(f"ALTER TABLE {self._table} ADD COLUMN plate_key varchar")
+            self._cr.execute(f"""
+                UPDATE {self._table}
+                   SET plate_key = {PLATE_KEY_SQL.format('plate_number')}
+                 WHERE plate_number IS NOT NULL
+            """)
+        # Index trên bảng cha được tạo tự động cho từng partition
+        create_index(self._cr, f'{self._table}_plate_number_idx', self._table, ['plate_number', 'log_date'])
+        create_index(self._cr, f'{self._table}_vehicle_id_idx', self._table, ['vehicle_id', 'log_date'])
+        ensure_trigram(self._cr, self.env.registry)
+        create_index(self._cr, f'{self._table}_plate_key_idx', self._table, ['plate_key gin_trgm_ops'], method='gin')
+
+    def _ensure_partitions(self, months):
+        """
+        Tạo partition theo tháng nếu chưa có
+        Args:
+            months (list): Danh sách datetime là ngày đầu tháng
+        """
+        for month in months:
+            start = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            end = (start + timedelta(days=32)).replace(day=1)
+            partition = f"{self._table}_y{start.year}m{start.month:02d}"
+            self._cr.execute(f"""
+                CREATE TABLE IF NOT EXISTS {partition}
+                PARTITION OF {self._table}
+                FOR VALUES FROM (%s) TO (%s)
+            """, (start, end))
+
+    @api.model
+    def _get_retention_days(self):
+        """Số ngày giữ log trong bảng chính"""
+        value = self.env['ir.config_parameter'].sudo().get_param('nsp.log_retention_days')
+        try:
+            return int(value) if value else DEFAULT_RETENTION_DAYS
+        except ValueError:
+            _logger.warning(f"Invalid nsp.log_retention_days value: {value}")
+            return DEFAULT_RETENTION_DAYS
+
+    @api.model
+    def _archive_batch(self, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+        """
+        Chuyển một batch log cũ hơn cutoff sang bảng lưu trữ
+        Log đã có hóa đơn được giữ lại ở bảng chính vì nsp.bill tham chiếu đến chúng.
+        Log vào bãi được giữ lại khi log ra tương ứng (entry_log_id) còn ở bảng chính,
+        hoặc khi chưa có log ra và xe vẫn đang trong bãi, để log ra giữ được liên kết và thời gian đỗ.
+        Returns:
+            int: Số log đã chuyển
+        """
+        # Trạng thái xe và log được đọc bằng SQL
+        self.env.flush_all()
+        cr = self._cr
+        cr.execute("""
+            SELECT l.id, date_trunc('month', l.create_date)
+              FROM nsp_vehicle_logs l
+             WHERE l.create_date < %(cutoff)s
+               AND NOT EXISTS (SELECT 1 FROM nsp_bill b WHERE b.vehicle_logs_id = l.id)
+               AND NOT EXISTS (SELECT 1 FROM nsp_vehicle_logs o WHERE o.entry_log_id = l.id)
+               AND NOT (l.direction = 'in' AND EXISTS (
+                        SELECT 1 FROM nsp_vehicle v
+                         WHERE v.id = l.vehicle_id
+                           AND (v.current_lot_id IS NOT NULL OR v.last_direction = 'in')))
+             ORDER BY l.create_date
+             LIMIT %(batch_size)s
+        """, {'cutoff': cutoff, 'batch_size': batch_size})
+        rows = cr.fetchall()
+        if not rows:
+            return 0
+
+        log_ids = [row[0] for row in rows]
+        self._ensure_partitions({row[1] for row in rows})
+
+        # Bỏ dữ liệu chatter và ảnh đính kèm của các log này
+        cr.execute("""
+            SELECT id FROM ir_attachment
+             WHERE res_model = 'nsp.vehicle.logs' AND res_id = ANY(%s)
+        """, (log_ids,))
+        attachment_ids = [row[0] for row in cr.fetchall()]
+        if attachment_ids:
+            self.env['ir.attachment'].sudo().browse(attachment_ids).unlink()
+        cr.execute("DELETE FROM mail_activity WHERE res_model = 'nsp.vehicle.logs' AND res_id = ANY(%s)", (log_ids,))
+        cr.execute("DELETE FROM mail_followers WHERE res_model = 'nsp.vehicle.logs' AND res_id = ANY(%s)", (log_ids,))
+        cr.execute("DELETE FROM mail_message WHERE model = 'nsp.vehicle.logs' AND res_id = ANY(%s)", (log_ids,))
+
+        cr.execute(f"""
+            WITH moved AS (
+                DELETE FROM nsp_vehicle_logs
+                 WHERE id = ANY(%s)
+             RETURNING id, create_date, vehicle_id, partner_id, tag_id, plate_number, direction,
+                       gate_name, reader_device, parking_time, entry_log_id, is_anomaly,
+                       anomaly_reason, photo_url, notes, lot_id, gate_id, plate_key
+            )
+            INSERT INTO {self._table} (id, log_date, vehicle_id, partner_id, tag_id, plate_number, direction,
+                                       gate_name, reader_device, parking_time, entry_log_id, is_anomaly,
+                                       anomaly_reason, photo_url, notes, lot_id, gate_id, plate_key)
+            SELECT * FROM moved
+        """, (log_ids,))
+        return len(log_ids)
+
+    @api.model
+    def _archive_event_batch(self, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+        """
+        Chuyển một batch sự kiện gọn (nsp.gate.event) cũ hơn cutoff sang bảng lưu trữ
+        Sự kiện cuối cùng của mỗi xe được giữ lại vì record_event dựa vào nó để tính thời gian đỗ.
+        Sự kiện bất thường đã có log đầy đủ (log_id) chỉ bị xóa, log đó được lưu trữ riêng.
+        Returns:
+            int: Số sự kiện đã chuyển hoặc xóa
+        """
+        cr = self._cr
+        cr.execute("""
+            SELECT e.id, date_trunc('month', e.event_time)
+              FROM nsp_gate_event e
+             WHERE e.event_time < %s
+               AND EXISTS (SELECT 1 FROM nsp_gate_event n
+                            WHERE n.vehicle_id = e.vehicle_id
+                              AND (n.event_time, n.id) > (e.event_time, e.id))
+             ORDER BY e.event_time
+             LIMIT %s
+        """, (cutoff, batch_size))
+        rows = cr.fetchall()
+        if not rows:
+            return 0
+
+        self._ensure_partitions({row[1] for row in rows})
+        cr.execute(f"""
+            WITH moved AS (
+                DELETE FROM nsp_gate_event
+                 WHERE id = ANY(%s)
+             RETURNING *
+            )
+            INSERT INTO {self._table} (id, gate_event_id, log_date, vehicle_id, partner_id, tag_id, plate_number,
+                                       plate_key, direction, gate_name, parking_time, is_anomaly, photo_url,
+                                       notes, lot_id, gate_id)
+            SELECT nextval('nsp_vehicle_logs_id_seq'), m.id, m.event_time, m.vehicle_id, m.partner_id, m.tag_id,
+                   v.plate_number, v.plate_key, m.direction, g.name, m.parking_time, m.is_anomaly, m.photo_url,
+                   m.notes, m.lot_id, m.gate_id
+              FROM moved m
+              LEFT JOIN nsp_vehicle v ON v.id = m.vehicle_id
+              LEFT JOIN nsp_gate g ON g.id = m.gate_id
+             WHERE m.log_id IS NULL
+        """, ([row[0] for row in rows],))
+        return len(rows)
+
+    @api.model
+    def _cron_archive_logs(self, max_batches=50):
+        """Cron job chuyển log và sự kiện gọn cũ sang bảng lưu trữ"""
+        cutoff = fields.Datetime.now() - timedelta(days=self._get_retention_days())
+        totals = {}
+        for archive_batch in (self._archive_batch, self._archive_event_batch):
+            total = 0
+            for _batch in range(max_batches):
+                moved = archive_batch(cutoff)
+                if not moved:
+                    break
+                total += moved
+                # Commit từng batch để cron có thể dừng giữa chừng mà không mất tiến độ
+                self.env.cr.commit()
+            totals[archive_batch.__name__] = total
+
+        self.env['nsp.vehicle.logs'].invalidate_model()
+        self.env['nsp.gate.event'].invalidate_model()
+        self.invalidate_model()
+        _logger.info(f"Archived {totals['_archive_batch']} vehicle logs and "
+                     f"{totals['_archive_event_batch']} gate events older than {cutoff}")
+        return sum(totals.values())
+
+    @api.model
+    @api.readonly
+    def search_history(self, plate_number=None, date_from=None, date_to=None, limit=100):
+        """
+        Tra cứu lịch sử ra vào theo biển số hoặc khoảng thời gian trên bảng log, sự kiện gọn và bảng lưu trữ
+        Args:
+            plate_number (str): Biển số xe, có thể chỉ là một phần ('123.45', '51F12345')
+            date_from (str): Từ ngày (YYYY-MM-DD)
+            date_to (str): Đến ngày (YYYY-MM-DD), bao gồm cả ngày này
+            limit (int): Số dòng tối đa
+        Returns:
+            list: Danh sách log, mới nhất trước
+        """
+        hot_domain = []
+        archive_domain = []
+        if plate_number:
+            hot_domain.append(('plate_search', 'ilike', plate_number))
+            archive_domain.append(('plate_search', 'ilike', plate_number))
+        if date_from:
+            date_from = fields.Date.to_date(date_from)
+            hot_domain.append(('create_date', '>=', date_from))
+            archive_domain.append(('log_date', '>=', date_from))
+        if date_to:
+            date_to = fields.Date.to_date(date_to) + timedelta(days=1)
+            hot_domain.append(('create_date', '<', date_to))
+            archive_domain.append(('log_date', '<', date_to))
+
+        history = []
+        for log in self.env['nsp.vehicle.logs'].search(hot_domain, limit=limit):
+            history.append({
+                'id': log.id,
+                'time': log.create_date,
+                'plate_number': log.plate_number,
+                'direction': log.direction,
+                'gate_name': log.gate_name,
+                'archived': False,
+                'source': 'log',
+            })
+        # Sự kiện ở chế độ lean chưa có log đầy đủ
+        event_domain = [('log_id', '=', False)]
+        if plate_number:
+            event_domain.append(('vehicle_id.plate_search', 'ilike', plate_number))
+        if date_from:
+            event_domain.append(('event_time', '>=', date_from))
+        if date_to:
+            event_domain.append(('event_time', '<', date_to))
+        for event in self.env['nsp.gate.event'].search(event_domain, limit=limit):
+            history.append({
+                'id': event.id,
+                'time': event.event_time,
+                'plate_number': event.vehicle_id.plate_number,
+                'direction': event.direction,
+                'gate_name': event.gate_id.name,
+                'archived': False,
+                'source': 'event',
+            })
+        history.sort(key=lambda row: row['time'], reverse=True)
+        del history[limit:]
+        remaining = limit - len(history)
+        if remaining > 0:
+            for log in self.search(archive_domain, limit=remaining):
+                history.append({
+                    'id': log.id,
+                    'time': log.log_date,
+                    'plate_number': log.plate_number,
+                    'direction': log.direction,
+                    'gate_name': log.gate_name,
+                    'archived': True,
+                    'source': 'event' if log.gate_event_id else 'log',
+                })
+        return history
@@ -1,6 +1,11 @@
 from odoo import models, fields, api, _
 from odoo.http import request
 from odoo.exceptions import ValidationError
+from datetime import time
+
+# Cùng quy tắc tính phí với nsp.bill: vào bãi từ 15h áp dụng giá đêm, mỗi ngày gửi thêm phụ phí qua đêm
+NIGHT_START = time(15, 0)
+OVERNIGHT_PRICE = 5000
 
 class VehiclePrice(models.Model):
     _name = "nsp.vehicle.price"
@@ -17,4 +22,35 @@ class VehiclePrice(models.Model):
         """Gói nạp phải it nhất 2000 VND"""
         for record in self:
             if (record.day_time <= 0 or record.day_time < 1000) and (record.night_time <= 0 or record.night_time < 1000):
-                raise ValidationError(_("Giá tối thiểu là 1000 VND"))
\ No newline at end of file
+                raise ValidationError(_("Giá tối thiểu là 1000 VND"))
+
+    @api.model
+    def _get_price_map(self):
+        """
+        Bảng giá theo loại xe, đọc một lần cho cả batch
+        Returns:
+            tuple: ({vehicle_type: (giá ngày, giá đêm)}, write_date mới nhất của bảng giá)
+        """
+        prices = self.search_read([], ['vehicle_type', 'day_time', 'night_time', 'write_date'], load=None)
+        price_map = {price['vehicle_type']: (price['day_time'], price['night_time']) for price in prices}
+        return price_map, max((price['write_date'] for price in prices), default=None)
+
+    @api.model
+    def _quote(self, price_map, vehicle_type, entry_time, now):
+        """
+        Phí tạm tính của xe đang trong bãi
+        Args:
+            price_map (dict): Kết quả của _get_price_map
+            vehicle_type (str): Loại xe
+            entry_time (datetime): Thời điểm vào bãi
+            now (datetime): Thời điểm tính phí
+        Returns:
+            float: Phí tạm tính, None nếu chưa cấu hình giá cho loại xe
+        """
+        price = price_map.get(vehicle_type)
+        if not price or not entry_time:
+            return None
+        day_time, night_time = price
+        base_price = night_time if entry_time.time() >= NIGHT_START else day_time
+        days = int((now - entry_time).total_seconds() // 86400)
+        return base_price + days * OVERNIGHT_PRICE
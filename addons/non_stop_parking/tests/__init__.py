@@ -0,0 +1,13 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from . import test_idempotency
+from . import test_occupancy
+from . import test_ingest
+from . import test_rate_limit
+from . import test_tag_validity
+from . import test_keyset
+from . import test_bulk_tags
+from . import test_export
+from . import test_reader_reads
+from . import test_reader_statistics
+from . import test_archive
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests.common import TransactionCase
+
+
+class NspTestCommon(TransactionCase):
+    """Bãi một chỗ, một cổng và hai xe có thẻ phương tiện đang hoạt động"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env['res.partner'].create({'name': "NSP Test Owner"})
+        cls.lot = cls.env['nsp.lot'].create({'name': "NSP Test Lot", 'code': "NSPTEST", 'capacity': 1})
+        cls.gate = cls.env['nsp.gate'].create({'name': "NSP Test Gate", 'code': "NSPTEST-G1", 'lot_id': cls.lot.id})
+        cls.vehicle_a, cls.vehicle_b = cls.env['nsp.vehicle'].create([{
+            'name': f"NSP Test Vehicle {suffix}",
+            'plate_number': f"99T-000.0{index}",
+            'owner_partner_id': cls.partner.id,
+        } for index, suffix in enumerate('AB')])
+        cls.tag_a, cls.tag_b = cls.env['nsp.tag'].create([{
+            'tag_id': f"NSPTEST-TAG-{suffix}",
+            'status': 'active',
+            'vehicle_id': vehicle.id,
+        } for suffix, vehicle in (('A', cls.vehicle_a), ('B', cls.vehicle_b))])
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from datetime import timedelta
+from odoo import fields
+from odoo.tests import tagged
+from .common import NspTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestArchive(NspTestCommon):
+
+    def _age_logs(self, logs, days):
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE nsp_vehicle_logs SET create_date = create_date - %s WHERE id = ANY(%s)",
+                            (timedelta(days=days), logs.ids))
+        logs.invalidate_recordset(['create_date'])
+
+    def _archived_ids(self):
+        self.env.cr.execute("SELECT id FROM nsp_vehicle_logs_archive")
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    def test_open_entry_is_kept(self):
+        Logs = self.env['nsp.vehicle.logs']
+        Logs.create_log_entry(direction='in', tag_id=self.tag_a.tag_id, gate=self.gate)
+        entry = Logs.search([('vehicle_id', '=', self.vehicle_a.id)])
+        self._age_logs(entry, 400)
+
+        cutoff = fields.Datetime.now() - timedelta(days=180)
+        Archive = self.env['nsp.vehicle.logs.archive']
+        Archive._archive_batch(cutoff)
+        self.assertTrue(entry.exists(), "Xe vẫn trong bãi, log vào không được lưu trữ")
+
+        # Xe ra: log vào còn được log ra tham chiếu nên vẫn ở bảng chính
+        Logs.create_log_entry(direction='out', tag_id=self.tag_a.tag_id, gate=self.gate)
+        exit_log = Logs.search([('vehicle_id', '=', self.vehicle_a.id), ('direction', '=', 'out')])
+        self.assertEqual(exit_log.entry_log_id, entry)
+        Archive._archive_batch(cutoff)
+        self.assertTrue(entry.exists())
+
+        # Log ra đủ cũ: log ra được lưu trữ trước, log vào ở batch sau
+        self._age_logs(exit_log, 300)
+        Archive._archive_batch(cutoff)
+        Archive._archive_batch(cutoff)
+        self.assertFalse(Logs.search([('vehicle_id', '=', self.vehicle_a.id)]))
+        self.assertLessEqual({entry.id, exit_log.id}, self._archived_ids())
+        self.env.cr.execute("SELECT entry_log_id FROM nsp_vehicle_logs_archive WHERE id = %s", (exit_log.id,))
+        self.assertEqual(self.env.cr.fetchone()[0], entry.id)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from .common import NspTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBulkTags(NspTestCommon):
+
+    def test_assign_replaces_previous_tag(self):
+        self.tag_a.status = 'expired'
+        self.tag_a.expired_by_validity = True
+        spare = self.env['nsp.tag'].create({'tag_id': "NSPTEST-TAG-SPARE", 'status': 'expired'})
+        spare.expired_by_validity = True
+        self.vehicle_b.vehicle_tag_id = self.tag_b
+
+        result = self.env['nsp.tag'].bulk_assign([
+            {'vehicle_id': self.vehicle_b.id, 'tag_id': spare.tag_id},
+            {'vehicle_id': self.vehicle_a.id, 'tag_id': "NSPTEST-TAG-NEW"},
+        ])
+        self.assertEqual((result['assigned'], result['created']), (2, 1), result)
+        self.assertFalse(result['conflicts'])
+
+        # Thẻ cũ của xe B bị thu hồi, xe B chỉ còn thẻ mới hoạt động
+        self.assertEqual(result['replaced'], 2)
+        self.assertEqual(self.tag_b.status, 'inactive')
+        self.assertFalse(self.tag_b.vehicle_id)
+        self.assertEqual(self.vehicle_b.vehicle_tag_id, spare)
+        self.assertEqual((spare.status, spare.expired_by_validity), ('active', False))
+        self.assertEqual(self.env['nsp.tag'].search_count([
+            ('vehicle_id', '=', self.vehicle_b.id), ('status', '=', 'active')]), 1)
+        self.assertFalse(self.tag_a.vehicle_id)
+        self.assertEqual(self.vehicle_a.vehicle_tag_id.tag_id, "NSPTEST-TAG-NEW")
+
+    def test_provision_reports_epc_conflicts(self):
+        self.tag_a.epc = "NSPTEST-EPC-A"
+        result = self.env['nsp.tag'].bulk_provision([
+            {'tag_id': "NSPTEST-NEW-1", 'epc': "NSPTEST-EPC-1"},
+            {'tag_id': self.tag_b.tag_id},
+            {'tag_id': "NSPTEST-NEW-2", 'epc': "NSPTEST-EPC-A"},
+            {'tag_id': "NSPTEST-NEW-3", 'epc': "NSPTEST-EPC-1"},
+        ])
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([(conflict['row'], conflict['error_code']) for conflict in result['conflicts']], [
+            (1, 'TAG_EXISTS'),
+            (2, 'EPC_EXISTS'),
+            (3, 'DUPLICATE_IN_REQUEST'),
+        ])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from datetime import datetime
+from odoo.tests import tagged
+from .common import NspTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestExport(NspTestCommon):
+
+    def _export_rows(self, **filters):
+        self.env.flush_all()
+        Logs = self.env['nsp.vehicle.logs']
+        return [row for rows in Logs._iter_export_chunks(self.env.cr, **filters) for row in rows]
+
+    def test_export_reads_logs_events_and_archive(self):
+        Logs = self.env['nsp.vehicle.logs']
+        self.assertTrue(Logs.create_log_entry(direction='in', tag_id=self.tag_a.tag_id, gate=self.gate)['success'])
+        self.env['ir.config_parameter'].sudo().set_param('nsp.log_mode', 'lean')
+        self.assertTrue(Logs.create_log_entry(direction='out', tag_id=self.tag_a.tag_id, gate=self.gate)['success'])
+
+        Archive = self.env['nsp.vehicle.logs.archive']
+        log_date = datetime(2020, 1, 15, 8, 0)
+        Archive._ensure_partitions([log_date])
+        self.env.cr.execute(f"""
+            INSERT INTO {Archive._table} (id, log_date, vehicle_id, plate_number, plate_key, direction)
+            VALUES (nextval('nsp_vehicle_logs_id_seq'), %s, %s, %s, %s, 'in')
+        """, (log_date, self.vehicle_a.id, self.vehicle_a.plate_number, self.vehicle_a.plate_key))
+
+        rows = self._export_rows(vehicle_id=self.vehicle_a.id)
+        self.assertEqual([(row[0], row[3]) for row in rows], [('archive', 'in'), ('log', 'in'), ('event', 'out')])
+        self.assertEqual({row[4] for row in rows}, {self.vehicle_a.plate_number})
+
+        rows = self._export_rows(plate_number=self.vehicle_a.plate_number, date_from='2020-01-01', date_to='2020-01-31')
+        self.assertEqual([row[0] for row in rows], ['archive'])
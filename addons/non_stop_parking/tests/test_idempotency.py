@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestIdempotency(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Idempotency = self.env['nsp.idempotency.key']
+
+    def test_get_key(self):
+        self.assertEqual(self.Idempotency._get_key({'event_id': 42}), '42')
+        self.assertEqual(self.Idempotency._get_key({'reader_id': 'R1', 'seq': 0}), 'R1:0')
+        self.assertIsNone(self.Idempotency._get_key({'reader_id': 'R1'}))
+
+    def test_replay_returns_first_response(self):
+        response = {'success': True, 'error_code': 'SUCCESS', 'data': [{'tag_id': 'T1'}]}
+        self.assertEqual(self.Idempotency._claim('evt-1', '/api/v1/check/in'), (True, None))
+        # Request gửi lại khi lần đầu chưa lưu kết quả
+        self.assertEqual(self.Idempotency._claim('evt-1', '/api/v1/check/in'), (False, None))
+
+        self.Idempotency._store_response('evt-1', response)
+        self.assertEqual(self.Idempotency._claim('evt-1', '/api/v1/check/in'), (False, response))
+
+    def test_release_allows_retry(self):
+        self.assertTrue(self.Idempotency._claim('evt-2', '/api/v1/check/out')[0])
+        self.Idempotency._release('evt-2')
+        self.assertEqual(self.Idempotency._claim('evt-2', '/api/v1/check/out'), (True, None))
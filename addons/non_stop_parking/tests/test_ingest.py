@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+from odoo.addons.non_stop_parking.controllers.api_ingest import ingestAPIController, FRAME_HEADER
+
+
+def frame(direction, seq, tags):
+    body = FRAME_HEADER.pack(direction, seq, len(tags))
+    for tag in tags:
+        body += bytes([len(tag)]) + tag.encode('ascii')
+    return body
+
+
+@tagged('post_install', '-at_install')
+class TestIngestFrames(BaseCase):
+
+    def test_parse_frames(self):
+        events = ingestAPIController._parse_frames(frame(0, 7, ['TID1', 'TID2']) + frame(1, 8, ['TID3']))
+        self.assertEqual([(e['direction'], e['seq'], e['tag_ids']) for e in events], [
+            ('in', 7, ['TID1', 'TID2']),
+            ('out', 8, ['TID3']),
+        ])
+
+    def test_truncated_header(self):
+        with self.assertRaises(ValueError):
+            ingestAPIController._parse_frames(frame(0, 1, ['TID1'])[:3])
+
+    def test_tag_past_end_of_body(self):
+        with self.assertRaises(ValueError):
+            ingestAPIController._parse_frames(frame(0, 1, ['TID1'])[:-2])
+
+    def test_missing_tag(self):
+        # Header khai báo 2 thẻ nhưng body chỉ có 1
+        body = FRAME_HEADER.pack(0, 1, 2) + b'\x04TID1'
+        with self.assertRaises(ValueError):
+            ingestAPIController._parse_frames(body)
+
+    def test_unknown_direction(self):
+        with self.assertRaises(ValueError):
+            ingestAPIController._parse_frames(frame(5, 1, ['TID1']))
+
+    def test_non_ascii_tag(self):
+        body = FRAME_HEADER.pack(0, 1, 1) + b'\x02\xff\xfe'
+        with self.assertRaises(ValueError):
+            ingestAPIController._parse_frames(body)
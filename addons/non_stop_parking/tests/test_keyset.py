@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.addons.non_stop_parking.controllers.base import BaseAPI
+
+
+@tagged('post_install', '-at_install')
+class TestKeysetPagination(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Xen kẽ thẻ có EPC và thẻ chưa có EPC để kiểm tra nhóm NULL ở cuối
+        epcs = ['E3', False, 'E1', False, 'E4', 'E2', False]
+        cls.tags = cls.env['nsp.tag'].create([{
+            'tag_id': f"NSPKEYSET-{index:02d}",
+            'epc': epc and f"NSPKEYSET-{epc}",
+        } for index, epc in enumerate(epcs)])
+        cls.domain = [('tag_id', '=like', 'NSPKEYSET-%')]
+
+    def _all_pages(self, limit, field):
+        Tag = self.env['nsp.tag']
+        ids, cursor = [], None
+        while True:
+            rows, cursor = BaseAPI._keyset_page(Tag, self.domain, [field], limit, cursor, field=field)
+            ids += [row['id'] for row in rows]
+            if not cursor:
+                return ids
+
+    def test_pages_cover_all_rows_once(self):
+        expected = self.env['nsp.tag'].search(self.domain, order='epc desc nulls last, id desc').ids
+        for limit in (1, 2, 3, len(expected)):
+            self.assertEqual(self._all_pages(limit, 'epc'), expected, f"limit={limit}")
+
+    def test_null_group_is_last(self):
+        ids = self._all_pages(2, 'epc')
+        epcs = self.env['nsp.tag'].browse(ids).mapped(lambda tag: bool(tag.epc))
+        self.assertEqual(epcs, sorted(epcs, reverse=True))
+
+    def test_invalid_cursor(self):
+        from odoo.exceptions import ValidationError
+        with self.assertRaises(ValidationError):
+            BaseAPI._keyset_domain('not-a-cursor', 'epc')
+        # JSON hợp lệ nhưng không phải [giá trị, id]
+        for values in (5, [], ["E1"], ["E1", "7"], ["E1", 7, 8], [{"a": 1}, 7]):
+            with self.assertRaises(ValidationError):
+                BaseAPI._keyset_domain(BaseAPI._encode_cursor(values), 'epc')
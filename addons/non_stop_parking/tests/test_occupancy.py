@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import patch
+from odoo.tests import tagged
+from .common import NspTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestOccupancy(NspTestCommon):
+
+    def _check(self, tag, direction):
+        return self.env['nsp.vehicle.logs'].create_log_entry(direction=direction, tag_id=tag.tag_id, gate=self.gate)
+
+    def test_reserve_and_release(self):
+        result = self._check(self.tag_a, 'in')
+        self.assertTrue(result['success'], result)
+        self.assertEqual(self.lot.occupied, 1)
+        self.assertEqual(self.vehicle_a.current_lot_id, self.lot)
+
+        result = self._check(self.tag_b, 'in')
+        self.assertEqual(result['error_code'], 'LOT_FULL')
+        self.assertEqual(self.lot.occupied, 1)
+
+        result = self._check(self.tag_a, 'out')
+        self.assertTrue(result['success'], result)
+        self.assertEqual(self.lot.occupied, 0)
+        self.assertFalse(self.vehicle_a.current_lot_id)
+
+    def test_reentry_not_counted_twice(self):
+        self._check(self.tag_a, 'in')
+        self._check(self.tag_a, 'in')
+        self.assertEqual(self.lot.occupied, 1)
+
+    def test_failed_log_releases_slot(self):
+        with patch.object(self.registry['nsp.vehicle'], 'write', side_effect=ValueError("boom")):
+            result = self._check(self.tag_a, 'in')
+        self.assertEqual(result['error_code'], 'CREATE_LOG_FAILED')
+        self.lot.invalidate_recordset(['occupied'])
+        self.assertEqual(self.lot.occupied, 0)
+        self.assertFalse(self.env['nsp.vehicle.logs'].search([('vehicle_id', '=', self.vehicle_a.id)]))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestRateLimit(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.RateLimit = self.env['nsp.rate.limit']
+        self.params = self.env['ir.config_parameter'].sudo()
+
+    def test_burst_then_throttle(self):
+        # Gần như không nạp lại token trong thời gian chạy test
+        self.params.set_param('nsp.rate_limit_reader', '0.001,2')
+        self.assertEqual(self.RateLimit._consume('reader', 'R1'), 0)
+        self.assertEqual(self.RateLimit._consume('reader', 'R1'), 0)
+        self.assertGreater(self.RateLimit._consume('reader', 'R1'), 0)
+
+        bucket = self.RateLimit.search([('key', '=', 'reader:R1')])
+        self.assertEqual((bucket.allowed_count, bucket.throttled_count), (2, 1))
+        self.assertTrue(bucket.last_throttled)
+
+        # Bucket của thiết bị khác không bị ảnh hưởng
+        self.assertEqual(self.RateLimit._consume('reader', 'R2'), 0)
+
+    def test_cost_larger_than_remaining(self):
+        self.params.set_param('nsp.rate_limit_ip', '0.001,10')
+        self.assertEqual(self.RateLimit._consume('ip', '10.0.0.1', cost=8), 0)
+        self.assertGreater(self.RateLimit._consume('ip', '10.0.0.1', cost=5), 0)
+        self.assertEqual(self.RateLimit._consume('ip', '10.0.0.1', cost=2), 0)
+
+    def test_cost_larger_than_burst(self):
+        self.params.set_param('nsp.rate_limit_reader', '0.001,5')
+        self.assertGreater(self.RateLimit._precheck('reader', 'R1', cost=6), 0)
+        self.assertGreater(self.RateLimit._consume('reader', 'R1', cost=6), 0)
+        bucket = self.RateLimit.search([('key', '=', 'reader:R1')])
+        self.assertEqual((bucket.tokens, bucket.allowed_count, bucket.throttled_count), (5, 0, 1))
+        # Batch lớn bị chặn không làm mất token của các request bình thường
+        self.assertEqual(self.RateLimit._precheck('reader', 'R1', cost=5), 0)
+        self.assertEqual(self.RateLimit._consume('reader', 'R1', cost=5), 0)
+        self.assertGreater(self.RateLimit._precheck('reader', 'R1'), 0)
+        self.RateLimit.invalidate_model()
+        self.assertEqual(self.RateLimit.search([('key', '=', 'reader:R1')]).throttled_count, 2)
+
+    def test_disabled(self):
+        self.params.set_param('nsp.rate_limit_reader', '0')
+        for _i in range(5):
+            self.assertEqual(self.RateLimit._consume('reader', 'R1'), 0)
+        self.assertFalse(self.RateLimit.search([('key', '=', 'reader:R1')]))
+
+    def test_invalid_config_uses_default(self):
+        self.params.set_param('nsp.rate_limit_reader', 'fast')
+        self.assertEqual(self.RateLimit._get_limit('reader'), (5.0, 20))
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.addons.non_stop_parking.models.reader import ReadBuffer
+
+
+@tagged('post_install', '-at_install')
+class TestReaderReads(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = self.env['nsp.reader'].create({'name': "NSP Test Reader", 'reader_id': "NSPTEST-R1"})
+        ReadBuffer.pop(self.env.cr.dbname)
+
+    def test_reads_are_buffered_then_flushed(self):
+        Reader = self.env['nsp.reader']
+        Reader._record_read("NSPTEST-R1", True)
+        Reader._record_read("NSPTEST-R1", False)
+        Reader._record_read("NSPTEST-UNKNOWN", True)
+        # Sự kiện cổng không ghi vào dòng thiết bị
+        self.assertEqual(self.reader.read_count, 0)
+
+        Reader._flush_reads()
+        self.assertEqual((self.reader.read_count, self.reader.read_error_count), (2, 1))
+        self.assertTrue(self.reader.last_read_at)
+        metric = self.env['nsp.reader.metric'].search([('reader_id', '=', self.reader.id)])
+        self.assertEqual((metric.read_count, metric.read_errors), (2, 1))
+        self.assertFalse(ReadBuffer.pop(self.env.cr.dbname))
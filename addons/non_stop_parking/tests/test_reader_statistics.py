@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestReaderStatistics(TransactionCase):
+
+    def test_status_write_invalidates_statistics(self):
+        Reader = self.env['nsp.reader']
+        reader = Reader.create({'name': "NSP Test Reader", 'reader_id': "NSPTEST-R1", 'status': 'active'})
+        before = Reader.get_reader_statistics()
+
+        reader._set_probe_result(False)
+        after = Reader.get_reader_statistics()
+        row = next(row for row in after['readers'] if row['id'] == reader.id)
+        self.assertEqual(row['status'], 'error')
+        self.assertFalse(row['is_connected'])
+        self.assertNotEqual(before, after)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from datetime import timedelta
+from odoo import fields
+from odoo.tests import tagged
+from .common import NspTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestTagValidity(NspTestCommon):
+
+    def test_expire_and_renew(self):
+        now = fields.Datetime.now()
+        self.tag_a.valid_to = now - timedelta(days=1)
+        self.env['nsp.tag']._cron_refresh_validity()
+        self.assertEqual(self.tag_a.status, 'expired')
+        self.assertTrue(self.tag_a.expired_by_validity)
+        self.assertEqual(self.tag_b.status, 'active')
+
+        # Gia hạn valid_to: cron kích hoạt lại
+        self.tag_a.valid_to = now + timedelta(days=30)
+        self.env['nsp.tag']._cron_refresh_validity()
+        self.assertEqual(self.tag_a.status, 'active')
+        self.assertFalse(self.tag_a.expired_by_validity)
+
+    def test_manual_expiry_is_kept(self):
+        self.tag_a.write({'status': 'expired', 'valid_to': fields.Datetime.now() + timedelta(days=30)})
+        self.tag_b.status = 'expired'
+        self.env['nsp.tag']._cron_refresh_validity()
+        self.assertEqual(self.tag_a.status, 'expired')
+        self.assertEqual(self.tag_b.status, 'expired')
+
+    def test_validity_error_codes(self):
+        now = fields.Datetime.now()
+        Tag = self.env['nsp.tag']
+        self.assertEqual(Tag._validity_error('active', None, now - timedelta(hours=1), now), 'TAG_EXPIRED')
+        self.assertEqual(Tag._validity_error('expired', None, None, now), 'TAG_EXPIRED')
+        self.assertEqual(Tag._validity_error('active', now + timedelta(hours=1), None, now), 'TAG_NOT_YET_VALID')
+        self.assertIsNone(Tag._validity_error('active', now - timedelta(hours=1), now + timedelta(hours=1), now))
+
+    def test_gate_engine_reports_not_yet_valid(self):
+        self.tag_a.valid_from = fields.Datetime.now() + timedelta(days=1)
+        decision = self.env['nsp.gate.engine'].evaluate([self.tag_a.tag_id], 'in')
+        self.assertFalse(decision['allowed'])
+        self.assertIn('TAGS_NOT_YET_VALID', [reason['code'] for reason in decision['reasons']])
+        self.assertNotIn('TAGS_EXPIRED', [reason['code'] for reason in decision['reasons']])
@@ -1 +1,2 @@
-from . import add_funds_wizard
\ No newline at end of file
+from . import add_funds_wizard
+from . import tag_import_wizard
@@ -0,0 +1,105 @@
+import base64
+import csv
+import io
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+class TagImportWizard(models.TransientModel):
+    _name = "nsp.tag.import.wizard"
+    _description = "Nhập thẻ hàng loạt từ CSV"
+
+    file = fields.Binary(string="File CSV", required=True)
+    filename = fields.Char(string="Tên file")
+    mode = fields.Selection([
+        ('provision', 'Tạo thẻ mới'),
+        ('assign', 'Gán thẻ cho phương tiện/người dùng'),
+    ], string="Thao tác", default='provision', required=True,
+        help="Gán thẻ: file có cột tag_id và plate_number (phương tiện) hoặc citizen_id (người dùng)")
+    delimiter = fields.Selection([
+        (',', 'Dấu phẩy (,)'),
+        (';', 'Dấu chấm phẩy (;)'),
+        ('\t', 'Tab'),
+    ], string="Ký tự phân cách", default=',', required=True)
+    status = fields.Selection(
+        [('active', 'Hoạt động'),
+        ('inactive', 'Không hoạt động'),
+        ('pending', 'Chưa kích hoạt')],
+        string="Trạng thái thẻ mới",
+        default='pending',
+        required=True
+    )
+
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], default='draft')
+    created_count = fields.Integer(string="Số thẻ đã tạo", readonly=True)
+    assigned_count = fields.Integer(string="Số thẻ đã gán", readonly=True)
+    conflict_count = fields.Integer(string="Số dòng lỗi", readonly=True)
+    conflict_report = fields.Text(string="Chi tiết dòng lỗi", readonly=True)
+
+    def _iter_rows(self):
+        """Đọc file CSV, cột bắt buộc là tag_id (hoặc tid), cột epc và status là tùy chọn"""
+        content = io.TextIOWrapper(io.BytesIO(base64.b64decode(self.file)), encoding='utf-8-sig')
+        reader = csv.DictReader(content, delimiter=self.delimiter)
+        headers = {(name or '').strip().lower() for name in reader.fieldnames or []}
+        if not headers & {'tag_id', 'tid'}:
+            raise UserError(_("File CSV phải có cột tag_id hoặc tid"))
+        for line in reader:
+            line = {(key or '').strip().lower(): (value or '').strip() for key, value in line.items()}
+            yield {
+                'tag_id': line.get('tag_id') or line.get('tid'),
+                'epc': line.get('epc'),
+                'status': line.get('status') or None,
+                'plate_number': line.get('plate_number'),
+                'citizen_id': line.get('citizen_id'),
+            }
+
+    def _prepare_assignments(self, rows):
+        """Đổi biển số/CCCD sang id chủ sở hữu, mỗi model một truy vấn"""
+        plates = {row['plate_number'] for row in rows if row['plate_number']}
+        citizen_ids = {row['citizen_id'] for row in rows if row['citizen_id']}
+        vehicles = {
+            vehicle['plate_number']: vehicle['id']
+            for vehicle in self.env['nsp.vehicle'].search_read([('plate_number', 'in', list(plates))], ['plate_number'])
+        } if plates else {}
+        partners = {
+            partner['citizen_id']: partner['id']
+            for partner in self.env['res.partner'].search_read([('citizen_id', 'in', list(citizen_ids))], ['citizen_id'])
+        } if citizen_ids else {}
+
+        assignments = []
+        for row in rows:
+            assignment = {'tag_id': row['tag_id']}
+            if row['plate_number']:
+                # Biển số không tồn tại sẽ được báo OWNER_NOT_FOUND
+                assignment['vehicle_id'] = vehicles.get(row['plate_number'], -1)
+            elif row['citizen_id']:
+                assignment['partner_id'] = partners.get(row['citizen_id'], -1)
+            assignments.append(assignment)
+        return assignments
+
+    def action_import(self):
+        self.ensure_one()
+        rows = list(self._iter_rows())
+        if self.mode == 'assign':
+            result = self.env['nsp.tag'].bulk_assign(self._prepare_assignments(rows))
+        else:
+            result = self.env['nsp.tag'].bulk_provision(rows, status=self.status)
+
+        # Dòng 1 là header
+        report = "\n".join(
+            f"Dòng {conflict['row'] + 2}: {conflict['tag_id'] or '-'} - {conflict['error_code']}"
+            for conflict in result['conflicts']
+        )
+        self.write({
+            'state': 'done',
+            'created_count': result['created'],
+            'assigned_count': result.get('assigned', 0),
+            'conflict_count': len(result['conflicts']),
+            'conflict_report': report,
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }